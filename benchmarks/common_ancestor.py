@@ -0,0 +1,86 @@
+"""
+Measure how quickly the common ancestor of far apart game states is found.
+
+Run with `python -m benchmarks.common_ancestor [frame count]`.
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from dusted.dustforce.event import State
+from dusted.models.tree_store import NO_NODE, TreeStore
+
+QUERY_COUNT = 1000
+
+
+def legacy_common_ancestor(store: TreeStore, left: int, right: int) -> int:
+    """The original search, walking up one frame at a time, for comparison."""
+
+    parents = store.parents
+    frames = store.frames
+
+    while frames[left] > frames[right]:
+        left = parents[left]
+
+    while frames[right] > frames[left]:
+        right = parents[right]
+
+    while left != right:
+        left = parents[left]
+        right = parents[right]
+        if left == NO_NODE or right == NO_NODE:
+            return NO_NODE
+
+    return left
+
+
+def build_tree(frame_count: int) -> tuple[TreeStore, list[int]]:
+    """Build a long run with a few branches, returning the ends of the branches."""
+
+    rng = random.Random(0)
+    store = TreeStore()
+    trunk = [store.add_root(State(x=0, y=0))]
+    for _ in range(frame_count):
+        trunk.append(store.add_child(trunk[-1], 0, 0, 0))
+
+    ends = [trunk[-1]]
+    for _ in range(10):
+        node = trunk[rng.randrange(frame_count // 10)]
+        while store.frames[node] < frame_count:
+            node = store.add_child(node, 1, 0, 0)
+        ends.append(node)
+
+    return store, ends
+
+
+def run(
+    common_ancestor: Callable[[TreeStore, int, int], int],
+    store: TreeStore,
+    ends: list[int],
+) -> None:
+    rng = random.Random(0)
+    queries = [(rng.choice(ends), rng.choice(ends)) for _ in range(QUERY_COUNT)]
+
+    start = time.perf_counter()
+    for left, right in queries:
+        common_ancestor(store, left, right)
+    duration = time.perf_counter() - start
+
+    print(
+        f"{common_ancestor.__name__:<24} {QUERY_COUNT} queries in {duration:6.3f}s"
+        f" ({duration / QUERY_COUNT * 1e6:8.1f} us/query)"
+    )
+
+
+def main() -> None:
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    store, ends = build_tree(frame_count)
+    run(legacy_common_ancestor, store, ends)
+    run(TreeStore.common_ancestor, store, ends)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measure how quickly event lines are parsed.
+
+Run with `python -m benchmarks.event_parsing [line count]`.
+"""
+
+import struct
+import sys
+import time
+from collections.abc import Callable
+
+from dusted.dustforce.event import State, StepEvent, parse_event, parse_events
+from dusted.models.inputs import Intents
+
+STEP = "[dusted] step 5184254573656646306 7448687232743006425 1 -1 2 0 0 0 11 0 43A3531D C38C9182"
+BINARY_STEP = "[dusted] bstep 47F22C113FFFA2A2675F0D92C6A260D90002C02243A3531DC38C9182"
+
+# How many lines are read from the game at once, roughly.
+BATCH_SIZE = 100
+
+
+def legacy_parse_event(line: str) -> StepEvent | None:
+    """The original field-at-a-time parser, reduced to step events."""
+
+    def next_field(line: str) -> tuple[str, str] | None:
+        match line.split(" ", maxsplit=1):
+            case [field, line]:
+                return field, line
+            case [field] if field:
+                return field, ""
+            case _:
+                return None
+
+    def parse_int(line: str) -> tuple[int, str] | None:
+        if not (result := next_field(line)):
+            return None
+        try:
+            return int(result[0]), result[1]
+        except ValueError:
+            return None
+
+    def parse_float(line: str) -> tuple[float, str] | None:
+        if not (result := next_field(line)):
+            return None
+        try:
+            return struct.unpack("!f", bytes.fromhex(result[0]))[0], result[1]
+        except (ValueError, struct.error):
+            return None
+
+    fields: list[str] = []
+    for _ in range(4):
+        if not (result := next_field(line)):
+            return None
+        field, line = result
+        fields.append(field)
+    if fields[:2] != ["[dusted]", "step"]:
+        return None
+
+    values: list[int] = []
+    for _ in range(8):
+        if not (int_result := parse_int(line)):
+            return None
+        value, line = int_result
+        values.append(value)
+
+    coords: list[float] = []
+    for _ in range(2):
+        if not (float_result := parse_float(line)):
+            return None
+        coord, line = float_result
+        coords.append(coord)
+
+    try:
+        intents = Intents(*values)
+    except ValueError:
+        return None
+
+    # State ids used to be kept as strings, but are compared as integers now.
+    return StepEvent(
+        id=int(fields[2]),
+        prev_id=int(fields[3]),
+        intents=intents,
+        state=State(x=coords[0], y=coords[1]),
+    )
+
+
+def run(parser: Callable[[str], object], line_count: int) -> None:
+    lines = [STEP] * line_count
+    start = time.perf_counter()
+    for line in lines:
+        parser(line)
+    duration = time.perf_counter() - start
+    print(
+        f"{parser.__name__:<20} {line_count} events in {duration:.2f}s"
+        f" ({line_count / duration:,.0f} events/s)"
+    )
+
+
+def run_batches(name: str, line: str, line_count: int) -> None:
+    batch = [line] * BATCH_SIZE
+    start = time.perf_counter()
+    for _ in range(line_count // BATCH_SIZE):
+        parse_events(batch)
+    duration = time.perf_counter() - start
+    print(
+        f"{name:<20} {line_count} events in {duration:.2f}s"
+        f" ({line_count / duration:,.0f} events/s)"
+    )
+
+
+def main() -> None:
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    assert legacy_parse_event(STEP) == parse_event(STEP)
+    assert parse_events([BINARY_STEP]) == [parse_event(STEP)]
+    run(legacy_parse_event, line_count)
+    run(parse_event, line_count)
+    run_batches("parse_events (text)", STEP, line_count)
+    run_batches("parse_events (bstep)", BINARY_STEP, line_count)
+
+
+if __name__ == "__main__":
+    main()
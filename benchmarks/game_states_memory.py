@@ -0,0 +1,118 @@
+"""
+Measure the memory used by the tree of game states.
+
+Run with `python -m benchmarks.game_states_memory [node count]`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import random
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Intents
+
+
+@dataclass(frozen=True, slots=True)
+class LegacyNode:
+    parent: LegacyNode | None
+    frame: int
+    intents: Intents | None
+    state: State
+    next_states: dict[Intents, LegacyNode]
+
+
+class LegacyGameStates:
+    """The original tree of node objects, keyed by string ids, for comparison."""
+
+    def __init__(self) -> None:
+        self._states: dict[str, LegacyNode] = {}
+        self._current: LegacyNode | None = None
+
+    def on_event(self, event: LevelStartEvent | StepEvent) -> None:
+        if isinstance(event, LevelStartEvent):
+            node = LegacyNode(None, 0, None, event.state, {})
+            self._states = {str(event.id): node}
+            self._current = node
+        elif prev_node := self._states.get(str(event.prev_id)):
+            next_node = prev_node.next_states.get(event.intents)
+            if next_node is None:
+                next_node = LegacyNode(
+                    prev_node, prev_node.frame + 1, event.intents, event.state, {}
+                )
+                prev_node.next_states[event.intents] = next_node
+                self._states[str(event.id)] = next_node
+            self._current = next_node
+        else:
+            self._current = None
+
+
+def generate_events(node_count: int) -> Iterator[LevelStartEvent | StepEvent]:
+    """Generate a tree of mostly long runs, branching off at random."""
+
+    rng = random.Random(0)
+    choices = [
+        dataclasses.replace(Intents.default(), x=x, jump=jump)
+        for x in (-1, 0, 1)
+        for jump in (0, 1, 2)
+    ]
+
+    # Make the ids large, like real FNV-1a hashes.
+    offset = 1 << 63
+    current = offset
+    yield LevelStartEvent(
+        id=offset,
+        level="downhill",
+        character=Character.DUSTMAN,
+        state=State(x=0, y=0),
+    )
+
+    for id in range(offset + 1, offset + node_count):
+        if rng.random() < 0.01:
+            current = rng.randrange(offset, id)
+        yield StepEvent(
+            id=id,
+            prev_id=current,
+            intents=rng.choice(choices),
+            state=State(x=rng.random() * 1000, y=rng.random() * 1000),
+        )
+        current = id
+
+
+def measure(
+    name: str,
+    make: Callable[[], LegacyGameStates | GameStates],
+    node_count: int,
+) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    game_states = make()
+    for event in generate_events(node_count):
+        game_states.on_event(event)
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:<18} {node_count} nodes: {size / 1e6:7.1f} MB"
+        f" ({size / node_count:5.0f} bytes/node), built in {duration:5.2f}s"
+    )
+
+
+def main() -> None:
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    measure("LegacyGameStates", LegacyGameStates, node_count)
+    measure("GameStates", GameStates, node_count)
+
+
+if __name__ == "__main__":
+    main()
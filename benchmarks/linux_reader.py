@@ -0,0 +1,104 @@
+"""
+Measure how quickly game output is read from a pseudo-terminal.
+
+Run with `python -m benchmarks.linux_reader [line count]`.
+"""
+
+import errno
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+from collections.abc import Callable
+
+from dusted.dustforce.event import Event, parse_event
+from dusted.dustforce.linux import process_stdout
+
+STEP = b"[dusted] step 5184254573656646306 7448687232743006425 1 -1 2 0 0 0 11 0 43A3531D C38C9182\n"
+NOISE = b"Some other console output from the game\n"
+
+
+def legacy_process_stdout(
+    rx_fd: int,
+    on_events: Callable[[list[Event]], None],
+) -> None:
+    """The original reader, which delivered one event at a time, for comparison."""
+
+    buffer = b""
+    while True:
+        try:
+            data = os.read(rx_fd, 1000)
+        except OSError as error:
+            if error.errno == errno.EIO:
+                break
+            raise
+
+        if data == b"":
+            break
+        buffer += data
+
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if event := parse_event(line.decode(errors="replace").strip()):
+                on_events([event])
+
+    os.close(rx_fd)
+
+
+def write_lines(tx_fd: int, block: bytes, block_count: int) -> None:
+    for _ in range(block_count):
+        os.write(tx_fd, block)
+    os.close(tx_fd)
+
+
+def run(
+    reader: Callable[[int, Callable[[list[Event]], None]], None],
+    name: str,
+    block: bytes,
+    block_count: int,
+) -> None:
+    rx_fd, tx_fd = pty.openpty()
+
+    # Stop the terminal from translating the output.
+    tty.setraw(tx_fd)
+
+    event_count = 0
+
+    def on_events(batch: list[Event]) -> None:
+        nonlocal event_count
+        event_count += len(batch)
+
+    writer = threading.Thread(target=write_lines, args=(tx_fd, block, block_count))
+    start = time.perf_counter()
+    writer.start()
+    reader(rx_fd, on_events)
+    duration = time.perf_counter() - start
+    writer.join()
+
+    line_count = block.count(b"\n") * block_count
+    megabytes = len(block) * block_count / 1e6
+    print(
+        f"{name:<10} {reader.__name__:<22} {event_count:>9} events"
+        f" from {line_count:>9} lines in {duration:6.2f}s"
+        f" ({line_count / duration:>9,.0f} lines/s, {megabytes / duration:5.1f} MB/s)"
+    )
+
+
+def main() -> None:
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    # Mostly steps, with some other output mixed in.
+    steps = (STEP * 9 + NOISE) * 100
+
+    # Long lines of other output, which arrive over many reads.
+    long_lines = NOISE[:-1] * 10_000 + b"\n" + STEP
+
+    for reader in [legacy_process_stdout, process_stdout]:
+        run(reader, "steps", steps, line_count // 1000)
+        run(reader, "long lines", long_lines, line_count // 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Measure how quickly and cheaply game output is followed through a log file.
+
+A synthetic writer appends to an `output.log` in a temporary directory, as
+Dustforce does on Windows.
+
+Run with `python -m benchmarks.log_tail [line count]`.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from typing import TextIO
+
+from dusted.dustforce.event import Event, parse_event
+from dusted.dustforce.tail import LogTailer
+
+STEP = b"[dusted] step 5184254573656646306 7448687232743006425 1 -1 2 0 0 0 11 0 43A3531D C38C9182\r\n"
+NOISE = b"Some other console output from the game\r\n"
+
+IDLE_SECONDS = 2.0
+LATENCY_LINES = 120
+
+
+class LegacyLogfileWatcher:
+    """The original polling watcher, with a way to stop it, for comparison."""
+
+    def __init__(self, path: str, on_events: Callable[[list[Event]], None]) -> None:
+        self.path = path
+        self.size = 0
+        self.file: TextIO | None = None
+        self.on_events = on_events
+        self.stopped = False
+
+    def start(self) -> None:
+        while not self.stopped:
+            try:
+                new_size = os.path.getsize(self.path)
+                if self.file is None or new_size < self.size:
+                    if self.file is not None:
+                        self.file.close()
+                    self.file = open(self.path)
+                    self.file.seek(max(0, new_size - 4096))
+                self.size = new_size
+
+                batch = []
+                while line := self.file.readline():
+                    if event := parse_event(line.strip()):
+                        batch.append(event)
+                if batch:
+                    self.on_events(batch)
+
+                time.sleep(1 / 60)
+
+            except FileNotFoundError:
+                self.file = None
+                time.sleep(1)
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+class PollingLogTailer(LogTailer):
+    """The new tailer, without change notifications."""
+
+    def _open_notifier(self) -> None:
+        return None
+
+
+Follower = LegacyLogfileWatcher | LogTailer
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.count = 0
+        self.last = 0.0
+
+    def __call__(self, batch: list[Event]) -> None:
+        self.count += len(batch)
+        self.last = time.perf_counter()
+
+    def wait_for(self, count: int, timeout: float = 30.0) -> None:
+        deadline = time.perf_counter() + timeout
+        while self.count < count and time.perf_counter() < deadline:
+            time.sleep(0.0005)
+
+
+def run(follower_type: type[Follower], path: str, line_count: int) -> None:
+    with open(path, "wb") as file:
+        file.write(NOISE * 1000)
+
+    counter = Counter()
+    follower = follower_type(path, counter)
+    thread = threading.Thread(target=follower.start)
+    thread.start()
+    time.sleep(0.1)
+
+    # Nothing is written, so any CPU time is wasted.
+    cpu_start = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    idle_cpu = (time.process_time() - cpu_start) / IDLE_SECONDS
+
+    # The game writes a line at a time, once per frame.
+    latencies = []
+    with open(path, "ab", buffering=0) as file:
+        for _ in range(LATENCY_LINES):
+            expected = counter.count + 1
+            written = time.perf_counter()
+            file.write(STEP)
+            counter.wait_for(expected)
+            latencies.append(counter.last - written)
+            time.sleep(1 / 600)
+
+    # The game is running at high speed.
+    block = (STEP * 9 + NOISE) * 100
+    expected = counter.count + line_count // 10 * 9
+    start = time.perf_counter()
+    with open(path, "ab") as file:
+        for _ in range(line_count // 1000):
+            file.write(block)
+    counter.wait_for(expected)
+    duration = time.perf_counter() - start
+
+    follower.stop()
+    thread.join()
+
+    print(
+        f"{follower_type.__name__:<22} idle CPU {idle_cpu:6.1%}"
+        f", latency {sum(latencies) / len(latencies) * 1000:5.1f} ms mean"
+        f" {max(latencies) * 1000:5.1f} ms max"
+        f", {counter.count - LATENCY_LINES:>8} events in {duration:5.2f}s"
+        f" ({line_count / duration:>9,.0f} lines/s)"
+    )
+
+
+def main() -> None:
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "output.log")
+        for follower_type in [LegacyLogfileWatcher, PollingLogTailer, LogTailer]:
+            run(follower_type, path, line_count)
+
+
+if __name__ == "__main__":
+    main()
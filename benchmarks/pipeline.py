@@ -0,0 +1,92 @@
+"""
+Measure the whole pipeline from a running game to the tree of game states.
+
+The game is replaced by `dusted.dustforce.fake_game`, playing a synthetic
+replay, so this needs neither Dustforce nor a display, but it does need Linux.
+The GUI is replaced by a loop that drains the event queue into `GameStates`,
+as `App.handle_stdout` does.
+
+Run with `python -m benchmarks.pipeline [frame count]`.
+"""
+
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+
+from dustmaker.replay import Character
+
+from dusted import utils
+from dusted.dustforce.event_queue import EventQueue
+from dusted.dustforce.linux import GameConnection
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Intents
+
+FAKE_GAME = [sys.executable, "-m", "dusted.dustforce.fake_game"]
+
+
+def make_replay(path: str, frame_count: int) -> None:
+    rng = random.Random(0)
+    inputs = [
+        Intents(rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), *[0] * 6)
+        for _ in range(frame_count)
+    ]
+    replay = utils.replay_from_intents("downhill", Character.DUSTMAN, inputs)
+    utils.write_replay_to_file(path, replay)
+
+
+def run(replay: str, frame_count: int, fps: float) -> None:
+    events = EventQueue()
+    connection = GameConnection(events, command=[*FAKE_GAME, "--fps", str(fps)])
+    game_states = GameStates()
+
+    batches = 0
+    latencies = []
+    start = time.perf_counter()
+    connection.open(replay)
+    while True:
+        # Check before draining, so that nothing is put after the last check.
+        finished = connection.live_readers == 0
+        try:
+            batch = events.get_nowait()
+        except queue.Empty:
+            if finished:
+                break
+            time.sleep(0.0005)
+            continue
+
+        game_states.apply_events(batch.events)
+        latencies.append(time.perf_counter() - batch.received)
+        batches += 1
+    duration = time.perf_counter() - start
+
+    assert game_states.current is not None
+    assert game_states.current.frame == frame_count
+
+    rate = "unthrottled" if fps == 0 else f"{fps:g} fps"
+    print(
+        f"{rate:<12} {events.delivered:>8} events in {duration:6.2f}s"
+        f" ({events.delivered / duration:>9,.0f} events/s)"
+        f", {batches:>6} batches, {events.merged:>8} merged"
+        f", latency {sum(latencies) / len(latencies) * 1000:6.2f} ms mean"
+        f" {max(latencies) * 1000:6.2f} ms max"
+    )
+
+
+def main() -> None:
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        replay = os.path.join(directory, "replay.dfreplay")
+        make_replay(replay, frame_count)
+        run(replay, frame_count, fps=0)
+
+        # A few seconds of the game at ten times its normal speed.
+        make_replay(replay, 3000)
+        run(replay, 3000, fps=600)
+
+
+if __name__ == "__main__":
+    main()
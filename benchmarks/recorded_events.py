@@ -0,0 +1,77 @@
+"""
+Measure how quickly a recording of game events is applied to `GameStates`.
+
+Record a session with `dusted --record events.gz`, then run with
+`python -m benchmarks.recorded_events events.gz`. Without a recording, one is
+made from `dusted.dustforce.fake_game`, which needs Linux.
+"""
+
+import os
+import queue
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.pipeline import FAKE_GAME, make_replay
+from dusted.dustforce.event_queue import EventQueue
+from dusted.dustforce.recording import EventRecorder, play_recording
+from dusted.models.game_states import GameStates
+
+FRAME_COUNT = 100_000
+
+
+def record_fake_game(path: Path, directory: str) -> None:
+    from dusted.dustforce.linux import GameConnection
+
+    replay = os.path.join(directory, "replay.dfreplay")
+    make_replay(replay, FRAME_COUNT)
+
+    # Nothing takes the events out of the queue, so it mustn't block.
+    connection = GameConnection(
+        EventQueue(max_pending=sys.maxsize),
+        command=[*FAKE_GAME, "--fps", "0", "--loops", "2"],
+    )
+    connection.recorder = EventRecorder(path)
+    connection.open(replay)
+    while connection.live_readers:
+        time.sleep(0.01)
+    connection.recorder.close()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        if len(sys.argv) > 1:
+            path = Path(sys.argv[1])
+        else:
+            path = Path(directory) / "events.gz"
+            record_fake_game(path, directory)
+
+        events = EventQueue(high_water_mark=sys.maxsize, max_pending=sys.maxsize)
+        start = time.perf_counter()
+        play_recording(path, events)
+        load_duration = time.perf_counter() - start
+
+        batches = []
+        try:
+            while True:
+                batches.append(events.get_nowait())
+        except queue.Empty:
+            pass
+
+        game_states = GameStates()
+        start = time.perf_counter()
+        for batch in batches:
+            game_states.apply_events(batch.events)
+        apply_duration = time.perf_counter() - start
+
+    event_count = sum(len(batch) for batch in batches)
+    print(
+        f"{event_count} events in {len(batches)} batches:"
+        f" loaded in {load_duration:.2f}s ({event_count / load_duration:,.0f}/s),"
+        f" applied in {apply_duration:.2f}s ({event_count / apply_duration:,.0f}/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -66,6 +66,19 @@ string encode_intents(controllable@ p) {
     );
 }
 
+// Pack the intents into the bits of an integer, with the layout expected by
+// dusted.dustforce.event.
+uint pack_intents(controllable@ p) {
+    return uint(p.x_intent() + 1)
+        | uint(p.y_intent() + 1) << 2
+        | uint(p.jump_intent()) << 4
+        | uint(p.dash_intent()) << 6
+        | uint(p.fall_intent()) << 8
+        | uint(p.light_intent()) << 10
+        | uint(p.heavy_intent()) << 14
+        | uint(p.taunt_intent()) << 18;
+}
+
 string encode_state(controllable@ p) {
     return join(
         array<string> = {
@@ -77,10 +90,16 @@ string encode_state(controllable@ p) {
 }
 
 class script {
+    // Send steps as fixed-size binary records, which are much quicker for the
+    // editor to decode than the text format.
+    [persist] bool binary_steps = false;
+
     scene@ g;
     controllable@ p;
     Fnv1aHasher hasher;
     string msg;
+    uint64 prev_id;
+    uint packed_intents;
 
     void on_level_start() {
         @g = get_scene();
@@ -103,9 +122,14 @@ class script {
     }
 
     void step(int) {
-        uint64 prev_id = hasher.hash();
+        prev_id = hasher.hash();
         hasher.push(encode_intents(p));
 
+        if (binary_steps) {
+            packed_intents = pack_intents(p);
+            return;
+        }
+
         msg = "[dusted] step";
         msg += " " + hasher.hash();
         msg += " " + prev_id;
@@ -113,6 +137,17 @@ class script {
     }
 
     void step_post(int) {
+        if (binary_steps) {
+            msg = "[dusted] bstep ";
+            msg += formatUInt(hasher.hash(), "0H", 16);
+            msg += formatUInt(prev_id, "0H", 16);
+            msg += formatUInt(packed_intents, "0H", 8);
+            msg += encode_float(p.x());
+            msg += encode_float(p.y());
+            puts(msg);
+            return;
+        }
+
         msg += " " + encode_state(p);
         puts(msg);
     }
@@ -1,13 +1,93 @@
+import argparse
 import logging
+import sys
+import threading
 from pathlib import Path
 
 import platformdirs
 
-from dusted.views.gui import App
-
 
 def main():
+    parser = argparse.ArgumentParser(
+        prog="dusted", description="Dustforce replay editor"
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        help="record the events sent by the game to a file",
+    )
+    parser.add_argument(
+        "--play",
+        type=Path,
+        help="play back recorded events, instead of waiting for the game",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="play back recorded events at the pace they were recorded",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    download_parser = subparsers.add_parser(
+        "download",
+        help="download replays from dustkid",
+    )
+    download_parser.add_argument("replay_ids", nargs="*", metavar="replay_id")
+    download_parser.add_argument(
+        "-i",
+        "--input",
+        type=Path,
+        help="file containing replay ids, one per line",
+    )
+    download_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=Path("."),
+        help="directory to write the replays to",
+    )
+    download_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=8,
+        help="number of replays to download at once",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="check replays for errors without opening the editor",
+    )
+    batch_parser.add_argument("directory", type=Path)
+    batch_parser.add_argument(
+        "-f",
+        "--format",
+        choices=["json", "csv"],
+        default="json",
+        help="format of the report",
+    )
+    batch_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="file to write the report to, instead of stdout",
+    )
+    batch_parser.add_argument(
+        "--nexus-dir",
+        type=Path,
+        help="directory to export nexus scripts to",
+    )
+    batch_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of processes to use",
+    )
+
+    args = parser.parse_args()
+
     log_file = Path(platformdirs.user_log_dir(opinion=False)) / "dusted.log"
+    log_file.parent.mkdir(parents=True, exist_ok=True)
     file_handler = logging.FileHandler(log_file, "w")
     stream_handler = logging.StreamHandler()
     logging.basicConfig(
@@ -16,7 +96,67 @@ def main():
         format="%(asctime)s %(levelname)s %(message)s",
     )
 
-    App().mainloop()
+    if args.command == "download":
+        download(args)
+    elif args.command == "batch":
+        batch(args)
+    else:
+        gui(args)
+
+
+def gui(args: argparse.Namespace) -> None:
+    from dusted import dustforce
+    from dusted.dustforce.recording import EventRecorder, play_recording
+    from dusted.views.gui import App
+
+    app = App()
+
+    if args.play is not None:
+        threading.Thread(
+            target=play_recording,
+            args=(args.play, dustforce.events, args.realtime),
+            daemon=True,
+        ).start()
+
+    if args.record is None:
+        app.mainloop()
+        return
+
+    recorder = EventRecorder(args.record)
+    dustforce.connection.recorder = recorder
+    try:
+        app.mainloop()
+    finally:
+        recorder.close()
+
+
+def download(args: argparse.Namespace) -> None:
+    from dusted.bulk_download import download_replays
+
+    replay_ids = list(args.replay_ids)
+    if args.input is not None:
+        with args.input.open(encoding="utf-8") as file:
+            replay_ids.extend(line.strip() for line in file if line.strip())
+
+    result = download_replays(replay_ids, args.output, max_workers=args.jobs)
+    if result.failed:
+        raise SystemExit(1)
+
+
+def batch(args: argparse.Namespace) -> None:
+    from dusted.batch import run_batch, write_csv, write_json
+
+    reports = run_batch(args.directory, args.nexus_dir, max_workers=args.jobs)
+
+    write_report = write_csv if args.format == "csv" else write_json
+    if args.output is None:
+        write_report(reports, sys.stdout)
+    else:
+        with args.output.open("w", encoding="utf-8", newline="") as file:
+            write_report(reports, file)
+
+    if not all(report.ok for report in reports):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import csv
+import dataclasses
+import json
+import logging
+import os
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TextIO
+
+from dusted import utils
+from dusted.models.inputs import Inputs, Intents
+from dusted.models.replay_diagnostics import ReplayDiagnostics
+
+# Nothing here may import tkinter, even indirectly, so that batches start quickly
+# and can run on machines without a display.
+
+INTENT_NAMES = [intent.name for intent in dataclasses.fields(Intents)]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    frame: int
+    intent: str
+
+
+@dataclass
+class ReplayReport:
+    """
+    The result of checking a single replay.
+
+    :param path: The path of the replay file
+    :param frames: The number of frames in the replay
+    :param warnings: The diagnostics that may cause the replay to desync
+    :param errors: The diagnostics that will cause the replay to desync
+    :param nexus_script: Where the nexus script was exported to, if it was
+    :param failure: Why the replay could not be checked, if it couldn't
+    """
+
+    path: str
+    frames: int = 0
+    warnings: list[Diagnostic] = field(default_factory=list)
+    errors: list[Diagnostic] = field(default_factory=list)
+    nexus_script: str | None = None
+    failure: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.failure is None and not self.errors
+
+
+def check_replay(path: str, nexus_path: str | None = None) -> ReplayReport:
+    """Run the diagnostics on a replay file, optionally exporting a nexus script."""
+
+    report = ReplayReport(path=path)
+    try:
+        replay = utils.load_replay_from_file(path)
+        inputs = utils.intents_from_replay(replay)
+    except Exception as error:
+        report.failure = f"{type(error).__name__}: {error}"
+        return report
+
+    diagnostics = ReplayDiagnostics(Inputs(inputs))
+    report.frames = len(inputs)
+    report.warnings = _diagnostics(diagnostics.warnings)
+    report.errors = _diagnostics(diagnostics.errors)
+
+    if nexus_path is not None:
+        os.makedirs(os.path.dirname(nexus_path), exist_ok=True)
+        with open(nexus_path, "w", encoding="utf-8") as file:
+            file.write(diagnostics.nexus_script.serialize())
+        report.nexus_script = nexus_path
+
+    return report
+
+
+def _diagnostics(positions: Iterable[tuple[int, int]]) -> list[Diagnostic]:
+    """Convert diagnostic grid positions into frames and intent names."""
+
+    return [
+        Diagnostic(frame=col, intent=INTENT_NAMES[row])
+        for row, col in sorted(positions, key=lambda row_col: (row_col[1], row_col[0]))
+    ]
+
+
+def find_replays(directory: Path) -> list[Path]:
+    """Return every replay file under a directory."""
+
+    return sorted(directory.rglob("*.dfreplay"))
+
+
+def run_batch(
+    directory: Path,
+    nexus_dir: Path | None = None,
+    max_workers: int | None = None,
+) -> list[ReplayReport]:
+    """
+    Check every replay under a directory, spread over several processes.
+
+    Nexus scripts are exported to the same relative path under the nexus
+    directory, if one is given.
+    """
+
+    paths = find_replays(directory)
+    nexus_paths = [
+        None
+        if nexus_dir is None
+        else str(nexus_dir / path.relative_to(directory).with_suffix(".txt"))
+        for path in paths
+    ]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        reports = list(
+            executor.map(
+                check_replay,
+                [str(path) for path in paths],
+                nexus_paths,
+                chunksize=16,
+            )
+        )
+
+    failures = sum(1 for report in reports if not report.ok)
+    log.info("Checked %d replays, %d with errors", len(reports), failures)
+    return reports
+
+
+def write_json(reports: list[ReplayReport], file: TextIO) -> None:
+    json.dump([dataclasses.asdict(report) for report in reports], file, indent=2)
+    file.write("\n")
+
+
+def write_csv(reports: list[ReplayReport], file: TextIO) -> None:
+    """Write one row per diagnostic or failure, and one row for clean replays."""
+
+    writer = csv.writer(file)
+    writer.writerow(["path", "frames", "severity", "frame", "intent", "message"])
+    for report in reports:
+        rows: list[list[str | int]] = []
+        if report.failure is not None:
+            rows.append(["failure", "", "", report.failure])
+        for severity, diagnostics in [
+            ("error", report.errors),
+            ("warning", report.warnings),
+        ]:
+            for diagnostic in diagnostics:
+                rows.append([severity, diagnostic.frame, diagnostic.intent, ""])
+        if not rows:
+            rows.append(["ok", "", "", ""])
+
+        for row in rows:
+            writer.writerow([report.path, report.frames, *row])
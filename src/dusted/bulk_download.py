@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dusted import utils
+from dusted.fileio import write_atomic
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BulkDownloadResult:
+    """
+    The outcome of a bulk download.
+
+    :param downloaded: The ids of the replays that were downloaded
+    :param skipped: The ids of the replays that had already been downloaded
+    :param failed: The reason each failed replay could not be downloaded
+    :param total_bytes: The number of bytes written for the downloaded replays
+    :param seconds: How long the download took
+    """
+
+    downloaded: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    total_bytes: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        """Return a human readable description of the download throughput."""
+
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"Downloaded {len(self.downloaded)} replays"
+            f" ({self.total_bytes / 1024:.1f} KiB) in {self.seconds:.2f}s"
+            f" ({len(self.downloaded) / seconds:.1f} replays/s,"
+            f" {self.total_bytes / 1024 / seconds:.1f} KiB/s),"
+            f" skipped {len(self.skipped)}, failed {len(self.failed)}"
+        )
+
+
+def is_replay_id(replay_id: str) -> bool:
+    """Return whether a string is a dustkid replay id, which is a number."""
+
+    return replay_id.isascii() and replay_id.isdigit()
+
+
+def replay_path(directory: Path, replay_id: str) -> Path:
+    """
+    Return where a downloaded replay is written.
+
+    :raises ValueError: If the id isn't a replay id, so the path could be
+        outside of the directory.
+    """
+
+    if not is_replay_id(replay_id):
+        raise ValueError(f"Not a replay id: {replay_id!r}")
+    return directory / f"{replay_id}.dfreplay"
+
+
+def download_replays(
+    replay_ids: Iterable[str],
+    directory: Path,
+    max_workers: int = 8,
+    progress: Callable[[str], None] | None = None,
+) -> BulkDownloadResult:
+    """
+    Download replays from dustkid into a directory, several at a time.
+
+    Replays that have already been written to the directory are skipped, so an
+    interrupted batch can be resumed by running it again. Files are written
+    atomically, so an interrupted download never leaves a truncated replay.
+    Ids that aren't numbers are reported as failed without being downloaded.
+    Replays aren't added to the cache, so a large batch doesn't evict the
+    replays and levels that the editor uses.
+
+    :param progress: Called with each replay id once it has been processed
+    """
+
+    directory.mkdir(parents=True, exist_ok=True)
+    result = BulkDownloadResult()
+    start = time.perf_counter()
+
+    # Preserve the order of the ids, ignoring duplicates.
+    pending = []
+    for replay_id in dict.fromkeys(replay_ids):
+        if not is_replay_id(replay_id):
+            log.warning("Not downloading %r, which isn't a replay id", replay_id)
+            result.failed[replay_id] = "Not a replay id"
+        elif replay_path(directory, replay_id).exists():
+            result.skipped.append(replay_id)
+        else:
+            pending.append(replay_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_download_replay, directory, replay_id): replay_id
+            for replay_id in pending
+        }
+        for future in as_completed(futures):
+            replay_id = futures[future]
+            try:
+                result.total_bytes += future.result()
+            except Exception as error:
+                log.warning("Could not download replay %s: %s", replay_id, error)
+                result.failed[replay_id] = str(error)
+            else:
+                result.downloaded.append(replay_id)
+
+            if progress is not None:
+                progress(replay_id)
+
+    result.seconds = time.perf_counter() - start
+    log.info(result.summary())
+    return result
+
+
+def _download_replay(directory: Path, replay_id: str) -> int:
+    """Download and write a single replay, returning its size in bytes."""
+
+    # The replay has already been checked to be valid.
+    replay_data = utils.download_replay_from_dustkid(replay_id)
+    write_atomic(replay_path(directory, replay_id), replay_data)
+    return len(replay_data)
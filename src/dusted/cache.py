@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import platformdirs
+
+from dusted.config import config
+from dusted.fileio import write_atomic
+
+CACHE_DIR = Path(platformdirs.user_cache_dir("dusted")) / "dustkid"
+
+log = logging.getLogger(__name__)
+
+
+class OfflineError(RuntimeError):
+    """Raised when a payload is not cached and offline mode is enabled."""
+
+
+class DustkidCache:
+    """
+    A content-addressed disk cache for payloads downloaded from dustkid.
+
+    Payloads are stored under the SHA-256 digest of their contents, and an
+    index maps request keys (such as "replay/123") to digests. When the total
+    size of the stored payloads exceeds the maximum size, the least recently
+    used keys are evicted.
+
+    Reading a payload only updates when it was used in memory, so that hits
+    don't write to the disk. The index is saved when payloads are stored or
+    evicted, and by `save`, which should be called before exiting.
+    """
+
+    def __init__(self, directory: Path, max_size: int, offline: bool = False) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index: dict[str, dict[str, str | int | float]] | None = None
+        self._index_changed = False
+
+    @property
+    def _index_path(self) -> Path:
+        return self.directory / "index.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.directory / "objects" / digest[:2] / digest
+
+    def fetch(
+        self,
+        key: str,
+        download: Callable[[], bytes],
+        validate: Callable[[bytes], object] | None = None,
+    ) -> bytes:
+        """
+        Return the payload for a key, downloading it if it is not cached.
+
+        :param validate: Called with a downloaded payload before it is stored,
+            raising an exception if it is invalid, so that error pages and
+            truncated downloads are never cached
+        :raises OfflineError: If the payload is not cached and the cache is in
+            offline mode.
+        """
+
+        if (data := self.get(key)) is not None:
+            return data
+
+        if self.offline:
+            raise OfflineError(f"{key} is not cached, and offline mode is enabled")
+
+        data = download()
+        if validate is not None:
+            validate(data)
+        self.put(key, data)
+        return data
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached payload for a key, or None if it is not cached."""
+
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+
+            data = None
+            if entry is not None:
+                try:
+                    data = self._object_path(str(entry["digest"])).read_bytes()
+                except FileNotFoundError:
+                    del index[key]
+                else:
+                    entry["accessed"] = time.time()
+                self._index_changed = True
+
+            if data is None:
+                self.misses += 1
+                log.info("Cache miss for %s (%s)", key, self._stats())
+                return None
+
+            self.hits += 1
+            log.info("Cache hit for %s (%s)", key, self._stats())
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store the payload for a key, evicting old payloads if needed."""
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            index = self._load_index()
+
+            path = self._object_path(digest)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                write_atomic(path, data)
+
+            index[key] = {"digest": digest, "size": len(data), "accessed": time.time()}
+            self._evict()
+            self._save_index()
+
+    def save(self) -> None:
+        """Save when each payload was last used, if it has changed."""
+
+        with self._lock:
+            if self._index_changed:
+                self._save_index()
+
+    def clear(self) -> None:
+        """Remove every cached payload."""
+
+        with self._lock:
+            index = self._load_index()
+            for digest in {str(entry["digest"]) for entry in index.values()}:
+                self._object_path(digest).unlink(missing_ok=True)
+            index.clear()
+            self._save_index()
+
+    def size(self) -> int:
+        """Return the total size of the cached payloads, in bytes."""
+
+        with self._lock:
+            return self._size(self._load_index())
+
+    @staticmethod
+    def _size(index: dict[str, dict[str, str | int | float]]) -> int:
+        # Payloads are stored once per digest, however many keys refer to them.
+        sizes = {str(entry["digest"]): int(entry["size"]) for entry in index.values()}
+        return sum(sizes.values())
+
+    def _evict(self) -> None:
+        """Evict the least recently used keys until the cache fits."""
+
+        index = self._load_index()
+        size = self._size(index)
+        by_age = sorted(index, key=lambda key: float(index[key]["accessed"]))
+        for key in by_age:
+            if size <= self.max_size:
+                break
+
+            entry = index.pop(key)
+            digest = str(entry["digest"])
+            if any(other["digest"] == digest for other in index.values()):
+                continue
+
+            self._object_path(digest).unlink(missing_ok=True)
+            size -= int(entry["size"])
+            log.info("Evicted %s from the cache", key)
+
+    def _load_index(self) -> dict[str, dict[str, str | int | float]]:
+        if self._index is None:
+            try:
+                with self._index_path.open(encoding="utf-8") as file:
+                    self._index = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {}
+        assert self._index is not None
+        return self._index
+
+    def _save_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(self._index_path, json.dumps(self._index).encode())
+        self._index_changed = False
+
+    def _stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+cache = DustkidCache(
+    CACHE_DIR,
+    max_size=config.cache_size_mb * 1024 * 1024,
+    offline=config.offline,
+)
@@ -14,8 +14,15 @@ CONFIG_PATH = Path(platformdirs.user_config_dir("dusted")) / "config.ini"
 class Config:
     dustforce_path: str = r"C:\Program Files (x86)\Steam\steamapps\common\Dustforce"
     show_level: bool = True
+    show_explored_states: bool = True
+    show_recent_branches: bool = False
+    raster_level: bool = False
     window_geometry: str = ""
     dustkid_id: int | None = None
+    cache_size_mb: int = 256
+    offline: bool = False
+    game_command: str = ""
+    game_states_size_mb: int = 512
 
     @classmethod
     def read(cls) -> Config:
@@ -27,8 +34,15 @@ class Config:
         return cls(
             dustforce_path=parser.get("DEFAULT", "dustforce_path"),
             show_level=parser.getboolean("DEFAULT", "show_level"),
+            show_explored_states=parser.getboolean("DEFAULT", "show_explored_states"),
+            show_recent_branches=parser.getboolean("DEFAULT", "show_recent_branches"),
+            raster_level=parser.getboolean("DEFAULT", "raster_level"),
             window_geometry=parser.get("DEFAULT", "window_geometry"),
             dustkid_id=parser.getint("DEFAULT", "dustkid_id", fallback=None),
+            cache_size_mb=parser.getint("DEFAULT", "cache_size_mb"),
+            offline=parser.getboolean("DEFAULT", "offline"),
+            game_command=parser.get("DEFAULT", "game_command"),
+            game_states_size_mb=parser.getint("DEFAULT", "game_states_size_mb"),
         )
 
     def write(self) -> None:
@@ -1,9 +1,14 @@
 import platform
 
+from dusted.dustforce.event_queue import events
+
 if platform.system() == "Windows":
-    from dusted.dustforce.windows import create_proc, events
+    from dusted.dustforce.windows import connection, create_proc
 else:
-    from dusted.dustforce.linux import create_proc, events
+    from dusted.dustforce.linux import (  # type: ignore[assignment]
+        connection,
+        create_proc,
+    )
 
 
 def watch_replay(replay_id):
@@ -14,4 +19,4 @@ def watch_replay_load_state(replay_id):
     create_proc(f"dustforce://dustmod/replayLoadState/{replay_id}")
 
 
-__all__ = ["events", "watch_replay", "watch_replay_load_state"]
+__all__ = ["connection", "events", "watch_replay", "watch_replay_load_state"]
@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 import struct
-from dataclasses import dataclass
+from array import array
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from typing import TypeAlias
 
 from dustmaker.replay import Character
 
 from dusted.models.inputs import Intents
 
-StateId: TypeAlias = str
+StateId: TypeAlias = int
 
 
 @dataclass(frozen=True)
@@ -31,41 +35,173 @@ class StepEvent:
     state: State
 
 
+@dataclass
+class StepRun:
+    """
+    Consecutive steps, each following on from the one before, stored compactly.
+
+    These are never sent by the game, but are made by the event queue when the
+    GUI falls behind. Each step is stored in parallel arrays, with its intents
+    packed and its position as single precision floats, as in the tree store,
+    rather than as separate objects.
+    """
+
+    prev_id: StateId
+    ids: array[int] = field(default_factory=lambda: array("Q"))
+    intents: array[int] = field(default_factory=lambda: array("I"))
+    xs: array[float] = field(default_factory=lambda: array("f"))
+    ys: array[float] = field(default_factory=lambda: array("f"))
+
+    @classmethod
+    def from_steps(cls, first: StepEvent, second: StepEvent) -> StepRun:
+        run = cls(prev_id=first.prev_id)
+        run.append(first)
+        run.append(second)
+        return run
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, event: StepEvent) -> None:
+        self.ids.append(event.id)
+        self.intents.append(pack_intents(event.intents))
+        self.xs.append(event.state.x)
+        self.ys.append(event.state.y)
+
+
 Event: TypeAlias = LevelStartEvent | StepEvent
 
+EVENT_PREFIX = b"[dusted] "
+
+# Binary steps are a big-endian record of the id, the previous id, the packed
+# intents and the position, hex encoded onto a line after this prefix.
+BINARY_STEP_PREFIX = "[dusted] bstep "
+BINARY_STEP_FORMAT = struct.Struct("!QQIff")
+BINARY_STEP_HEX_LENGTH = BINARY_STEP_FORMAT.size * 2
+
+# The bit offset and width of each intent in packed intents, in field order.
+PACKED_INTENTS_LAYOUT = [
+    (0, 2),
+    (2, 2),
+    (4, 2),
+    (6, 2),
+    (8, 2),
+    (10, 4),
+    (14, 4),
+    (18, 2),
+]
+
+
+class EventLineReader:
+    """
+    Split a stream of bytes into lines, keeping only the event lines.
+
+    Other lines are discarded without being decoded. Each byte is only scanned
+    once, even if a line arrives over many reads.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+        # How much of the buffer is known not to contain a newline.
+        self._scanned = 0
+
+    def feed(self, data: bytes) -> list[str]:
+        """Add data to the stream, returning any complete event lines."""
+
+        buffer = self._buffer
+        buffer += data
+
+        lines = []
+        start = 0
+        end = buffer.find(b"\n", self._scanned)
+        while end != -1:
+            if buffer.startswith(EVENT_PREFIX, start, end):
+                line = memoryview(buffer)[start:end]
+                lines.append(str(line, errors="replace").rstrip())
+                line.release()
+            start = end + 1
+            end = buffer.find(b"\n", start)
+
+        del buffer[:start]
+        self._scanned = len(buffer)
+        return lines
+
+
+def parse_events(lines: Iterable[str]) -> list[Event]:
+    """
+    Parse event lines, ignoring any that are invalid.
+
+    Consecutive binary steps are decoded together, which is much faster than
+    parsing them one at a time.
+    """
+
+    events: list[Event] = []
+    binary_steps: list[str] = []
+    for line in lines:
+        if line.startswith(BINARY_STEP_PREFIX):
+            binary_steps.append(line[len(BINARY_STEP_PREFIX) :])
+            continue
+
+        if binary_steps:
+            events.extend(_parse_binary_steps(binary_steps))
+            binary_steps.clear()
+
+        if event := parse_event(line):
+            events.append(event)
+
+    if binary_steps:
+        events.extend(_parse_binary_steps(binary_steps))
+
+    return events
+
 
 def parse_event(line: str) -> LevelStartEvent | StepEvent | None:
-    match _parse_next_field(line):
-        case ["[dusted]", line]:
-            pass
-        case _:
-            return None
+    # Split the whole line up front, rather than peeling off one field at a
+    # time, as steps arrive every frame and are by far the most common event.
+    fields = line.split(" ")
+    if len(fields) < 2 or fields[0] != "[dusted]":
+        return None
 
-    match _parse_next_field(line):
-        case ["level_start", line]:
+    match fields[1]:
+        case "step":
+            return _parse_step_event(fields)
+        case "level_start":
             return _parse_level_start_event(line)
-        case ["step", line]:
-            return _parse_step_event(line)
+        case "bstep" if len(fields) == 3:
+            steps = _parse_binary_steps(fields[2:])
+            return steps[0] if steps else None
         case _:
             return None
 
 
 def _parse_level_start_event(line: str) -> LevelStartEvent | None:
-    if not (id_result := _parse_id(line)):
+    # The level name is quoted and may contain spaces, so this can't use the
+    # fields from a plain split.
+    match line.split(" ", maxsplit=3):
+        case [_, _, id_str, line]:
+            pass
+        case _:
+            return None
+
+    if (id := _parse_id(id_str)) is None:
         return None
-    id, line = id_result
 
     if not (level_result := _parse_string(line)):
         return None
     level, line = level_result
 
-    if not (character_result := _parse_character(line)):
+    match line.split(" "):
+        case [character_str, x_hex, y_hex, *_]:
+            pass
+        case _:
+            return None
+
+    if (character := _parse_character(character_str)) is None:
         return None
-    character, line = character_result
 
-    if not (state_result := _parse_state(line)):
+    if not (state := _parse_state(x_hex, y_hex)):
         return None
-    state, line = state_result
 
     return LevelStartEvent(
         id=id,
@@ -75,22 +211,38 @@ def _parse_level_start_event(line: str) -> LevelStartEvent | None:
     )
 
 
-def _parse_step_event(line: str) -> StepEvent | None:
-    if not (id_result := _parse_id(line)):
-        return None
-    id, line = id_result
+# Only a handful of distinct intents are held in practice, so share the parsed
+# intents between steps rather than validating them again every frame.
+MAX_CACHED_INTENTS = 1 << 16
+_intents_cache: dict[tuple[str, ...], Intents] = {}
+
+
+def _parse_step_event(fields: list[str]) -> StepEvent | None:
+    """
+    Parse the fields of a step event.
+
+    Any fields after the state are ignored.
+    """
 
-    if not (prev_id_result := _parse_id(line)):
+    if len(fields) < 14:
         return None
-    prev_id, line = prev_id_result
 
-    if not (intents_result := _parse_intents(line)):
+    intents_key = tuple(fields[4:12])
+    if (intents := _intents_cache.get(intents_key)) is None:
+        try:
+            intents = Intents(*map(int, intents_key))
+        except ValueError:
+            return None
+        if len(_intents_cache) < MAX_CACHED_INTENTS:
+            _intents_cache[intents_key] = intents
+
+    if not (state := _parse_state(fields[12], fields[13])):
         return None
-    intents, line = intents_result
 
-    if not (state_result := _parse_state(line)):
+    if (id := _parse_id(fields[2])) is None or (
+        prev_id := _parse_id(fields[3])
+    ) is None:
         return None
-    state, line = state_result
 
     return StepEvent(
         id=id,
@@ -100,83 +252,125 @@ def _parse_step_event(line: str) -> StepEvent | None:
     )
 
 
-def _parse_id(line: str) -> tuple[StateId, str] | None:
-    return _parse_next_field(line)
+_packed_intents_cache: dict[int, Intents | None] = {}
 
 
-def _parse_character(line: str) -> tuple[Character, str] | None:
-    if not (level_result := _parse_int(line)):
-        return None
-    character_index, line = level_result
+def _parse_binary_steps(records: list[str]) -> list[StepEvent]:
+    """Parse hex encoded binary step records, ignoring any that are invalid."""
 
+    records = [record for record in records if len(record) == BINARY_STEP_HEX_LENGTH]
     try:
-        character = Character(character_index)
+        data = bytes.fromhex("".join(records))
     except ValueError:
-        return None
+        # Find the invalid records, rather than throwing the others away too.
+        if len(records) == 1:
+            return []
+        return [step for record in records for step in _parse_binary_steps([record])]
+
+    steps = []
+    for id, prev_id, packed_intents, x, y in BINARY_STEP_FORMAT.iter_unpack(data):
+        if (intents := unpack_intents(packed_intents)) is None:
+            continue
+        steps.append(
+            StepEvent(
+                id=id,
+                prev_id=prev_id,
+                intents=intents,
+                state=State(x=x, y=y),
+            )
+        )
+    return steps
 
-    return character, line
 
+def unpack_intents(packed: int) -> Intents | None:
+    """
+    Unpack intents from the bits of an integer.
 
-def _parse_intents(line: str) -> tuple[Intents, str] | None:
-    if not (result := _parse_int(line)):
-        return None
-    x, line = result
+    The x and y intents are offset by one, so that they are never negative.
+    """
 
-    if not (result := _parse_int(line)):
-        return None
-    y, line = result
+    if packed in _packed_intents_cache:
+        return _packed_intents_cache[packed]
 
-    if not (result := _parse_int(line)):
+    # Unused bits must be clear, which also keeps the cache small.
+    if packed >> 20:
         return None
-    jump, line = result
 
-    if not (result := _parse_int(line)):
-        return None
-    dash, line = result
+    values = [
+        (packed >> offset) & ((1 << width) - 1)
+        for offset, width in PACKED_INTENTS_LAYOUT
+    ]
+    values[0] -= 1
+    values[1] -= 1
+    try:
+        intents: Intents | None = Intents(*values)
+    except ValueError:
+        intents = None
 
-    if not (result := _parse_int(line)):
-        return None
-    fall, line = result
+    _packed_intents_cache[packed] = intents
+    return intents
 
-    if not (result := _parse_int(line)):
-        return None
-    light, line = result
 
-    if not (result := _parse_int(line)):
-        return None
-    heavy, line = result
+_packed_intents: dict[Intents, int] = {}
+
+
+def pack_intents(intents: Intents) -> int:
+    """Pack intents into the bits of an integer, as the plugin does."""
+
+    if (packed := _packed_intents.get(intents)) is not None:
+        return packed
+
+    values = [
+        intents.x + 1,
+        intents.y + 1,
+        intents.jump,
+        intents.dash,
+        intents.fall,
+        intents.light,
+        intents.heavy,
+        intents.taunt,
+    ]
+    packed = sum(
+        value << offset for value, (offset, _) in zip(values, PACKED_INTENTS_LAYOUT)
+    )
+
+    # There are only about a million valid intents, and few are held in practice.
+    _packed_intents[intents] = packed
+    return packed
+
 
-    if not (result := _parse_int(line)):
+def _parse_id(value: str) -> StateId | None:
+    try:
+        return int(value)
+    except ValueError:
         return None
-    taunt, line = result
 
+
+def _parse_character(value: str) -> Character | None:
     try:
-        intents = Intents(
-            x=x,
-            y=y,
-            jump=jump,
-            dash=dash,
-            fall=fall,
-            light=light,
-            heavy=heavy,
-            taunt=taunt,
-        )
+        return Character(int(value))
     except ValueError:
         return None
 
-    return intents, line
 
+def _parse_state(x_hex: str, y_hex: str) -> State | None:
+    """
+    Parse the position fields of a state.
+
+    These are serialised as big-endian hex strings to avoid loss of precision.
+    """
 
-def _parse_state(line: str) -> tuple[State, str] | None:
-    if not (result := _parse_float(line)):
+    # Check the lengths first, as decoding both fields at once would otherwise
+    # accept a short x field followed by a long y field.
+    if len(x_hex) != 8 or len(y_hex) != 8:
         return None
-    x, line = result
 
-    if not (result := _parse_float(line)):
+    try:
+        x, y = struct.unpack("!ff", bytes.fromhex(x_hex + y_hex))
+    except (ValueError, struct.error):
         return None
-    y, line = result
 
-    return State(x=x, y=y), line
+    return State(x=x, y=y)
 
 
 def _parse_string(line: str) -> tuple[str, str] | None:
@@ -199,61 +393,3 @@ def _parse_string(line: str) -> tuple[str, str] | None:
         return None
 
     return value, line[1:]
-
-
-def _parse_int(line: str) -> tuple[int, str] | None:
-    """
-    Parse an int field.
-
-    Negative integers are allowed.
-    """
-
-    if not (result := _parse_next_field(line)):
-        return None
-    value_str, line = result
-
-    try:
-        value = int(value_str)
-    except ValueError:
-        return None
-
-    return value, line
-
-
-def _parse_float(line: str) -> tuple[float, str] | None:
-    """
-    Parse a float field.
-
-    These are serialised as big-endian hex strings to avoid loss of precision.
-    """
-
-    if not (result := _parse_next_field(line)):
-        return None
-    value_hex, line = result
-
-    try:
-        value_bytes = bytes.fromhex(value_hex)
-    except ValueError:
-        return None
-
-    try:
-        values = struct.unpack("!f", value_bytes)
-    except struct.error:
-        return None
-
-    if len(values) != 1:
-        return None
-
-    return values[0], line
-
-
-def _parse_next_field(line: str) -> tuple[str, str] | None:
-    """Split a line into its next field and the remainder."""
-
-    match line.split(" ", maxsplit=1):
-        case [field, line]:
-            return field, line
-        case [field] if field:
-            return field, ""
-        case _:
-            return None
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from dusted.dustforce.event import Event, StepEvent, StepRun
+
+# How many events can be waiting for the GUI before new events are merged into
+# the last batch, rather than being queued separately.
+HIGH_WATER_MARK = 1024
+
+# The most events that a batch can hold, so that the GUI can apply any batch
+# within its budget for a tick.
+MAX_BATCH_EVENTS = 256
+
+# How many events can be waiting for the GUI before the readers are blocked
+# until it catches up, so that the queue can't grow without bound.
+MAX_PENDING_EVENTS = 65536
+
+# How often to log the latency between reading and handling events.
+LATENCY_LOG_INTERVAL_SECONDS = 5.0
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EventBatch:
+    """
+    Events that were read from the game together.
+
+    :param events: The events, in the order that the game sent them
+    :param received: When the first events were read, from `time.perf_counter`
+    :param session: The launch of the game that sent the events
+    """
+
+    events: list[Event | StepRun]
+    received: float
+    session: int = 0
+
+    def __len__(self) -> int:
+        """Return the number of events, counting each step in a run."""
+
+        return sum(
+            len(event) if isinstance(event, StepRun) else 1 for event in self.events
+        )
+
+
+class EventQueue:
+    """
+    A queue of event batches, passed from the reader threads to the GUI.
+
+    When a batch is added to a queue that the GUI has drained, the wakeup
+    callback is called on the reader's thread, so that the GUI can wait for
+    events rather than polling for them. It is only called again once the GUI
+    has cleared the wakeup.
+
+    Once the number of waiting events reaches the high-water mark, new events
+    are merged into the last batch, and consecutive steps are stored as runs.
+    This keeps the number of batches small while the GUI catches up. No batch
+    holds more than `max_batch_events` events, so that each one can be applied
+    without blocking the GUI.
+
+    Once `max_pending` events are waiting, `put` blocks until the GUI has taken
+    enough of them, so that a reader can't get unboundedly far ahead. Never put
+    events into a full queue from the thread that takes them out of it.
+    """
+
+    def __init__(
+        self,
+        high_water_mark: int = HIGH_WATER_MARK,
+        max_batch_events: int = MAX_BATCH_EVENTS,
+        max_pending: int = MAX_PENDING_EVENTS,
+    ) -> None:
+        self.high_water_mark = high_water_mark
+        self.max_batch_events = max_batch_events
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._batches = deque[EventBatch]()
+        self._pending = 0
+        self._tail_count = 0
+        self._backed_up = False
+
+        self.delivered = 0
+        self.merged = 0
+        self.dropped = 0
+        self.blocked = 0
+
+        self._wakeup: Callable[[], None] | None = None
+        self._wakeup_pending = False
+
+    def put(self, events: list[Event], session: int = 0) -> None:
+        """Add events read from the game, blocking while the queue is full."""
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                log.info("%d events are waiting, blocking the reader", self._pending)
+                self.blocked += 1
+                self._not_full.wait_for(lambda: self._pending < self.max_pending)
+
+            tail = self._batches[-1] if self._batches else None
+            self._pending += len(events)
+            if (
+                self._pending > self.high_water_mark
+                and tail is not None
+                and tail.session == session
+                and self._tail_count < self.max_batch_events
+            ):
+                if not self._backed_up:
+                    self._backed_up = True
+                    log.info("%d events are waiting, merging steps", self._pending)
+                room = self.max_batch_events - self._tail_count
+                self._merge(tail, events[:room])
+                self._tail_count += len(events[:room])
+                events = events[room:]
+                if not events:
+                    return
+
+            received = time.perf_counter()
+            for start in range(0, max(1, len(events)), self.max_batch_events):
+                chunk = events[start : start + self.max_batch_events]
+                self._batches.append(EventBatch(list(chunk), received, session))
+                self._tail_count = len(chunk)
+
+            wakeup = None if self._wakeup_pending else self._wakeup
+            self._wakeup_pending = True
+
+        # Call the wakeup without the lock, as it may wait for the GUI.
+        if wakeup is not None:
+            wakeup()
+
+    def get_nowait(self) -> EventBatch:
+        """
+        Return the next batch.
+
+        :raises queue.Empty: If there are no batches.
+        """
+
+        with self._lock:
+            if not self._batches:
+                raise queue.Empty
+
+            batch = self._batches.popleft()
+            count = len(batch)
+            self._pending -= count
+            self.delivered += count
+            if self._pending < self.max_pending:
+                self._not_full.notify_all()
+            if self._backed_up and self._pending <= self.high_water_mark:
+                self._backed_up = False
+                log.info(
+                    "Caught up, %d events delivered, %d merged, %d dropped",
+                    self.delivered,
+                    self.merged,
+                    self.dropped,
+                )
+            return batch
+
+    def discard_before(self, session: int) -> None:
+        """Drop the waiting batches from sessions older than a session."""
+
+        with self._lock:
+            kept = deque[EventBatch]()
+            for batch in self._batches:
+                if batch.session < session:
+                    count = len(batch)
+                    self._pending -= count
+                    self.dropped += count
+                else:
+                    kept.append(batch)
+            self._batches = kept
+            self._tail_count = len(kept[-1]) if kept else 0
+            if self._pending < self.max_pending:
+                self._not_full.notify_all()
+
+    def _merge(self, batch: EventBatch, events: list[Event]) -> None:
+        """Add events to a batch, merging consecutive steps into runs."""
+
+        merged = batch.events
+        for event in events:
+            last = merged[-1] if merged else None
+            if isinstance(event, StepEvent):
+                if isinstance(last, StepRun) and last.ids[-1] == event.prev_id:
+                    last.append(event)
+                    self.merged += 1
+                    continue
+                if isinstance(last, StepEvent) and last.id == event.prev_id:
+                    merged[-1] = StepRun.from_steps(last, event)
+                    self.merged += 2
+                    continue
+            merged.append(event)
+
+    def set_wakeup(self, wakeup: Callable[[], None] | None) -> None:
+        """
+        Set the function to call when batches are added, or None to not call
+        anything. It is called on the thread that added the batches.
+        """
+
+        with self._lock:
+            self._wakeup = wakeup
+            self._wakeup_pending = False
+
+    def clear_wakeup(self) -> None:
+        """Allow the wakeup to be called again. Call this before draining."""
+
+        with self._lock:
+            self._wakeup_pending = False
+
+
+class LatencyTracker:
+    """Periodically log how long events wait between being read and handled."""
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._last_log = time.perf_counter()
+
+    def record(self, batch: EventBatch) -> None:
+        now = time.perf_counter()
+        latency = now - batch.received
+        self._count += 1
+        self._total += latency
+        self._max = max(self._max, latency)
+
+        if now - self._last_log >= LATENCY_LOG_INTERVAL_SECONDS:
+            log.info(
+                "Event latency: %.1f ms mean, %.1f ms max over %d batches",
+                self._total / self._count * 1000,
+                self._max * 1000,
+                self._count,
+            )
+            self._count = 0
+            self._total = 0.0
+            self._max = 0.0
+            self._last_log = now
+
+
+events = EventQueue()
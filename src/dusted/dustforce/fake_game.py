@@ -0,0 +1,194 @@
+"""
+A stand-in for Dustforce running `plugin/tas.as`, for testing and benchmarking.
+
+It plays the inputs of a replay, writing the same events as the plugin, with
+the same state ids. As there is no game, the character's position simply moves
+with the held direction.
+
+Run with `python -m dusted.dustforce.fake_game [options] <uri or path>`, or
+point the editor at it with the `game_command` config option, for example
+`game_command = python -m dusted.dustforce.fake_game --fps 0`. On Windows, the
+editor reads from output.log, so pass its path with `--log`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from typing import BinaryIO
+
+from dustmaker.replay import Character
+
+from dusted import utils
+from dusted.dustforce.event import BINARY_STEP_FORMAT, BINARY_STEP_PREFIX, pack_intents
+from dusted.models.inputs import Intents
+
+FNV_PRIME = 0x00000100000001B3
+FNV_OFFSET_BASIS = 0xCBF29CE484222325
+UINT64_MASK = (1 << 64) - 1
+
+# The URIs that the editor opens, which are followed by the replay path.
+URI_PREFIXES = ("dustforce://replay/", "dustforce://dustmod/replayLoadState/")
+
+# How far the character moves each frame in the held direction.
+SPEED = 8.0
+
+# How many frames to write at once when unthrottled.
+CHUNK_FRAMES = 1000
+
+
+class Fnv1aHasher:
+    """The 64-bit FNV-1a hash used by the plugin to identify game states."""
+
+    def __init__(self) -> None:
+        self.state = FNV_OFFSET_BASIS
+
+    def hash(self) -> int:
+        return self.state
+
+    def push(self, value: str) -> None:
+        state = self.state
+        for byte in value.encode():
+            state = ((state ^ byte) * FNV_PRIME) & UINT64_MASK
+        self.state = state
+
+
+def replay_path(uri: str) -> str:
+    """Return the replay path from a URI that the editor opens."""
+
+    for prefix in URI_PREFIXES:
+        if uri.startswith(prefix):
+            return uri[len(prefix) :]
+    return uri
+
+
+def encode_float(value: float) -> str:
+    return struct.pack("!f", value).hex().upper()
+
+
+def encode_intents(intents: Intents) -> str:
+    return (
+        f"{intents.x} {intents.y} {intents.jump} {intents.dash} {intents.fall}"
+        f" {intents.light} {intents.heavy} {intents.taunt}"
+    )
+
+
+def generate_lines(
+    level: str,
+    character: Character,
+    inputs: Sequence[Intents],
+    binary: bool = False,
+) -> Iterator[bytes]:
+    """
+    Generate the lines written by the plugin, one per frame.
+
+    :param binary: Write steps in the binary format
+    """
+
+    hasher = Fnv1aHasher()
+    x = 0.0
+    y = 0.0
+
+    encoded_level = f'"{level}"'
+    encoded_character = str(int(character))
+    hasher.push(encoded_level)
+    hasher.push(encoded_character)
+    yield (
+        f"[dusted] level_start {hasher.hash()} {encoded_level} {encoded_character}"
+        f" {encode_float(x)} {encode_float(y)}\n"
+    ).encode()
+
+    for intents in inputs:
+        prev_id = hasher.hash()
+        encoded_intents = encode_intents(intents)
+        hasher.push(encoded_intents)
+
+        x += intents.x * SPEED
+        y += intents.y * SPEED
+        if binary:
+            record = BINARY_STEP_FORMAT.pack(
+                hasher.hash(), prev_id, pack_intents(intents), x, y
+            )
+            yield f"{BINARY_STEP_PREFIX}{record.hex().upper()}\n".encode()
+            continue
+
+        yield (
+            f"[dusted] step {hasher.hash()} {prev_id} {encoded_intents}"
+            f" {encode_float(x)} {encode_float(y)}\n"
+        ).encode()
+
+
+def play(lines: Iterator[bytes], output: BinaryIO, fps: float) -> None:
+    """Write lines at a number of frames per second, or unthrottled if zero."""
+
+    if fps <= 0:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == CHUNK_FRAMES:
+                output.write(b"".join(chunk))
+                output.flush()
+                chunk.clear()
+        output.write(b"".join(chunk))
+        output.flush()
+        return
+
+    start = time.perf_counter()
+    for frame, line in enumerate(lines):
+        delay = start + frame / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        output.write(line)
+        output.flush()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m dusted.dustforce.fake_game",
+        description="Play a replay, writing the events that the plugin would",
+    )
+    parser.add_argument("uri", help="replay path, or a URI opened by the editor")
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=60,
+        help="frames per second, or 0 to write as quickly as possible",
+    )
+    parser.add_argument(
+        "--log",
+        help="file to append to, like output.log on Windows, instead of stdout",
+    )
+    parser.add_argument(
+        "--loops",
+        type=int,
+        default=1,
+        help="number of times to play the replay, restarting the level each time",
+    )
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="write steps in the binary format",
+    )
+    args = parser.parse_args(argv)
+
+    replay = utils.load_replay_from_file(replay_path(args.uri))
+    level = replay.level.decode()
+    character = replay.players[0].character
+    inputs = utils.intents_from_replay(replay)
+
+    def loops() -> Iterator[bytes]:
+        for _ in range(args.loops):
+            yield from generate_lines(level, character, inputs, args.binary)
+
+    if args.log is None:
+        play(loops(), sys.stdout.buffer, args.fps)
+    else:
+        with open(args.log, "ab") as output:
+            play(loops(), output, args.fps)
+
+
+if __name__ == "__main__":
+    main()
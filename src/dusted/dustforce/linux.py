@@ -1,20 +1,53 @@
+from __future__ import annotations
+
 import errno
+import logging
 import os
 import pty
-import queue
+import select
+import shlex
 import threading
+from collections.abc import Callable, Sequence
 from subprocess import DEVNULL, Popen
 
-from dusted.dustforce.event import Event, parse_event
+from dusted.config import config
+from dusted.dustforce.event import Event, EventLineReader, parse_events
+from dusted.dustforce.event_queue import EventQueue, events
+from dusted.dustforce.recording import EventRecorder
+
+# How many bytes to read from the pseudo-terminal at once.
+READ_SIZE = 65536
+
+# The command used to open Dustforce URIs.
+OPEN_COMMAND = ("xdg-open",)
+
+log = logging.getLogger(__name__)
 
-events = queue.Queue[Event]()
 
+def process_stdout(
+    rx_fd: int,
+    on_events: Callable[[list[Event]], None] = events.put,
+    stop_fd: int | None = None,
+    on_lines: Callable[[list[str]], None] | None = None,
+) -> None:
+    """
+    Read events from a file descriptor until it is closed.
 
-def process_stdout(rx_fd: int) -> None:
-    buffer = b""
+    :param stop_fd: Stop reading early once this file descriptor is readable
+    :param on_lines: Called with the event lines as they are read, before they
+        are parsed
+    """
+
+    watched = [rx_fd] if stop_fd is None else [rx_fd, stop_fd]
+    reader = EventLineReader()
     while True:
+        if stop_fd is not None:
+            ready, _, _ = select.select(watched, [], [])
+            if stop_fd in ready:
+                break
+
         try:
-            data = os.read(rx_fd, 1000)
+            data = os.read(rx_fd, READ_SIZE)
         except OSError as error:
             if error.errno == errno.EIO:
                 break
@@ -22,29 +55,198 @@ def process_stdout(rx_fd: int) -> None:
 
         if data == b"":
             break
-        buffer += data
 
-        *lines, buffer = buffer.split(b"\n")
-        for line in lines:
-            if event := parse_event(line.decode(errors="replace").strip()):
-                events.put(event)
+        lines = reader.feed(data)
+        if on_lines is not None and lines:
+            on_lines(lines)
+
+        batch = parse_events(lines)
+        if batch:
+            on_events(batch)
 
     os.close(rx_fd)
 
 
-def create_proc(uri: str) -> None:
-    # Pretend that we are a terminal to force Dustforce to not buffer its
-    # output when writing to the console.
-    rx_fd, tx_fd = pty.openpty()
+class _Reader:
+    """A thread reading the output of one launch of the game."""
+
+    def __init__(
+        self,
+        connection: GameConnection,
+        session: int,
+        rx_fd: int,
+        process: Popen[bytes],
+    ) -> None:
+        self.session = session
+        self.received = False
+
+        self._connection = connection
+        self._rx_fd = rx_fd
+        self._process = process
+        self._stop_rx, self._stop_tx = os.pipe()
+        os.set_blocking(self._stop_tx, False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Ask the thread to stop. This returns without waiting for it.
+
+        This must only be called while the reader belongs to the connection.
+        """
+
+        try:
+            os.write(self._stop_tx, b"\0")
+        except BlockingIOError:
+            # The thread has already been asked to stop.
+            pass
+
+    def close(self) -> None:
+        """Release the resources used to stop the thread."""
+
+        os.close(self._stop_rx)
+        os.close(self._stop_tx)
+
+    def _on_events(self, batch: list[Event]) -> None:
+        self.received = True
+        self._connection._on_events(self.session, batch)
+
+    def _on_lines(self, lines: list[str]) -> None:
+        if (recorder := self._connection.recorder) is not None:
+            recorder.record(self.session, lines)
+
+    def _run(self) -> None:
+        try:
+            process_stdout(self._rx_fd, self._on_events, self._stop_rx, self._on_lines)
+        finally:
+            self._connection._on_reader_finished(self)
+
+        # Reap the process, so that it doesn't linger as a zombie. It has
+        # usually exited by the time its output is closed, but if the reader
+        # was stopped early then this waits for it in the background.
+        self._process.wait()
+
+
+class GameConnection:
+    """
+    Manages the threads that read events from the game.
+
+    Each launch gets a new session, with its own pseudo-terminal and reader.
+    Once a session has sent events, older sessions are stale: their readers are
+    stopped and anything they still send is dropped.
+    """
 
-    # Open the Dustforce URI in a new process, with its stdout writing to the
-    # pseudo-terminal.
-    Popen(["xdg-open", uri], stdout=tx_fd, stderr=DEVNULL, bufsize=0)
+    def __init__(
+        self,
+        events: EventQueue = events,
+        command: Sequence[str] = OPEN_COMMAND,
+    ) -> None:
+        self.command = command
 
-    # Close the write end of the pseudo-terminal. We aren't going to write to
-    # it from this process.
-    os.close(tx_fd)
+        # Where to record the event lines that are read, if anywhere.
+        self.recorder: EventRecorder | None = None
 
-    # Process the output from the Dustforce process in a separate thread to
-    # avoid blocking the GUI when reading from the file descriptor.
-    threading.Thread(target=process_stdout, args=(rx_fd,)).start()
+        self._events = events
+        self._lock = threading.Lock()
+        self._readers: dict[int, _Reader] = {}
+        self._next_session = 0
+        self._active_session = -1
+
+        self.events_received = 0
+        self.events_dropped = 0
+
+    @property
+    def live_readers(self) -> int:
+        """The number of reader threads that are still running."""
+
+        with self._lock:
+            return len(self._readers)
+
+    def open(self, uri: str) -> int:
+        """Open a Dustforce URI, returning the id of the new session."""
+
+        # Pretend that we are a terminal to force Dustforce to not buffer its
+        # output when writing to the console.
+        rx_fd, tx_fd = pty.openpty()
+
+        # Open the Dustforce URI in a new process, with its stdout writing to
+        # the pseudo-terminal.
+        process = Popen([*self.command, uri], stdout=tx_fd, stderr=DEVNULL, bufsize=0)
+
+        # Close the write end of the pseudo-terminal. We aren't going to write
+        # to it from this process.
+        os.close(tx_fd)
+
+        with self._lock:
+            # If the game is already running, the URI is handed over to it and
+            # the new session never receives anything. Stop the readers that
+            # are still waiting, except the newest one, which may belong to a
+            # game that is still starting up.
+            waiting = [
+                reader for reader in self._readers.values() if not reader.received
+            ]
+            for reader in waiting[:-1]:
+                reader.stop()
+
+            session = self._next_session
+            self._next_session += 1
+            reader = _Reader(self, session, rx_fd, process)
+            self._readers[session] = reader
+            live_readers = len(self._readers)
+
+        # Process the output from the Dustforce process in a separate thread to
+        # avoid blocking the GUI when reading from the file descriptor.
+        reader.start()
+        log.info("Opened session %d, %d live readers", session, live_readers)
+        return session
+
+    def is_stale(self, session: int) -> bool:
+        """Check if events from a session should be ignored."""
+
+        return session < self._active_session
+
+    def close(self) -> None:
+        """Stop every reader."""
+
+        with self._lock:
+            for reader in self._readers.values():
+                reader.stop()
+
+    def _on_events(self, session: int, batch: list[Event]) -> None:
+        """Called on a reader thread when a session sends events."""
+
+        with self._lock:
+            if session < self._active_session:
+                self.events_dropped += len(batch)
+                return
+
+            if session > self._active_session:
+                self._active_session = session
+                for reader in self._readers.values():
+                    if reader.session < session:
+                        reader.stop()
+                self._events.discard_before(session)
+
+            self.events_received += len(batch)
+
+        self._events.put(batch, session)
+
+    def _on_reader_finished(self, reader: _Reader) -> None:
+        """Called on a reader thread just before it finishes."""
+
+        # Closing the reader under the lock ensures that nothing is stopping it
+        # at the same time.
+        with self._lock:
+            del self._readers[reader.session]
+            reader.close()
+
+
+connection = GameConnection(
+    command=shlex.split(config.game_command) if config.game_command else OPEN_COMMAND
+)
+
+
+def create_proc(uri: str) -> None:
+    connection.open(uri)
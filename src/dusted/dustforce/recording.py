@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from dusted.dustforce.event import parse_events
+from dusted.dustforce.event_queue import EventQueue, events
+
+log = logging.getLogger(__name__)
+
+
+class EventRecorder:
+    """
+    Record the event lines read from the game, for playing back later.
+
+    Recordings are gzipped text, with a line per event line, prefixed by the
+    number of seconds since recording started and the session that sent it.
+    Lines that were read together share the same time, so they are played back
+    in the same batch.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.line_count = 0
+
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def record(self, session: int, lines: list[str]) -> None:
+        """Record lines read together. This may be called from any thread."""
+
+        prefix = f"{time.perf_counter() - self._start:.6f} {session} "
+        data = "".join(f"{prefix}{line}\n" for line in lines)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(data)
+                self.line_count += len(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        log.info("Recorded %d event lines to %s", self.line_count, self.path)
+
+
+def read_recording(path: Path) -> Iterator[tuple[float, int, list[str]]]:
+    """Yield the time, session and lines of each batch in a recording."""
+
+    batch: list[str] = []
+    batch_key: tuple[str, str] | None = None
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for record in file:
+            elapsed, session, line = record.rstrip("\n").split(" ", maxsplit=2)
+            if (elapsed, session) != batch_key:
+                if batch_key is not None:
+                    yield float(batch_key[0]), int(batch_key[1]), batch
+                batch = []
+                batch_key = (elapsed, session)
+            batch.append(line)
+
+    if batch_key is not None:
+        yield float(batch_key[0]), int(batch_key[1]), batch
+
+
+def play_recording(
+    path: Path,
+    events: EventQueue = events,
+    realtime: bool = False,
+) -> None:
+    """
+    Put the events in a recording into an event queue, as the readers would.
+
+    :param realtime: Keep the time between batches, rather than putting them
+        all as quickly as possible
+    """
+
+    start = time.perf_counter()
+    for elapsed, session, lines in read_recording(path):
+        if realtime:
+            delay = start + elapsed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        batch = parse_events(lines)
+        if batch:
+            events.put(batch, session)
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import ctypes
+import io
+import logging
+import os
+import platform
+import select
+import threading
+from collections.abc import Callable
+
+from dusted.dustforce.event import Event, EventLineReader, parse_events
+
+# How many bytes to read from the file at once.
+READ_SIZE = 1 << 20
+
+# How often to check the file when change notifications aren't available.
+POLL_INTERVAL_SECONDS = 1 / 60
+
+# How long to wait for a change notification before checking the file anyway,
+# in case a notification was missed.
+NOTIFY_TIMEOUT_SECONDS = 1.0
+
+# The inotify flags used, from <sys/inotify.h>.
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+
+log = logging.getLogger(__name__)
+
+
+class _Inotify:
+    """Wait for changes to the files in a directory, using inotify."""
+
+    def __init__(self, directory: str) -> None:
+        libc = ctypes.CDLL(None, use_errno=True)
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        mask = (
+            IN_MODIFY
+            | IN_ATTRIB
+            | IN_CLOSE_WRITE
+            | IN_MOVED_FROM
+            | IN_MOVED_TO
+            | IN_CREATE
+            | IN_DELETE
+        )
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, os.strerror(error), directory)
+
+    def wait(self, timeout: float) -> None:
+        """Wait until something in the directory changes, or the timeout passes."""
+
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return
+
+        # The changes themselves don't matter, as the file is checked anyway.
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class LogTailer:
+    """
+    Follow a log file as it is written to, like `tail -F`.
+
+    The file is identified by its inode, and its offset is tracked exactly, so
+    nothing is read twice or skipped when it is truncated or replaced. Only
+    what is written after the file is first opened is read.
+
+    On Linux, inotify is used to wait for changes. Elsewhere the file is polled.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        on_events: Callable[[list[Event]], None],
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        on_lines: Callable[[list[str]], None] | None = None,
+    ) -> None:
+        self.path = path
+        self.on_events = on_events
+        self.on_lines = on_lines
+        self.poll_interval = poll_interval
+
+        self._file: io.FileIO | None = None
+        self._identity: tuple[int, int] | None = None
+        self._offset = 0
+        self._reader = EventLineReader()
+        self._polled = False
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Follow the file until stopped. This blocks, so run it on a thread."""
+
+        notifier = self._open_notifier()
+        try:
+            while not self._stopped.is_set():
+                self.poll()
+                if notifier is not None:
+                    notifier.wait(NOTIFY_TIMEOUT_SECONDS)
+                else:
+                    self._stopped.wait(self.poll_interval)
+        finally:
+            if notifier is not None:
+                notifier.close()
+            self._close()
+
+    def stop(self) -> None:
+        """Ask the thread to stop. This returns without waiting for it."""
+
+        self._stopped.set()
+
+    def close(self) -> None:
+        """
+        Close the file. Call this when polling without a thread, as the thread
+        closes the file itself once it stops.
+        """
+
+        self._close()
+
+    def __enter__(self) -> LogTailer:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def poll(self) -> None:
+        """Read anything new, reopening the file if it has been replaced."""
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+
+        identity = None if stat is None else (stat.st_dev, stat.st_ino)
+        if self._file is not None and identity != self._identity:
+            # The file has been replaced, so finish reading the old one first.
+            self._read()
+            self._close()
+            log.info("%s was replaced", self.path)
+
+        # Skip anything written before we started following the file, but read
+        # files that are created later from the beginning.
+        skip_existing = not self._polled
+        self._polled = True
+
+        if self._file is None:
+            if stat is None:
+                return
+            self._open(skip_existing)
+            if self._file is None:
+                return
+
+        if os.fstat(self._file.fileno()).st_size < self._offset:
+            log.info("%s was truncated", self.path)
+            self._file.seek(0)
+            self._offset = 0
+            self._reader = EventLineReader()
+
+        self._read()
+
+    def _open(self, skip_existing: bool) -> None:
+        try:
+            file = io.FileIO(self.path, "rb")
+        except FileNotFoundError:
+            # The file was removed since it was checked.
+            return
+
+        stat = os.fstat(file.fileno())
+        self._file = file
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size if skip_existing else 0
+        self._file.seek(self._offset)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._identity = None
+        self._reader = EventLineReader()
+
+    def _read(self) -> None:
+        assert self._file is not None
+
+        batch: list[Event] = []
+        while data := self._file.read(READ_SIZE):
+            self._offset += len(data)
+            lines = self._reader.feed(data)
+            if self.on_lines is not None and lines:
+                self.on_lines(lines)
+            batch.extend(parse_events(lines))
+
+        if batch:
+            self.on_events(batch)
+
+    def _open_notifier(self) -> _Inotify | None:
+        if platform.system() != "Linux":
+            return None
+
+        try:
+            return _Inotify(os.path.dirname(os.path.abspath(self.path)))
+        except OSError as error:
+            log.warning("Polling %s, as inotify is unavailable: %s", self.path, error)
+            return None
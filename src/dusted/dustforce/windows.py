@@ -1,49 +1,78 @@
 import os
-import queue
+import shlex
 import threading
-import time
+from subprocess import Popen
 
 from dusted.config import config
-from dusted.dustforce.event import Event, parse_event
+from dusted.dustforce.event import Event
+from dusted.dustforce.event_queue import EventQueue, events
+from dusted.dustforce.recording import EventRecorder
+from dusted.dustforce.tail import LogTailer
 
-watcher = None
-events = queue.Queue[Event]()
 
+class LogfileConnection:
+    """
+    Manages the thread that reads events from the game.
 
-class LogfileWatcher:
-    def __init__(self, path):
-        self.path = path
-        self.size = 0
-        self.file = None
+    Dustforce writes to the same log file however many times it is launched,
+    so a single watcher is shared by every session, and no session goes stale.
+    """
 
-    def start(self):
-        while 1:
-            try:
-                new_size = os.path.getsize(self.path)
-                if self.file is None or new_size < self.size:
-                    if self.file is not None:
-                        self.file.close()
-                    self.file = open(self.path)
-                    self.file.seek(max(0, new_size - 4096))
-                self.size = new_size
+    def __init__(self, events: EventQueue = events) -> None:
+        self._events = events
+        self._watcher: LogTailer | None = None
+        self._session = -1
 
-                while line := self.file.readline():
-                    if event := parse_event(line.strip()):
-                        events.put(event)
+        # Where to record the event lines that are read, if anywhere.
+        self.recorder: EventRecorder | None = None
 
-                time.sleep(1 / 60)
+        self.events_received = 0
+        self.events_dropped = 0
 
-            except FileNotFoundError:
-                self.file = None
-                time.sleep(1)
+    @property
+    def live_readers(self) -> int:
+        """The number of reader threads that are still running."""
 
+        return 0 if self._watcher is None else 1
 
-def create_proc(uri):
-    global watcher
-    if watcher is None:
-        path = os.path.join(config.dustforce_path, "output.log")
-        watcher = LogfileWatcher(path)
-        logfile_thread = threading.Thread(target=watcher.start, daemon=True)
-        logfile_thread.start()
+    def open(self, uri: str) -> int:
+        """Open a Dustforce URI, returning the id of the new session."""
 
-    os.startfile(uri)
+        if self._watcher is None:
+            path = os.path.join(config.dustforce_path, "output.log")
+            self._watcher = LogTailer(path, self._on_events, on_lines=self._on_lines)
+
+            # Open the log file before the game can write to it, so that the
+            # events for this URI aren't skipped.
+            self._watcher.poll()
+            logfile_thread = threading.Thread(target=self._watcher.start, daemon=True)
+            logfile_thread.start()
+
+        self._session += 1
+        if config.game_command:
+            Popen([*shlex.split(config.game_command, posix=False), uri])
+        else:
+            os.startfile(uri)  # type: ignore[attr-defined]
+        return self._session
+
+    def is_stale(self, session: int) -> bool:
+        """Check if events from a session should be ignored."""
+
+        return False
+
+    def _on_events(self, batch: list[Event]) -> None:
+        """Called on the watcher thread when the game sends events."""
+
+        self.events_received += len(batch)
+        self._events.put(batch, self._session)
+
+    def _on_lines(self, lines: list[str]) -> None:
+        if self.recorder is not None:
+            self.recorder.record(self._session, lines)
+
+
+connection = LogfileConnection()
+
+
+def create_proc(uri: str) -> None:
+    connection.open(uri)
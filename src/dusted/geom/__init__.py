@@ -1,3 +1,4 @@
+from dusted.geom.raster import render_tiles, tile_rows
 from dusted.geom.tiles import tile_outlines
 
-__all__ = ["tile_outlines"]
+__all__ = ["render_tiles", "tile_outlines", "tile_rows"]
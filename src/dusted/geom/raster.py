@@ -0,0 +1,87 @@
+import bisect
+import math
+from collections import defaultdict
+
+from dusted.png import encode_png
+
+# The size of a tile in level pixels.
+TILE_SIZE = 48
+
+# The colour of solid tiles.
+TILE_COLOR = bytes((0xBB, 0xBB, 0xBB, 0xFF))
+
+
+def tile_rows(tiles: set[tuple[int, int]]) -> dict[int, list[int]]:
+    """Return the sorted x coordinates of the tiles in each row."""
+
+    rows = defaultdict[int, list[int]](list)
+    for x, y in tiles:
+        rows[y].append(x)
+    for xs in rows.values():
+        xs.sort()
+    return dict(rows)
+
+
+def render_tiles(
+    rows: dict[int, list[int]], x: float, y: float, scale: float, size: int
+) -> bytes | None:
+    """
+    Render the tiles in a square of the level as a PNG image.
+
+    Pixels are solid if their centre is in a tile, and transparent otherwise.
+    This is safe to call from any thread.
+
+    :param rows: The tiles in each row, from `tile_rows`
+    :param x: The left of the square, in level pixels
+    :param y: The top of the square, in level pixels
+    :param scale: The number of image pixels per level pixel
+    :param size: The width and height of the image, in image pixels
+    :returns: The image, or None if there are no tiles in the square
+    """
+
+    left_tile = math.floor(x / TILE_SIZE)
+    right_tile = math.floor((x + size / scale) / TILE_SIZE)
+
+    scanlines = []
+    empty = bytes(1 + 4 * size)
+    is_empty = True
+    row_cache: dict[int, bytes] = {}
+    for pixel_y in range(size):
+        tile_y = math.floor((y + (pixel_y + 0.5) / scale) / TILE_SIZE)
+        if (scanline := row_cache.get(tile_y)) is None:
+            scanline = row_cache[tile_y] = _render_row(
+                rows.get(tile_y, []), left_tile, right_tile, x, scale, size, empty
+            )
+        if scanline is not empty:
+            is_empty = False
+        scanlines.append(scanline)
+
+    if is_empty:
+        return None
+    return encode_png(size, size, b"".join(scanlines))
+
+
+def _render_row(
+    xs: list[int],
+    left_tile: int,
+    right_tile: int,
+    x: float,
+    scale: float,
+    size: int,
+    empty: bytes,
+) -> bytes:
+    """Render a row of pixels that are all in the same row of tiles."""
+
+    start = bisect.bisect_left(xs, left_tile)
+    end = bisect.bisect_right(xs, right_tile)
+    if start == end:
+        return empty
+
+    scanline = bytearray(empty)
+    for tile_x in xs[start:end]:
+        # The pixels whose centres are within the tile.
+        first = max(0, math.ceil((tile_x * TILE_SIZE - x) * scale - 0.5))
+        last = min(size, math.ceil(((tile_x + 1) * TILE_SIZE - x) * scale - 0.5))
+        if first < last:
+            scanline[1 + 4 * first : 1 + 4 * last] = TILE_COLOR * (last - first)
+    return bytes(scanline)
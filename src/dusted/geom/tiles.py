@@ -2,6 +2,9 @@ import collections
 
 
 def tile_outlines(tiles):
+    """Find the outlines of each connected body of tiles, leaving tiles intact."""
+
+    tiles = set(tiles)
     bodies = []
     while tiles:
         seed = tiles.pop()
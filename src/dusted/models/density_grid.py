@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from collections.abc import Sequence
+
+from dusted.models.tree_store import TreeStore
+from dusted.png import encode_png
+
+# The colour that cells are drawn with, which gets more opaque with density.
+CELL_COLOR = (255, 96, 0)
+
+
+def bin_positions(
+    xs: Sequence[float], ys: Sequence[float], cell_size: float
+) -> dict[tuple[int, int], int]:
+    """
+    Count the positions in each cell. This is safe to call from any thread, on
+    copies of a tree store's positions.
+    """
+
+    counts: dict[tuple[int, int], int] = {}
+    for x, y in zip(xs, ys):
+        cell = (int(x // cell_size), int(y // cell_size))
+        counts[cell] = counts.get(cell, 0) + 1
+    return counts
+
+
+class DensityGrid:
+    """
+    The number of game states in each square cell of a level.
+
+    A grid follows a single tree store. States are added as they are added to
+    the store, so only the new states are binned each time. States that are
+    removed by compacting the store are still counted, as they have still been
+    explored. Cells are only stored if they contain a state.
+
+    Binning many states is slow, so they can be binned elsewhere, for example
+    on a worker thread, with `bin_positions`, and then added with `add`.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.counts: dict[tuple[int, int], int] = {}
+
+        self._generation = 0
+        self._node_count = 0
+
+    def sync(self, tree: TreeStore) -> range:
+        """
+        Follow the compactions of the tree store, returning the indices of the
+        nodes that haven't been binned yet.
+
+        If the store has been compacted more than once since the last sync, the
+        nodes that have been binned can't be found, so the counts are reset.
+        """
+
+        if tree.generation == self._generation + 1:
+            self._node_count = tree.kept_before(self._node_count)
+            self._generation = tree.generation
+        elif tree.generation != self._generation:
+            self.counts = {}
+            self._node_count = 0
+            self._generation = tree.generation
+
+        return range(self._node_count, len(tree))
+
+    def add(
+        self,
+        tree: TreeStore,
+        counts: dict[tuple[int, int], int],
+        end: int,
+        generation: int,
+    ) -> bool:
+        """
+        Add the counts of the nodes from the last binned node up to an index,
+        returning whether they were added. Call `sync` first.
+
+        :param end: The index after the last node that was binned
+        :param generation: The generation of the store that the nodes were
+            binned from. If the store has been compacted since, then the
+            counts are only added if it has been compacted once.
+        """
+
+        if generation + 1 == self._generation:
+            end = tree.kept_before(end)
+        elif generation != self._generation:
+            return False
+
+        total = self.counts
+        for cell, count in counts.items():
+            total[cell] = total.get(cell, 0) + count
+        self._node_count = end
+        return True
+
+    def update(self, tree: TreeStore) -> bool:
+        """
+        Add the states that have been added to a tree store since the last
+        update, returning whether any were added.
+        """
+
+        nodes = self.sync(tree)
+        if not nodes:
+            return False
+
+        counts = bin_positions(
+            tree.xs[nodes.start : nodes.stop],
+            tree.ys[nodes.start : nodes.stop],
+            self.cell_size,
+        )
+        return self.add(tree, counts, nodes.stop, tree.generation)
+
+    def coarsen(self, factor: int) -> DensityGrid:
+        """Return a grid with cells that are larger by an integer factor."""
+
+        grid = DensityGrid(self.cell_size * factor)
+        counts = grid.counts
+        for (x, y), count in self.counts.items():
+            cell = (x // factor, y // factor)
+            counts[cell] = counts.get(cell, 0) + count
+        return grid
+
+    def bounds(self) -> tuple[int, int, int, int] | None:
+        """Return the bounds of the cells with states, as (x0, y0, x1, y1)."""
+
+        if not self.counts:
+            return None
+
+        xs = [x for x, _ in self.counts]
+        ys = [y for _, y in self.counts]
+        return min(xs), min(ys), max(xs) + 1, max(ys) + 1
+
+    def render(
+        self, x: float, y: float, scale: float, width: int, height: int
+    ) -> bytes | None:
+        """
+        Render the cells in a rectangle of the level as a PNG image.
+
+        Each pixel is coloured by the cell that its centre is in. Empty cells
+        are transparent, and the opacity of the other cells grows with the
+        logarithm of their count. Only the cells in the rectangle are drawn,
+        so the size of the image doesn't depend on how far the states spread.
+
+        :param x: The left of the rectangle, in level pixels
+        :param y: The top of the rectangle, in level pixels
+        :param scale: The number of image pixels per level pixel
+        :param width: The width of the image, in image pixels
+        :param height: The height of the image, in image pixels
+        :returns: The image, or None if there are no states in the rectangle
+        """
+
+        cell_size = self.cell_size
+        left = math.floor(x / cell_size)
+        right = math.floor((x + width / scale) / cell_size)
+        top = math.floor(y / cell_size)
+        bottom = math.floor((y + height / scale) / cell_size)
+
+        rows = defaultdict[int, list[tuple[int, int]]](list)
+        for (cell_x, cell_y), count in self.counts.items():
+            if left <= cell_x <= right and top <= cell_y <= bottom:
+                rows[cell_y].append((cell_x, count))
+        if not rows:
+            return None
+
+        # Each row starts with a byte giving its filter type, which is zero.
+        empty = bytes(1 + 4 * width)
+        colors: dict[int, bytes] = {}
+        row_cache: dict[int, bytes] = {}
+        scanlines = []
+        for pixel_y in range(height):
+            cell_y = math.floor((y + (pixel_y + 0.5) / scale) / cell_size)
+            if (scanline := row_cache.get(cell_y)) is None:
+                cells = rows.get(cell_y)
+                scanline = row_cache[cell_y] = (
+                    empty
+                    if cells is None
+                    else self._render_row(cells, x, scale, width, empty, colors)
+                )
+            scanlines.append(scanline)
+
+        return encode_png(width, height, b"".join(scanlines))
+
+    def _render_row(
+        self,
+        cells: list[tuple[int, int]],
+        x: float,
+        scale: float,
+        width: int,
+        empty: bytes,
+        colors: dict[int, bytes],
+    ) -> bytes:
+        """Render a row of pixels that are all in the same row of cells."""
+
+        cell_size = self.cell_size
+        scanline = bytearray(empty)
+        for cell_x, count in cells:
+            level = count.bit_length()
+            if (color := colors.get(level)) is None:
+                color = colors[level] = bytes((*CELL_COLOR, min(255, 64 + 32 * level)))
+
+            # The pixels whose centres are within the cell.
+            first = max(0, math.ceil((cell_x * cell_size - x) * scale - 0.5))
+            last = min(width, math.ceil(((cell_x + 1) * cell_size - x) * scale - 0.5))
+            if first < last:
+                scanline[1 + 4 * first : 1 + 4 * last] = color * (last - first)
+        return bytes(scanline)
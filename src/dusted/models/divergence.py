@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from dusted.broadcaster import Broadcaster
+from dusted.dustforce.event import unpack_intents
+from dusted.models.game_states import GameStates, Node
+from dusted.models.inputs import Inputs
+
+
+class DivergenceTracker(Broadcaster):
+    """
+    Track where the inputs of the current game state diverge from the inputs.
+
+    The number of frames that match is updated as steps arrive and as the
+    inputs change, looking only at the frames that could have changed, rather
+    than comparing the whole path each time.
+    """
+
+    def __init__(self, inputs: Inputs, game_states: GameStates) -> None:
+        super().__init__()
+
+        self._inputs = inputs
+        self._game_states = game_states
+
+        self._node: Node | None = None
+        self._matching_frames = 0
+
+        self._inputs.subscribe(self._on_inputs_change)
+        self._game_states.subscribe(self._on_game_states_change)
+        self._on_game_states_change()
+
+    @property
+    def node(self) -> Node | None:
+        return self._node
+
+    @property
+    def first_differing_frame(self) -> int | None:
+        """
+        The first frame where the game's inputs differ from the inputs.
+
+        If there is no current game state, or the inputs of the current game
+        state are a prefix of the inputs, then None is returned.
+        """
+
+        if self._node is None or self._matching_frames == self._node.frame:
+            return None
+        return self._matching_frames
+
+    def _on_game_states_change(self) -> None:
+        node = self._game_states.current
+        previous = self._node
+        self._node = node
+
+        if node is None:
+            self._matching_frames = 0
+        else:
+            # The inputs up to the common ancestor are the same as before, so
+            # only the frames after it need to be compared.
+            ancestor = None if previous is None else previous.common_ancestor(node)
+            if ancestor is None:
+                self._matching_frames = self._match(node, 0)
+            elif self._matching_frames >= ancestor.frame:
+                self._matching_frames = self._match(node, ancestor.frame)
+
+        self.broadcast()
+
+    def _on_inputs_change(self) -> None:
+        frame = self._inputs.first_changed_frame
+        if self._node is not None and frame <= self._matching_frames:
+            self._matching_frames = self._match(self._node, frame)
+        self.broadcast()
+
+    def _match(self, node: Node, frame: int) -> int:
+        """
+        Return the number of frames that match, given that all frames before
+        a certain frame match.
+        """
+
+        store = node.store
+        parents = store.parents
+        frames = store.frames
+        intents = store.intents
+
+        # Collect the packed intents of the path after the frame.
+        packed = []
+        index = node.index
+        while frames[index] > frame:
+            packed.append(intents[index])
+            index = parents[index]
+        packed.reverse()
+
+        inputs = self._inputs
+        for value in packed:
+            if frame >= len(inputs) or unpack_intents(value) != inputs[frame]:
+                break
+            frame += 1
+        return frame
@@ -1,82 +1,129 @@
 from __future__ import annotations
 
-from collections import deque
+import logging
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Iterable
 from dataclasses import dataclass
+from pathlib import Path
 
 from dustmaker.replay import Character
 
 from dusted.broadcaster import Broadcaster
-from dusted.dustforce.event import Event, LevelStartEvent, State, StateId, StepEvent
-from dusted.models.inputs import Intents
+from dusted.dustforce.event import (
+    Event,
+    LevelStartEvent,
+    StateId,
+    StepEvent,
+    StepRun,
+    pack_intents,
+)
+from dusted.models.inputs import Inputs
+from dusted.models.tree_file import TreeFile, tree_path
+from dusted.models.tree_store import NO_NODE, Node, TreeStore
 
+__all__ = ["GameStates", "Node"]
 
-@dataclass(frozen=True, slots=True)
-class Node:
-    parent: Node | None
-    frame: int
-    intents: Intents | None
-    state: State
-    next_states: dict[Intents, Node]
+log = logging.getLogger(__name__)
 
-    def after(self, intents: Intents) -> Node | None:
-        """
-        Return the game state after certain intents are held.
+# How many nodes to add between checking the memory budget.
+BUDGET_CHECK_INTERVAL = 4096
 
-        If the game state has not been seen then None is returned.
-        """
+# The fraction of nodes that are kept when the memory budget is exceeded, so
+# that evicting doesn't happen on every check.
+EVICTION_KEEP_FRACTION = 0.75
 
-        return self.next_states.get(intents)
+# The number of trees kept for levels other than the current one.
+MAX_SAVED_TREES = 8
 
-    def common_ancestor(self, other: Node) -> Node | None:
-        """
-        Return the common ancestor of this and another game state.
-
-        If there is no common ancestor, for example if the game states are from
-        different levels, then None is returned.
-        """
+# The number of game states that were left for another branch to remember, so
+# that subscribers can see every branch left during a batch of events.
+MAX_BRANCH_ENDS = 64
 
-        left = self
-        right = other
 
-        while left.frame > right.frame:
-            assert left.parent is not None
-            left = left.parent
+def _entry_bytes(states: dict[StateId, int]) -> int:
+    """
+    Return the number of bytes used by the keys and values of a dict of states,
+    which are separate int objects, as ids are too large to be shared.
+    """
 
-        while right.frame > left.frame:
-            assert right.parent is not None
-            right = right.parent
+    return sum(map(sys.getsizeof, states)) + sum(map(sys.getsizeof, states.values()))
 
-        while True:
-            if left == right:
-                return left
 
-            if left.parent is None or right.parent is None:
-                return None
+@dataclass(slots=True)
+class SavedTree:
+    """The tree of game states for a level that isn't being played."""
 
-            left = left.parent
-            right = right.parent
+    tree: TreeStore
+    states: dict[StateId, int]
+    current: int
+    root: int
+    file: TreeFile | None
+    entry_bytes: int = -1
 
-    def inputs(self) -> list[Intents]:
-        """Return the inputs that led to this state."""
+    def __post_init__(self) -> None:
+        if self.entry_bytes < 0:
+            self.entry_bytes = _entry_bytes(self.states)
 
-        node = self
-        inputs = deque[Intents]()
-        while node.parent is not None:
-            assert node.intents is not None
-            inputs.appendleft(node.intents)
-            node = node.parent
-        return list(inputs)
+    def memory_usage(self) -> int:
+        return self.tree.memory_usage() + sys.getsizeof(self.states) + self.entry_bytes
 
 
 class GameStates(Broadcaster):
-    def __init__(self) -> None:
+    """
+    The tree of game states seen for each level and character.
+
+    The trees of the most recently played levels are kept, so that switching
+    back to a level restores its tree. If a directory
+    is given, trees are also saved there, and loaded when they are needed.
+
+    If a memory budget is given, the trees of other levels are dropped when it
+    is exceeded, then the least recently visited branches of the current tree
+    are evicted. The path to the current game state, and the path reached by
+    following the inputs, are never evicted.
+
+    :param inputs: The inputs whose path is kept when evicting
+    :param max_bytes: The memory budget, or None to never evict
+    :param max_saved_trees: The number of trees to keep for other levels
+    :param directory: The directory to save trees in, or None to not save them
+    """
+
+    def __init__(
+        self,
+        inputs: Inputs | None = None,
+        max_bytes: int | None = None,
+        max_saved_trees: int = MAX_SAVED_TREES,
+        directory: Path | None = None,
+    ) -> None:
         super().__init__()
 
+        self._inputs = inputs
+        self._max_bytes = max_bytes
+        self._max_saved_trees = max_saved_trees
+        self._directory = directory
+
+        # The trees of other levels, from least to most recently played.
+        self._saved_trees = OrderedDict[tuple[str, Character], SavedTree]()
+
         self._level: str | None = None
         self._character: Character | None = None
 
-        self._states: dict[StateId, Node] = {}
-        self._current: Node | None = None
+        self._tree = TreeStore()
+        self._states: dict[StateId, int] = {}
+        self._entry_bytes = 0
+        self._current = NO_NODE
+        self._root = NO_NODE
+        self._file: TreeFile | None = None
+
+        self._next_budget_check = BUDGET_CHECK_INTERVAL
+        self.evicted = 0
+
+        # The most recent game states that the game left by loading or
+        # restarting, and how many have been left in total.
+        self.branch_ends = deque[Node](maxlen=MAX_BRANCH_ENDS)
+        self.branch_switches = 0
 
     @property
     def level(self) -> str | None:
@@ -84,47 +131,294 @@ class GameStates(Broadcaster):
 
     @property
     def current(self) -> Node | None:
-        return self._current
+        if self._current == NO_NODE:
+            return None
+        return Node(self._tree, self._current)
+
+    @property
+    def root(self) -> Node | None:
+        """The first game state of the current level."""
+
+        if self._root == NO_NODE:
+            return None
+        return Node(self._tree, self._root)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._tree)
+
+    @property
+    def saved_tree_count(self) -> int:
+        return len(self._saved_trees)
 
-    def on_event(self, event: Event) -> None:
+    def memory_usage(self) -> int:
+        """Return the approximate number of bytes used by all of the trees."""
+
+        return (
+            self._tree.memory_usage()
+            + sys.getsizeof(self._states)
+            + self._entry_bytes
+            + sum(saved.memory_usage() for saved in self._saved_trees.values())
+        )
+
+    def apply_events(self, events: Iterable[Event | StepRun]) -> None:
+        """Apply a batch of events, broadcasting at most once."""
+
+        with self.batch():
+            for event in events:
+                self.on_event(event)
+
+    def on_event(self, event: Event | StepRun) -> None:
         if isinstance(event, LevelStartEvent):
             self._on_level_start(event)
         elif isinstance(event, StepEvent):
             self._on_step(event)
+        elif isinstance(event, StepRun):
+            self._on_step_run(event)
 
     def _on_level_start(self, event: LevelStartEvent) -> None:
         if event.level == self._level and event.character == self._character:
+            # Restarting the level returns to the first state.
+            node = self._states.get(event.id, NO_NODE)
+            if node != NO_NODE and node != self._current:
+                self._leave_branch()
+                self._current = node
+                self.broadcast()
             return
 
-        new_node = Node(
-            parent=None,
-            frame=0,
-            intents=None,
-            state=event.state,
-            next_states={},
-        )
-        self._level = event.level
-        self._states = {event.id: new_node}
-        self._current = new_node
+        saved = self._load_tree(event.level, event.character)
+        if saved is None or event.id not in saved.states:
+            # Start a new tree, replacing any saved tree that doesn't start
+            # from the same state.
+            tree = TreeStore()
+            root = tree.add_root(event.state, event.id)
+            saved = SavedTree(
+                tree,
+                {event.id: root},
+                root,
+                root,
+                self._tree_file(event.level, event.character),
+            )
+        else:
+            # The level has just started, so the game is at the first state,
+            # whatever state the tree was at before.
+            saved.current = saved.states[event.id]
 
+        self._switch(event.level, event.character, saved)
         self.broadcast()
 
+    def open(self, level: str, character: Character) -> None:
+        """
+        Switch to the tree for a level and character, if there is one, so
+        that the path of a replay can be shown before it has been watched.
+        """
+
+        if level == self._level and character == self._character:
+            return
+
+        if saved := self._load_tree(level, character):
+            self._switch(level, character, saved)
+            self.broadcast()
+
+    def flush(self) -> None:
+        """Save the game states that have been added to the current tree."""
+
+        if self._file is None:
+            return
+
+        try:
+            self._file.write(self._tree)
+        except OSError:
+            log.exception("Could not save game states to %s", self._file.path)
+
+    def _tree_file(self, level: str, character: Character) -> TreeFile | None:
+        if self._directory is None:
+            return None
+        return TreeFile(tree_path(self._directory, level, character))
+
+    def _load_tree(self, level: str, character: Character) -> SavedTree | None:
+        """Return the tree for a level and character, from memory or a file."""
+
+        if saved := self._saved_trees.pop((level, character), None):
+            return saved
+
+        file = self._tree_file(level, character)
+        if file is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            tree = file.read()
+        except OSError:
+            log.exception("Could not load game states from %s", file.path)
+            return None
+        if tree is None:
+            return None
+
+        log.info(
+            "Loaded %d game states from %s in %.0f ms",
+            len(tree),
+            file.path,
+            (time.perf_counter() - start) * 1000,
+        )
+        states = {id: index for index, id in enumerate(tree.ids)}
+        root = 0
+        current = self._follow_inputs(tree, root)
+        return SavedTree(tree, states, current, root, file)
+
+    def _switch(self, level: str, character: Character, saved: SavedTree) -> None:
+        """Make a tree current, keeping the current tree for later."""
+
+        if self._level is not None and self._character is not None:
+            self.flush()
+            self._saved_trees[self._level, self._character] = SavedTree(
+                self._tree,
+                self._states,
+                self._current,
+                self._root,
+                self._file,
+                self._entry_bytes,
+            )
+
+        self._level = level
+        self._character = character
+        self._tree = saved.tree
+        self._states = saved.states
+        self._entry_bytes = saved.entry_bytes
+        self._current = saved.current
+        self._root = saved.root
+        self._file = saved.file
+
+        while len(self._saved_trees) > self._max_saved_trees:
+            self._saved_trees.popitem(last=False)
+
+        self._next_budget_check = len(self._tree) + BUDGET_CHECK_INTERVAL
+
     def _on_step(self, event: StepEvent) -> None:
-        if prev_node := self._states.get(event.prev_id):
-            if node := prev_node.after(event.intents):
-                self._current = node
-            else:
-                node = Node(
-                    parent=prev_node,
-                    frame=prev_node.frame + 1,
-                    intents=event.intents,
-                    state=event.state,
-                    next_states={},
-                )
-                prev_node.next_states[event.intents] = node
-                self._states[event.id] = node
-                self._current = node
-        else:
-            self._current = None
+        self._step(
+            event.id,
+            event.prev_id,
+            pack_intents(event.intents),
+            event.state.x,
+            event.state.y,
+        )
+        self.broadcast()
 
+    def _on_step_run(self, run: StepRun) -> None:
+        prev_id = run.prev_id
+        for id, packed_intents, x, y in zip(run.ids, run.intents, run.xs, run.ys):
+            self._step(id, prev_id, packed_intents, x, y)
+            prev_id = id
         self.broadcast()
+
+    def _step(
+        self, id: StateId, prev_id: StateId, packed_intents: int, x: float, y: float
+    ) -> None:
+        prev_node = self._states.get(prev_id, NO_NODE)
+        if prev_node != self._current:
+            self._leave_branch()
+        if prev_node == NO_NODE:
+            self._current = NO_NODE
+            return
+
+        node = self._tree.child(prev_node, packed_intents)
+        if node == NO_NODE:
+            node = self._tree.add_child(prev_node, packed_intents, x, y, id)
+            self._states[id] = node
+            self._entry_bytes += sys.getsizeof(id) + sys.getsizeof(node)
+        self._tree.visit(node)
+        self._current = node
+
+        if self._max_bytes is not None and len(self._tree) >= self._next_budget_check:
+            while self._saved_trees and self.memory_usage() > self._max_bytes:
+                self._saved_trees.popitem(last=False)
+
+            if self.memory_usage() > self._max_bytes:
+                self.evict(int(len(self._tree) * EVICTION_KEEP_FRACTION))
+
+            # Check less often as the tree grows, in case most of it can't be
+            # evicted, so that evicting takes constant time per node added.
+            self._next_budget_check = len(self._tree) + max(
+                BUDGET_CHECK_INTERVAL, len(self._tree) // 4
+            )
+
+    def _leave_branch(self) -> None:
+        """Remember the current game state, as the game is about to leave it."""
+
+        if self._current != NO_NODE:
+            self.branch_ends.append(Node(self._tree, self._current))
+            self.branch_switches += 1
+
+    def evict(self, node_count: int) -> None:
+        """
+        Evict the least recently visited branches, keeping about a number of
+        nodes, along with the paths to the current node and along the inputs.
+
+        A branch is as recent as the most recently visited node in it. Handles
+        to nodes from before the eviction are no longer alive.
+        """
+
+        start = time.perf_counter()
+        tree = self._tree
+        parents = tree.parents
+
+        # Parents always come before their children, so walking backwards
+        # finds the most recent visit in each branch.
+        recency = array("I", tree.last_visits)
+        for index in range(len(tree) - 1, -1, -1):
+            parent = parents[index]
+            if parent != NO_NODE and recency[parent] < recency[index]:
+                recency[parent] = recency[index]
+
+        # Keep the most recent branches. Since a branch is at least as recent
+        # as any of its own branches, parents of kept nodes are also kept.
+        keep = bytearray(len(tree))
+        if node_count > 0:
+            threshold = sorted(recency, reverse=True)[min(node_count, len(tree)) - 1]
+            for index, last_visit in enumerate(recency):
+                if last_visit >= threshold:
+                    keep[index] = True
+
+        for index in self._protected_nodes():
+            while index != NO_NODE and not keep[index]:
+                keep[index] = True
+                index = parents[index]
+
+        mapping = tree.compact(keep)
+        self._states = {
+            id: mapping[index]
+            for id, index in self._states.items()
+            if mapping[index] != NO_NODE
+        }
+        self._entry_bytes = _entry_bytes(self._states)
+        self._current = NO_NODE if self._current == NO_NODE else mapping[self._current]
+        self._root = NO_NODE if self._root == NO_NODE else mapping[self._root]
+
+        evicted = len(mapping) - len(tree)
+        self.evicted += evicted
+        log.info(
+            "Evicted %d game states, keeping %d (%.1f MB) in %.0f ms",
+            evicted,
+            len(tree),
+            self.memory_usage() / 1e6,
+            (time.perf_counter() - start) * 1000,
+        )
+
+    def _protected_nodes(self) -> list[int]:
+        """Return the nodes whose paths must not be evicted."""
+
+        nodes = [self._current, self._root]
+        if self._root != NO_NODE:
+            nodes.append(self._follow_inputs(self._tree, self._root))
+        return nodes
+
+    def _follow_inputs(self, tree: TreeStore, node: int) -> int:
+        """Return the last node reached by following the inputs from a node."""
+
+        if self._inputs is not None:
+            for intents in self._inputs:
+                child = tree.child(node, pack_intents(intents))
+                if child == NO_NODE:
+                    break
+                node = child
+        return node
@@ -12,6 +12,10 @@ class Inputs(Broadcaster):
         super().__init__()
         self._frames = inputs if inputs is not None else []
 
+        # The first frame changed since the last broadcast, which subscribers
+        # can use to avoid looking at the frames that haven't changed.
+        self.first_changed_frame = len(self._frames)
+
     def __len__(self) -> int:
         return len(self._frames)
 
@@ -32,6 +36,7 @@ class Inputs(Broadcaster):
     def __setitem__(
         self, index: int | slice, value: Intents | Iterable[Intents]
     ) -> None:
+        self._changed(index)
         if isinstance(index, int):
             assert isinstance(value, Intents)
             self._frames[index] = value
@@ -45,9 +50,23 @@ class Inputs(Broadcaster):
     @overload
     def __delitem__(self, index: slice) -> None: ...
     def __delitem__(self, index: int | slice) -> None:
+        self._changed(index)
         del self._frames[index]
         self.broadcast()
 
+    def broadcast(self) -> None:
+        super().broadcast()
+        if not self._batching:
+            self.first_changed_frame = len(self._frames)
+
+    def _changed(self, index: int | slice) -> None:
+        if isinstance(index, int):
+            frame = index if index >= 0 else index + len(self._frames)
+        else:
+            frames = range(*index.indices(len(self._frames)))
+            frame = min(frames[0], frames[-1]) if frames else frames.start
+        self.first_changed_frame = min(self.first_changed_frame, frame)
+
 
 @dataclass(frozen=True, slots=True)
 class Intents:
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from dusted.broadcaster import Broadcaster
+from dusted.dustforce.event import pack_intents
+from dusted.models.game_states import GameStates, Node
+from dusted.models.inputs import Inputs
+from dusted.models.tree_store import NO_NODE, TreeStore
+
+
+class PredictedPath(Broadcaster):
+    """
+    The game states reached by following the inputs, as far as they are known.
+
+    The path is updated as the inputs change, from the first changed frame,
+    and as game states are added, from the end of the known path.
+    """
+
+    def __init__(self, inputs: Inputs, game_states: GameStates) -> None:
+        super().__init__()
+
+        self._inputs = inputs
+        self._game_states = game_states
+
+        # The node at each frame along the path.
+        self._tree: TreeStore | None = None
+        self._generation = 0
+        self._nodes: list[int] = []
+
+        # The first frame changed since the last broadcast, which subscribers
+        # can use to avoid looking at the frames that haven't changed.
+        self.first_changed_frame = 0
+
+        self._inputs.subscribe(self._on_inputs_change)
+        self._game_states.subscribe(self._on_game_states_change)
+        self._on_game_states_change()
+
+    @property
+    def node(self) -> Node | None:
+        """The last known game state along the path."""
+
+        if self._tree is None or not self._nodes:
+            return None
+        return Node(self._tree, self._nodes[-1])
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the game states are known for all of the inputs."""
+
+        return len(self._nodes) > len(self._inputs)
+
+    def broadcast(self) -> None:
+        super().broadcast()
+        if not self._batching:
+            self.first_changed_frame = len(self._nodes)
+
+    def _on_inputs_change(self) -> None:
+        # The state at a frame only depends on the inputs before it.
+        frame = self._inputs.first_changed_frame + 1
+        if frame < len(self._nodes):
+            del self._nodes[frame:]
+            self.first_changed_frame = min(self.first_changed_frame, frame)
+
+        self._extend()
+        self.broadcast()
+
+    def _on_game_states_change(self) -> None:
+        root = self._game_states.root
+        if root is None:
+            self._tree = None
+            self._nodes = []
+            self.first_changed_frame = 0
+        elif root.store is not self._tree or root.generation != self._generation:
+            self._tree = root.store
+            self._generation = root.generation
+            self._nodes = [root.index]
+            self.first_changed_frame = 0
+
+        self._extend()
+        self.broadcast()
+
+    def _extend(self) -> None:
+        """Follow the inputs from the end of the path, as far as is known."""
+
+        tree = self._tree
+        if tree is None or not self._nodes:
+            return
+
+        nodes = self._nodes
+        inputs = self._inputs
+        first_frame = frame = len(nodes)
+        while frame <= len(inputs):
+            child = tree.child(nodes[-1], pack_intents(inputs[frame - 1]))
+            if child == NO_NODE:
+                break
+            nodes.append(child)
+            frame += 1
+
+        self.first_changed_frame = min(self.first_changed_frame, first_frame)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from dusted.broadcaster import Broadcaster
+from dusted.models.game_states import GameStates, Node
+
+
+def _is_ancestor(ancestor: Node, node: Node) -> bool:
+    return ancestor.frame <= node.frame and node.ancestor(ancestor.frame) == ancestor
+
+
+class RecentBranches(Broadcaster):
+    """
+    The ends of the most recently explored branches of the game states.
+
+    A branch is extended while the game steps along it, and moved to the end
+    when the game reaches its end again. Going back to an earlier state on a
+    branch, such as the first state, leaves the branches as they are, and
+    stepping off a branch starts a new one.
+
+    :param count: The number of branches to keep
+    """
+
+    def __init__(self, game_states: GameStates, count: int) -> None:
+        super().__init__()
+
+        self._game_states = game_states
+        self._count = count
+
+        # The last game state of each branch, from least to most recent, and
+        # how many branches the game had left when they were last updated.
+        self._tips: list[Node] = []
+        self._branch_switches = game_states.branch_switches
+
+        self._game_states.subscribe(self._on_game_states_change)
+
+    @property
+    def tips(self) -> list[Node]:
+        return self._tips
+
+    def _on_game_states_change(self) -> None:
+        # Visit the states that the game left since the last change, as well
+        # as the current one, so that no branch in a batch of events is missed.
+        ends = self._game_states.branch_ends
+        left = min(self._game_states.branch_switches - self._branch_switches, len(ends))
+        self._branch_switches = self._game_states.branch_switches
+        nodes = list(ends)[len(ends) - left :]
+        if (current := self._game_states.current) is not None:
+            nodes.append(current)
+
+        tips = self._tips
+        for node in nodes:
+            tips = self._visit(tips, node)
+        tips = tips[-self._count :] if self._count > 0 else []
+
+        if tips != self._tips:
+            self._tips = tips
+            self.broadcast()
+
+    def _visit(self, tips: list[Node], node: Node) -> list[Node]:
+        """Return the branches after the game has reached a state."""
+
+        # Forget branches that were evicted, or are from another level.
+        tips = [tip for tip in tips if tip.alive and tip.store is node.store]
+        if not node.alive or (tips and tips[-1] == node):
+            return tips
+
+        # The game has continued along a branch, or reached its end again.
+        extended = [tip for tip in tips if _is_ancestor(tip, node)]
+        if extended:
+            return [tip for tip in tips if tip not in extended] + [node]
+
+        # The game has gone back to a state on a branch.
+        if any(_is_ancestor(node, tip) for tip in tips):
+            return tips
+
+        return [*tips, node]
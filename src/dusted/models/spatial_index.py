@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import math
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SpatialIndex(Generic[T]):
+    """
+    A uniform grid of items at points, for finding the items in a rectangle.
+
+    Finding the items in a rectangle only looks at the cells that overlap it,
+    so it takes time proportional to the number of items nearby, rather than
+    the total number of items.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], list[T]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def insert(self, item: T, x: float, y: float) -> None:
+        cell = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        self._cells.setdefault(cell, []).append(item)
+        self._count += 1
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> list[T]:
+        """
+        Return the items in a rectangle.
+
+        Items in the cells that overlap the edges of the rectangle may also be
+        returned, even if they are just outside of it.
+        """
+
+        cell_x0 = math.floor(x0 / self.cell_size)
+        cell_y0 = math.floor(y0 / self.cell_size)
+        cell_x1 = math.floor(x1 / self.cell_size)
+        cell_y1 = math.floor(y1 / self.cell_size)
+
+        items = []
+        if (cell_x1 - cell_x0 + 1) * (cell_y1 - cell_y0 + 1) > len(self._cells):
+            # The rectangle is larger than the occupied area, so check each
+            # occupied cell instead of each cell in the rectangle.
+            for (x, y), cell_items in self._cells.items():
+                if cell_x0 <= x <= cell_x1 and cell_y0 <= y <= cell_y1:
+                    items.extend(cell_items)
+        else:
+            for x in range(cell_x0, cell_x1 + 1):
+                for y in range(cell_y0, cell_y1 + 1):
+                    items.extend(self._cells.get((x, y), ()))
+        return items
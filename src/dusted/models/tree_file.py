@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import logging
+import struct
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import platformdirs
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import State
+from dusted.fileio import write_atomic
+from dusted.models.tree_store import NO_NODE, TreeStore
+
+TREES_DIR = Path(platformdirs.user_data_dir("dusted")) / "trees"
+
+# The header at the start of each file, which changes with the format.
+MAGIC = b"dusted tree 1\n"
+
+# Each node is stored as its id, parent index, packed intents and position.
+NODE_FORMAT = struct.Struct("<QiIff")
+
+# How many nodes to pack at once. Packing a chunk holds the GIL, so chunks
+# are small enough for a write in the background not to stall the GUI.
+PACK_CHUNK_NODES = 4096
+
+log = logging.getLogger(__name__)
+
+# Writes whole files in the background, one at a time so that files are
+# written in the order that they were saved.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tree-file")
+
+
+def wait_for_writes() -> None:
+    """Wait until every file that has been written in the background is done."""
+
+    _writer.submit(lambda: None).result()
+
+
+def tree_path(directory: Path, level: str, character: Character) -> Path:
+    """Return the path of the file for a level and character."""
+
+    return directory / f"{quote(level, safe='')}.{character.name.lower()}.tree"
+
+
+class TreeFile:
+    """
+    A file of the nodes in a tree store.
+
+    Nodes are only ever added to a tree store, other than when it is
+    compacted, so new nodes are appended to the end of the file. After the
+    store has been compacted, the whole file is written again on a worker
+    thread, from a copy of the store, so that saving a large tree doesn't
+    block the caller. Nodes added meanwhile are appended on the worker too.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+        self._tree: TreeStore | None = None
+        self._generation = 0
+        self._node_count = 0
+
+        # The last write on the worker thread, and whether any write there
+        # failed, so that the whole file is written again.
+        self._pending: Future[None] | None = None
+        self._failed = False
+
+    def read(self) -> TreeStore | None:
+        """
+        Read the tree store from the file, or return None if there isn't one.
+
+        Any incomplete or invalid nodes at the end of the file, for example
+        from being closed in the middle of writing, are ignored.
+        """
+
+        wait_for_writes()
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        if not data.startswith(MAGIC):
+            log.warning("Ignoring %s, which isn't a tree file", self.path)
+            return None
+
+        body = memoryview(data)[len(MAGIC) :]
+        complete = len(body) % NODE_FORMAT.size == 0
+        body = body[: len(body) - len(body) % NODE_FORMAT.size]
+
+        # Visit times aren't saved, so nodes are visited in the order that they
+        # were added, to give eviction an order to evict them in.
+        tree = TreeStore()
+        for id, parent, intents, x, y in NODE_FORMAT.iter_unpack(body):
+            if parent == NO_NODE:
+                index = tree.add_root(State(x=x, y=y), id)
+            elif 0 <= parent < len(tree):
+                index = tree.add_child(parent, intents, x, y, id)
+            else:
+                complete = False
+                break
+            tree.visit(index)
+
+        if len(tree) == 0:
+            return None
+
+        if not complete:
+            log.warning("Ignoring invalid nodes at the end of %s", self.path)
+
+        # If the end of the file is ignored, write the whole file next time.
+        self._tree = tree
+        self._generation = tree.generation
+        self._node_count = len(tree) if complete else 0
+        return tree
+
+    def write(self, tree: TreeStore) -> None:
+        """
+        Write the nodes that have been added since the last write.
+
+        :raises OSError: If new nodes couldn't be appended. Errors on the
+            worker thread are logged instead.
+        """
+
+        if (
+            tree is not self._tree
+            or tree.generation != self._generation
+            or self._failed
+        ):
+            self._tree = tree
+            self._generation = tree.generation
+            self._node_count = 0
+            self._failed = False
+
+        if self._node_count == len(tree):
+            return
+
+        start = self._node_count
+        columns = [
+            column[start:]
+            for column in (tree.ids, tree.parents, tree.intents, tree.xs, tree.ys)
+        ]
+        self._node_count = len(tree)
+
+        if start == 0 or (self._pending is not None and not self._pending.done()):
+            self._pending = _writer.submit(self._write_in_background, start, columns)
+        else:
+            self._write(start, columns)
+
+    def _write(self, start: int, columns: list[array[Any]]) -> None:
+        """Write nodes from copies of the columns of a tree store."""
+
+        chunks = [
+            b"".join(
+                map(
+                    NODE_FORMAT.pack,
+                    *(column[i : i + PACK_CHUNK_NODES] for column in columns),
+                )
+            )
+            for i in range(0, len(columns[0]), PACK_CHUNK_NODES)
+        ]
+        data = b"".join(chunks)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if start == 0:
+            write_atomic(self.path, MAGIC + data)
+        else:
+            with self.path.open("ab") as file:
+                file.write(data)
+
+    def _write_in_background(self, start: int, columns: list[array[Any]]) -> None:
+        try:
+            self._write(start, columns)
+        except OSError:
+            log.exception("Could not save game states to %s", self.path)
+            self._failed = True
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from typing import Any
+
+from dusted.dustforce.event import State, StateId, pack_intents, unpack_intents
+from dusted.models.inputs import Intents
+
+# The index used in place of a node that doesn't exist.
+NO_NODE = -1
+
+
+class TreeStore:
+    """
+    A tree of game states, stored as parallel arrays indexed by node.
+
+    Each node takes a few dozen bytes, rather than several Python objects and a
+    dict. Intents are stored packed, as in the binary event format. Children are
+    found through their parent's first child and their next siblings, as nodes
+    rarely have more than a handful of children.
+
+    Each node also has a jump pointer to one of its ancestors, chosen so that
+    any ancestor can be reached in O(log depth) steps, from Myers' "An
+    applicative random-access stack". This keeps ancestor queries fast on long
+    runs, at the cost of a single extra index per node.
+
+    Nodes can be removed by compacting the store, which renumbers the nodes
+    that are kept and increments the store's generation.
+    """
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.parents = array("i")
+        self.frames = array("I")
+        self.intents = array("I")
+        self.xs = array("f")
+        self.ys = array("f")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.jumps = array("i")
+        self.last_visits = array("I")
+
+        # The id that the game gave each state, so that the tree can be saved
+        # and loaded again.
+        self.ids = array("Q")
+
+        # Which nodes were kept by the last compaction, as a byte per node.
+        self._last_keep = b""
+
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add_root(self, state: State, id: StateId = 0) -> int:
+        """Add a node without a parent, returning its index."""
+
+        return self._add(NO_NODE, 0, 0, state.x, state.y, id)
+
+    def add_child(
+        self, parent: int, intents: int, x: float, y: float, id: StateId = 0
+    ) -> int:
+        """
+        Add a node after a parent, returning its index.
+
+        :param intents: The packed intents that lead from the parent to the node
+        """
+
+        index = self._add(parent, self.frames[parent] + 1, intents, x, y, id)
+        self.next_siblings[index] = self.first_children[parent]
+        self.first_children[parent] = index
+
+        # If the parent's jump and its jump's jump cover the same distance,
+        # skip over both, otherwise jump to the parent. The jump of a node only
+        # depends on its depth, which is what the common ancestor search needs.
+        jump = self.jumps[parent]
+        frames = self.frames
+        if frames[parent] - frames[jump] == frames[jump] - frames[self.jumps[jump]]:
+            self.jumps[index] = self.jumps[jump]
+        else:
+            self.jumps[index] = parent
+
+        return index
+
+    def visit(self, index: int) -> None:
+        """Mark a node as the most recently visited."""
+
+        self._clock += 1
+        self.last_visits[index] = self._clock
+
+    def memory_usage(self) -> int:
+        """Return the number of bytes used by the arrays."""
+
+        return len(self._last_keep) + sum(
+            values.buffer_info()[1] * values.itemsize for values in self._arrays()
+        )
+
+    def compact(self, keep: Sequence[int]) -> array[int]:
+        """
+        Remove the nodes that aren't kept, returning the new index of each node.
+
+        Nodes that are removed have a new index of NO_NODE. Nodes keep their
+        order, so parents still come before their children.
+
+        :param keep: Whether to keep each node, as a truth value. The parent of
+            a node that is kept must also be kept.
+        """
+
+        kept = [index for index in range(len(self)) if keep[index]]
+        self._last_keep = bytes(map(bool, keep))
+
+        mapping = array("i", [NO_NODE]) * len(self)
+        for new_index, index in enumerate(kept):
+            mapping[index] = new_index
+
+        parents = self.parents
+        jumps = self.jumps
+        self.parents = array(
+            "i",
+            [NO_NODE if parents[i] == NO_NODE else mapping[parents[i]] for i in kept],
+        )
+        self.frames = array("I", [self.frames[i] for i in kept])
+        self.intents = array("I", [self.intents[i] for i in kept])
+        self.xs = array("f", [self.xs[i] for i in kept])
+        self.ys = array("f", [self.ys[i] for i in kept])
+        self.jumps = array("i", [mapping[jumps[i]] for i in kept])
+        self.last_visits = array("I", [self.last_visits[i] for i in kept])
+        self.ids = array("Q", [self.ids[i] for i in kept])
+
+        self.first_children = array("i", [NO_NODE]) * len(kept)
+        self.next_siblings = array("i", [NO_NODE]) * len(kept)
+        for index, parent in enumerate(self.parents):
+            if parent != NO_NODE:
+                self.next_siblings[index] = self.first_children[parent]
+                self.first_children[parent] = index
+
+        self.generation += 1
+        return mapping
+
+    def kept_before(self, index: int) -> int:
+        """
+        Return how many of the nodes before an index were kept by the last
+        compaction, which is the new index of the first node kept from there.
+        """
+
+        return index - self._last_keep[:index].count(0)
+
+    def child(self, parent: int, intents: int) -> int:
+        """Return the child reached by holding packed intents, or NO_NODE."""
+
+        child = self.first_children[parent]
+        while child != NO_NODE and self.intents[child] != intents:
+            child = self.next_siblings[child]
+        return child
+
+    def children(self, parent: int) -> list[int]:
+        children = []
+        child = self.first_children[parent]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_siblings[child]
+        return children
+
+    def ancestor(self, index: int, frame: int) -> int:
+        """
+        Return the ancestor of a node at a frame.
+
+        :param frame: A frame no later than the node's
+        """
+
+        parents = self.parents
+        frames = self.frames
+        jumps = self.jumps
+
+        while frames[index] > frame:
+            jump = jumps[index]
+            index = jump if frames[jump] >= frame else parents[index]
+        return index
+
+    def common_ancestor(self, left: int, right: int) -> int:
+        """Return the deepest node that is an ancestor of both nodes, or NO_NODE."""
+
+        parents = self.parents
+        frames = self.frames
+        jumps = self.jumps
+
+        left = self.ancestor(left, frames[right])
+        right = self.ancestor(right, frames[left])
+
+        # The nodes are at the same depth, so their jumps are too. Take the
+        # jumps that don't reach a common ancestor, then step up to it.
+        while left != right:
+            if frames[left] == 0:
+                # Both nodes are roots, so they are in different trees.
+                return NO_NODE
+
+            if jumps[left] != jumps[right]:
+                left = jumps[left]
+                right = jumps[right]
+            else:
+                left = parents[left]
+                right = parents[right]
+
+        return left
+
+    def _add(
+        self, parent: int, frame: int, intents: int, x: float, y: float, id: StateId
+    ) -> int:
+        index = len(self.parents)
+        self.parents.append(parent)
+        self.frames.append(frame)
+        self.intents.append(intents)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.first_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.jumps.append(index)
+        self.last_visits.append(0)
+        self.ids.append(id)
+        return index
+
+    def _arrays(self) -> list[array[Any]]:
+        return [
+            self.parents,
+            self.frames,
+            self.intents,
+            self.xs,
+            self.ys,
+            self.first_children,
+            self.next_siblings,
+            self.jumps,
+            self.last_visits,
+            self.ids,
+        ]
+
+
+class Node:
+    """
+    A game state in a tree store.
+
+    Nodes are lightweight handles, which are created as they are needed, so
+    they should be compared with `==` rather than `is`. A handle is only valid
+    until the store is compacted, after which it is no longer alive.
+    """
+
+    __slots__ = ("store", "index", "generation")
+
+    def __init__(self, store: TreeStore, index: int) -> None:
+        self.store = store
+        self.index = index
+        self.generation = store.generation
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, Node)
+            and other.store is self.store
+            and other.index == self.index
+            and other.generation == self.generation
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.index, self.generation))
+
+    def __repr__(self) -> str:
+        return f"Node(index={self.index}, frame={self.frame})"
+
+    @property
+    def alive(self) -> bool:
+        """Whether the handle still refers to the same node in the store."""
+
+        return self.generation == self.store.generation
+
+    @property
+    def parent(self) -> Node | None:
+        parent = self.store.parents[self.index]
+        return None if parent == NO_NODE else Node(self.store, parent)
+
+    @property
+    def frame(self) -> int:
+        return self.store.frames[self.index]
+
+    @property
+    def intents(self) -> Intents | None:
+        """The intents held to reach this state, or None for the first state."""
+
+        if self.store.parents[self.index] == NO_NODE:
+            return None
+        return unpack_intents(self.store.intents[self.index])
+
+    @property
+    def state(self) -> State:
+        return State(x=self.store.xs[self.index], y=self.store.ys[self.index])
+
+    def after(self, intents: Intents) -> Node | None:
+        """
+        Return the game state after certain intents are held.
+
+        If the game state has not been seen then None is returned.
+        """
+
+        child = self.store.child(self.index, pack_intents(intents))
+        return None if child == NO_NODE else Node(self.store, child)
+
+    def children(self) -> list[Node]:
+        """Return the game states that have been seen after this one."""
+
+        return [Node(self.store, child) for child in self.store.children(self.index)]
+
+    def ancestor(self, frame: int) -> Node:
+        """
+        Return the game state that led to this one at an earlier frame.
+
+        :param frame: A frame no later than this state's
+        """
+
+        return Node(self.store, self.store.ancestor(self.index, frame))
+
+    def common_ancestor(self, other: Node) -> Node | None:
+        """
+        Return the common ancestor of this and another game state.
+
+        If there is no common ancestor, for example if the game states are from
+        different levels, or either game state is no longer alive, then None is
+        returned.
+        """
+
+        if other.store is not self.store or not (self.alive and other.alive):
+            return None
+
+        ancestor = self.store.common_ancestor(self.index, other.index)
+        return None if ancestor == NO_NODE else Node(self.store, ancestor)
+
+    def inputs(self, first_frame: int = 0) -> list[Intents]:
+        """Return the inputs that led to this state, from a frame onwards."""
+
+        parents = self.store.parents
+        frames = self.store.frames
+        packed_intents = self.store.intents
+
+        index = self.index
+        packed = deque[int]()
+        while parents[index] != NO_NODE and frames[index] > first_frame:
+            packed.appendleft(packed_intents[index])
+            index = parents[index]
+
+        inputs = []
+        for value in packed:
+            intents = unpack_intents(value)
+            assert intents is not None
+            inputs.append(intents)
+        return inputs
+
+    def positions(self, first_frame: int = 0) -> list[tuple[float, float]]:
+        """Return the position at each frame from a frame up to this state."""
+
+        parents = self.store.parents
+        frames = self.store.frames
+        xs = self.store.xs
+        ys = self.store.ys
+
+        index = self.index
+        positions = []
+        while index != NO_NODE and frames[index] >= first_frame:
+            positions.append((xs[index], ys[index]))
+            index = parents[index]
+
+        positions.reverse()
+        return positions
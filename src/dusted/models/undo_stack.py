@@ -96,6 +96,10 @@ class UndoStack(Broadcaster):
         self._unmodified_index = self._index
         self.broadcast()
 
+    def set_modified(self) -> None:
+        self._unmodified_index = -1
+        self.broadcast()
+
     def undo_text(self) -> str:
         if not self.can_undo:
             return ""
@@ -0,0 +1,32 @@
+import struct
+import zlib
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def encode_png(width: int, height: int, scanlines: bytes | bytearray) -> bytes:
+    """
+    Encode an RGBA image as a PNG.
+
+    :param scanlines: The rows of the image, each of which is a zero byte,
+        meaning that the row isn't filtered, followed by the RGBA pixels
+    """
+
+    header = struct.pack("!IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"".join(
+        [
+            SIGNATURE,
+            _chunk(b"IHDR", header),
+            _chunk(b"IDAT", zlib.compress(scanlines, 1)),
+            _chunk(b"IEND", b""),
+        ]
+    )
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack("!I", len(data))
+        + kind
+        + data
+        + struct.pack("!I", zlib.crc32(kind + data))
+    )
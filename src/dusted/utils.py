@@ -1,22 +1,60 @@
 import io
+from collections.abc import Sequence
 from pathlib import Path
 
-import requests
 from dustmaker.dfreader import DFReader
 from dustmaker.dfwriter import DFWriter
 from dustmaker.level import Level
-from dustmaker.replay import Replay
+from dustmaker.replay import Character, IntentStream, PlayerData, Replay
 
+from dusted.cache import cache
 from dusted.config import config
+from dusted.fileio import write_atomic
+from dusted.models.inputs import Intents
+
+DUSTKID_URL = "https://dustkid.com/backend8"
 
 
 def load_replay_from_dustkid(replay_id: str) -> Replay:
+    replay_data = fetch_replay_from_dustkid(replay_id)
+    return _read_replay(replay_data)
+
+
+def fetch_replay_from_dustkid(replay_id: str) -> bytes:
+    """Return the contents of a replay file from dustkid."""
+
+    return cache.fetch(
+        f"replay/{replay_id}",
+        lambda: _download_replay_from_dustkid(replay_id),
+        _read_replay,
+    )
+
+
+def download_replay_from_dustkid(replay_id: str) -> bytes:
+    """
+    Return the contents of a replay file from dustkid, without caching it.
+
+    :raises Exception: If the replay could not be downloaded or read.
+    """
+
+    replay_data = _download_replay_from_dustkid(replay_id)
+    _read_replay(replay_data)
+    return replay_data
+
+
+def _read_replay(replay_data: bytes) -> Replay:
+    return DFReader(io.BytesIO(replay_data)).read_replay()
+
+
+def _download_replay_from_dustkid(replay_id: str) -> bytes:
+    # Requests is slow to import, so only load it once it is needed.
+    import requests
+
     data = {"replay": replay_id}
-    response = requests.post("https://dustkid.com/backend8/get_replay.php", data=data)
+    response = requests.post(f"{DUSTKID_URL}/get_replay.php", data=data)
     if not response.ok:
         raise RuntimeError("Could not fetch replay from dustkid")
-    replay = DFReader(io.BytesIO(response.content)).read_replay()
-    return replay
+    return response.content
 
 
 def load_level(level_id: str) -> Level:
@@ -38,11 +76,26 @@ def load_level_from_file(level_id: str) -> Level | None:
 
 
 def load_level_from_dustkid(level_id: str) -> Level:
+    level_data = cache.fetch(
+        f"level/{level_id}",
+        lambda: _download_level_from_dustkid(level_id),
+        _read_level,
+    )
+    return _read_level(level_data)
+
+
+def _read_level(level_data: bytes) -> Level:
+    return DFReader(io.BytesIO(level_data)).read_level()
+
+
+def _download_level_from_dustkid(level_id: str) -> bytes:
+    import requests
+
     data = {"id": level_id}
-    response = requests.post("https://dustkid.com/backend8/level.php", data=data)
+    response = requests.post(f"{DUSTKID_URL}/level.php", data=data)
     if not response.ok:
         raise RuntimeError("Could not fetch level from dustkid")
-    return DFReader(io.BytesIO(response.content)).read_level()
+    return response.content
 
 
 def load_replay_from_file(filepath: str) -> Replay:
@@ -51,8 +104,57 @@ def load_replay_from_file(filepath: str) -> Replay:
 
 
 def write_replay_to_file(filepath: str, replay: Replay) -> None:
-    with open(filepath, "wb") as file:
-        DFWriter(file).write_replay(replay)
+    """Write a replay file, leaving any existing file intact if writing fails."""
+
+    replay_file = io.BytesIO()
+    DFWriter(replay_file).write_replay(replay)
+    write_atomic(filepath, replay_file.getvalue())
+
+
+def replay_from_intents(
+    level: str,
+    character: Character,
+    inputs: Sequence[Intents],
+) -> Replay:
+    """Return a single player replay that holds the given intents."""
+
+    intent_streams = {
+        IntentStream.X: [intents.x for intents in inputs],
+        IntentStream.Y: [intents.y for intents in inputs],
+        IntentStream.JUMP: [intents.jump for intents in inputs],
+        IntentStream.DASH: [intents.dash for intents in inputs],
+        IntentStream.FALL: [intents.fall for intents in inputs],
+        IntentStream.LIGHT: [intents.light for intents in inputs],
+        IntentStream.HEAVY: [intents.heavy for intents in inputs],
+        IntentStream.TAUNT: [intents.taunt for intents in inputs],
+    }
+    return Replay(
+        username=b"TAS",
+        level=level.encode(),
+        players=[PlayerData(character, intent_streams)],
+    )
+
+
+def intents_from_replay(replay: Replay) -> list[Intents]:
+    """Return the intents held on each frame of a replay's first player."""
+
+    inputs: list[Intents] = []
+    player_data = replay.players[0]
+    frame_count = max(len(stream) for stream in player_data.intents.values())
+    for frame in range(frame_count):
+        inputs.append(
+            Intents(
+                x=player_data.get_intent_value(IntentStream.X, frame),
+                y=player_data.get_intent_value(IntentStream.Y, frame),
+                jump=player_data.get_intent_value(IntentStream.JUMP, frame),
+                dash=player_data.get_intent_value(IntentStream.DASH, frame),
+                fall=player_data.get_intent_value(IntentStream.FALL, frame),
+                light=player_data.get_intent_value(IntentStream.LIGHT, frame),
+                heavy=player_data.get_intent_value(IntentStream.HEAVY, frame),
+                taunt=player_data.get_intent_value(IntentStream.TAUNT, frame),
+            )
+        )
+    return inputs
 
 
 def modifier_held(key_state: int) -> bool:
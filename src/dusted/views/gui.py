@@ -3,20 +3,27 @@ import itertools
 import logging
 import os
 import queue
+import time
 import tkinter as tk
 import tkinter.filedialog
 import tkinter.messagebox
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from dustmaker.replay import Character, IntentStream, PlayerData, Replay
+from dustmaker.replay import Character, Replay
 
 from dusted import dustforce, utils
+from dusted.cache import OfflineError, cache
 from dusted.config import config
+from dusted.dustforce.event_queue import LatencyTracker
 from dusted.models.cursor import Cursor
+from dusted.models.divergence import DivergenceTracker
 from dusted.models.game_states import GameStates
 from dusted.models.inputs import Inputs, Intents
 from dusted.models.inputs_grid import GRID_INTENTS, InputsGrid
 from dusted.models.level import Level
 from dusted.models.replay_diagnostics import ReplayDiagnostics
+from dusted.models.tree_file import TREES_DIR
 from dusted.models.undo_stack import UndoStack
 from dusted.models.value import Value
 from dusted.views.diagnostics_summary_view import DiagnosticsSummaryView
@@ -24,28 +31,57 @@ from dusted.views.dialog import SimpleDialog
 from dusted.views.inputs_view import InputsView
 from dusted.views.jump_to_frame import JumpToFrameDialog
 from dusted.views.level_view import LevelView
-from dusted.views.publish_replay_dialog import PublishReplayDialog
 from dusted.views.replay_metadata import ReplayMetadata, ReplayMetadataDialog
 
 LEVEL_PATTERN = r"START (.*)"
 COORD_PATTERN = r"(\d*) (-?\d*) (-?\d*)"
 
+# How long to spend applying events from the game each time they are handled.
+EVENT_BUDGET_SECONDS = 0.008
+
+# How often to save new game states, in milliseconds.
+SAVE_GAME_STATES_INTERVAL = 5000
+
 log = logging.getLogger(__name__)
 
 
+def _save_replay(
+    filepath: str,
+    level: str,
+    character: Character,
+    inputs: tuple[Intents, ...],
+) -> None:
+    """Write a replay file. This is run on a worker thread."""
+
+    start = time.perf_counter()
+    try:
+        utils.write_replay_to_file(
+            filepath, utils.replay_from_intents(level, character, inputs)
+        )
+    except Exception:
+        log.exception("Saving %s failed", filepath)
+        raise
+    duration = time.perf_counter() - start
+    log.info("Saved %s (%d frames) in %.1f ms", filepath, len(inputs), duration * 1000)
+
+
 class LoadReplayDialog(SimpleDialog):
     def __init__(self, app):
         super().__init__(app, "Replay id:", "Load")
         self.app = app
 
     def ok(self, replay_id):
-        replay = utils.load_replay_from_dustkid(replay_id)
+        try:
+            replay = utils.load_replay_from_dustkid(replay_id)
+        except OfflineError as error:
+            tkinter.messagebox.showerror(message=str(error))
+            return False
         self.app.load_replay(replay)
         return True
 
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self) -> None:
         super().__init__()
 
         # Log exceptions
@@ -61,14 +97,24 @@ class App(tk.Tk):
         self._cursor = Cursor(InputsGrid(self._inputs))
         self._undo_stack = UndoStack(self._inputs, self._cursor)
         self._show_level = Value(config.show_level)
-        self._game_states = GameStates()
+        self._game_states = GameStates(
+            self._inputs,
+            max_bytes=config.game_states_size_mb * 1024 * 1024,
+            directory=TREES_DIR,
+        )
+        self._divergence = DivergenceTracker(self._inputs, self._game_states)
+
+        # Replays are written on a worker thread, one at a time.
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_save: Future[None] | None = None
+        self._failed_save: Future[None] | None = None
 
         self._diagnostics.subscribe(self.on_diagnostics_change)
         self._undo_stack.subscribe(self.on_undo_stack_change)
         self._show_level.subscribe(self.on_show_level_change)
-        self._game_states.subscribe(self.on_game_states_change)
+        self._divergence.subscribe(self.on_divergence_change)
 
-        self.write_config_timer = None
+        self.write_config_timer: str | None = None
 
         # Menu bar
         menu_bar = tk.Menu(self)
@@ -169,6 +215,41 @@ class App(tk.Tk):
         )
         show_level.trace_add("write", lambda *_: self._show_level.set(show_level.get()))
 
+        show_explored_states = tk.BooleanVar(self, value=config.show_explored_states)
+        view_menu.add_checkbutton(
+            label="Show explored states",
+            variable=show_explored_states,
+            onvalue=True,
+            offvalue=False,
+        )
+        show_explored_states.trace_add(
+            "write",
+            lambda *_: self.set_show_explored_states(show_explored_states.get()),
+        )
+
+        show_recent_branches = tk.BooleanVar(self, value=config.show_recent_branches)
+        view_menu.add_checkbutton(
+            label="Show recent branches",
+            variable=show_recent_branches,
+            onvalue=True,
+            offvalue=False,
+        )
+        show_recent_branches.trace_add(
+            "write",
+            lambda *_: self.set_show_recent_branches(show_recent_branches.get()),
+        )
+
+        raster_level = tk.BooleanVar(self, value=config.raster_level)
+        view_menu.add_checkbutton(
+            label="Draw level as images",
+            variable=raster_level,
+            onvalue=True,
+            offvalue=False,
+        )
+        raster_level.trace_add(
+            "write", lambda *_: self.set_raster_level(raster_level.get())
+        )
+
         settings_menu = tk.Menu(menu_bar, tearoff=0)
         menu_bar.add_cascade(label="Settings", underline=0, menu=settings_menu)
 
@@ -177,6 +258,15 @@ class App(tk.Tk):
             command=self.set_dustforce_directory,
         )
 
+        offline = tk.BooleanVar(self, value=config.offline)
+        settings_menu.add_checkbutton(
+            label="Offline mode",
+            variable=offline,
+            onvalue=True,
+            offvalue=False,
+        )
+        offline.trace_add("write", lambda *_: self.set_offline(offline.get()))
+
         self.config(menu=menu_bar)
 
         # Widgets
@@ -205,6 +295,9 @@ class App(tk.Tk):
             self._inputs,
             self._game_states,
         )
+        self.level_view.set_show_heatmap(config.show_explored_states)
+        self.level_view.set_show_ghosts(config.show_recent_branches)
+        self.level_view.set_raster_level(config.raster_level)
         inputs_view = InputsView(
             self,
             self._inputs,
@@ -243,14 +336,32 @@ class App(tk.Tk):
         self.bind("<F5>", lambda e: self.watch())
         self.bind("<F6>", lambda e: self.load_state_and_watch())
 
+        # Wake up when the game sends events, rather than polling for them.
+        self._event_latency = LatencyTracker()
+        self.bind("<<EventsReady>>", lambda e: self.handle_stdout())
+        dustforce.events.set_wakeup(self._wake_for_events)
         self.after_idle(self.handle_stdout)
 
+        self.after(SAVE_GAME_STATES_INTERVAL, self.save_game_states)
+
         # Check if the Dustforce directory is valid
         if not os.path.isdir(config.dustforce_path):
             tkinter.messagebox.showwarning(
                 message="Could not find the Dustforce directory. Please update it in Settings."
             )
 
+    def destroy(self) -> None:
+        dustforce.events.set_wakeup(None)
+        self._game_states.flush()
+        cache.save()
+        super().destroy()
+
+    def save_game_states(self) -> None:
+        """Save new game states every so often, in case Dusted is closed."""
+
+        self._game_states.flush()
+        self.after(SAVE_GAME_STATES_INTERVAL, self.save_game_states)
+
     def write_config_soon(self) -> None:
         """
         Schedule writing the config file.
@@ -284,46 +395,69 @@ class App(tk.Tk):
                 title += " [*]"
         self.title(title)
 
-    def handle_stdout(self):
+    def _wake_for_events(self) -> None:
+        """Called on a reader thread when the game sends events."""
+
+        # Tk passes calls from other threads to the main loop.
         try:
-            while 1:
-                event = dustforce.events.get_nowait()
-                self._game_states.on_event(event)
-        except queue.Empty:
-            self.after(16, self.handle_stdout)
+            self.event_generate("<<EventsReady>>", when="tail")
+        except (RuntimeError, tk.TclError):
+            # The window has been closed.
+            pass
+
+    def handle_stdout(self) -> None:
+        """Apply the events that the game has sent."""
+
+        dustforce.events.clear_wakeup()
+
+        # Only spend a limited time applying events, so that a burst of events
+        # can't stop the window from responding.
+        deadline = time.perf_counter() + EVENT_BUDGET_SECONDS
+        applied = []
+        with self._game_states.batch():
+            try:
+                while time.perf_counter() < deadline:
+                    batch = dustforce.events.get_nowait()
+                    if dustforce.connection.is_stale(batch.session):
+                        continue
+                    self._game_states.apply_events(batch.events)
+                    applied.append(batch)
+            except queue.Empty:
+                pass
+            else:
+                # Let Tk handle other events before continuing.
+                self.after(1, self.handle_stdout)
+
+        for batch in applied:
+            self._event_latency.record(batch)
 
     def watch(self):
         if self.save_file():
-            dustforce.watch_replay(self._filepath.get())
+            filepath = self._filepath.get()
+            self.when_saved(lambda: dustforce.watch_replay(filepath))
 
     def load_state_and_watch(self):
         if self.save_file():
-            dustforce.watch_replay_load_state(self._filepath.get())
+            filepath = self._filepath.get()
+            self.when_saved(lambda: dustforce.watch_replay_load_state(filepath))
 
     def _current_replay(self) -> Replay:
         """Return a replay instance created from the current application state."""
 
-        intent_streams = {
-            IntentStream.X: [intents.x for intents in self._inputs],
-            IntentStream.Y: [intents.y for intents in self._inputs],
-            IntentStream.JUMP: [intents.jump for intents in self._inputs],
-            IntentStream.DASH: [intents.dash for intents in self._inputs],
-            IntentStream.FALL: [intents.fall for intents in self._inputs],
-            IntentStream.LIGHT: [intents.light for intents in self._inputs],
-            IntentStream.HEAVY: [intents.heavy for intents in self._inputs],
-            IntentStream.TAUNT: [intents.taunt for intents in self._inputs],
-        }
-        return Replay(
-            username=b"TAS",
-            level=self._level.get().encode(),
-            players=[PlayerData(self._character.get(), intent_streams)],
+        return utils.replay_from_intents(
+            self._level.get(),
+            self._character.get(),
+            tuple(self._inputs),
         )
 
     def save_file(self, save_as: bool = False) -> bool:
         """
         Save the current replay to a file.
 
-        :return: True if the file was saved.
+        The file is written in the background. Use `when_saved` to wait for it
+        to be written.
+
+        :return: True if the file is being saved, or was already saved.
         """
 
         filepath = self._filepath.get()
@@ -339,12 +473,45 @@ class App(tk.Tk):
         elif not self._undo_stack.is_modified:
             return True
 
-        replay = self._current_replay()
-        utils.write_replay_to_file(filepath, replay)
+        # Take a snapshot of the inputs, since they can be edited while the
+        # file is being written.
+        self._pending_save = self._save_executor.submit(
+            _save_replay,
+            filepath,
+            self._level.get(),
+            self._character.get(),
+            tuple(self._inputs),
+        )
         self._undo_stack.set_unmodified()
+        self.when_saved(lambda: None)
 
         return True
 
+    def when_saved(self, callback: Callable[[], None]) -> None:
+        """Call a function once the pending save has finished successfully."""
+
+        save = self._pending_save
+        if save is None:
+            callback()
+            return
+
+        if not save.done():
+            self.after(10, lambda: self.when_saved(callback))
+            return
+
+        if save is self._pending_save:
+            self._pending_save = None
+
+        if error := save.exception():
+            # Only report the failure once, even if several callbacks waited.
+            if save is not self._failed_save:
+                self._failed_save = save
+                self._undo_stack.set_modified()
+                tkinter.messagebox.showerror(message=f"Saving replay failed:\n{error}")
+            return
+
+        callback()
+
     def new_file(self):
         def callback(metadata: ReplayMetadata):
             self._filepath.set(None)
@@ -391,6 +558,10 @@ The exported nexus script will be legal, but may not play back as expected.""",
             )
             return
 
+        # Publishing pulls in requests, which is slow to import, so only load
+        # the dialog once it is needed.
+        from dusted.views.publish_replay_dialog import PublishReplayDialog
+
         PublishReplayDialog(self, self._current_replay())
 
     def jump_to_previous_diagnostic(self) -> None:
@@ -450,25 +621,17 @@ The exported nexus script will be legal, but may not play back as expected.""",
     def import_inputs_from_dustforce(self) -> None:
         """Import inputs from the game."""
 
-        node = self._game_states.current
-        if node is None:
-            return
-
-        game_inputs = node.inputs()
-
-        # Find the first place that the imported game inputs diverge from the
-        # current inputs.
-        for frame, (left, right) in enumerate(zip(game_inputs, self._inputs)):
-            if left != right:
-                break
-        else:
+        node = self._divergence.node
+        frame = self._divergence.first_differing_frame
+        if node is None or frame is None:
             # The inputs are identical.
             return
 
-        # Paste in the the modified inputs from that frame onwards.
+        # Paste in the the modified inputs from the first place that the game
+        # inputs diverge from the current inputs.
         with self._undo_stack.execute("Import inputs"):
-            self._inputs[frame : len(game_inputs)] = game_inputs[frame:]
-            self._cursor.select((len(GRID_INTENTS) - 1, len(game_inputs) - 1, 0, frame))
+            self._inputs[frame : node.frame] = node.inputs(frame)
+            self._cursor.select((len(GRID_INTENTS) - 1, node.frame - 1, 0, frame))
 
     def open_file(self):
         filepath = tkinter.filedialog.askopenfilename(
@@ -485,23 +648,8 @@ The exported nexus script will be legal, but may not play back as expected.""",
         self._level.set(replay.level.decode())
         self._character.set(replay.players[0].character)
 
-        inputs: list[Intents] = []
-        player_data = replay.players[0]
-        frame_count = max(len(stream) for stream in player_data.intents.values())
-        for frame in range(frame_count):
-            inputs.append(
-                Intents(
-                    x=player_data.get_intent_value(IntentStream.X, frame),
-                    y=player_data.get_intent_value(IntentStream.Y, frame),
-                    jump=player_data.get_intent_value(IntentStream.JUMP, frame),
-                    dash=player_data.get_intent_value(IntentStream.DASH, frame),
-                    fall=player_data.get_intent_value(IntentStream.FALL, frame),
-                    light=player_data.get_intent_value(IntentStream.LIGHT, frame),
-                    heavy=player_data.get_intent_value(IntentStream.HEAVY, frame),
-                    taunt=player_data.get_intent_value(IntentStream.TAUNT, frame),
-                )
-            )
-        self._inputs[:] = inputs
+        self._inputs[:] = utils.intents_from_replay(replay)
+        self._game_states.open(self._level.get(), self._character.get())
 
         self._undo_stack.clear()
         if filepath is not None:
@@ -513,6 +661,38 @@ The exported nexus script will be legal, but may not play back as expected.""",
             config.dustforce_path = new_path
             self.write_config_soon()
 
+    def set_show_explored_states(self, show: bool) -> None:
+        """Show every game state that has been seen in the level view."""
+
+        self.level_view.set_show_heatmap(show)
+        if config.show_explored_states != show:
+            config.show_explored_states = show
+            self.write_config_soon()
+
+    def set_show_recent_branches(self, show: bool) -> None:
+        """Show the paths of recently explored branches in the level view."""
+
+        self.level_view.set_show_ghosts(show)
+        if config.show_recent_branches != show:
+            config.show_recent_branches = show
+            self.write_config_soon()
+
+    def set_raster_level(self, raster: bool) -> None:
+        """Draw the level geometry as cached images, rather than as polygons."""
+
+        self.level_view.set_raster_level(raster)
+        if config.raster_level != raster:
+            config.raster_level = raster
+            self.write_config_soon()
+
+    def set_offline(self, offline: bool) -> None:
+        """Only load replays and levels from the cache when offline."""
+
+        cache.offline = offline
+        if config.offline != offline:
+            config.offline = offline
+            self.write_config_soon()
+
     def on_diagnostics_change(self) -> None:
         """Called when the diagnostics change."""
 
@@ -573,17 +753,11 @@ The exported nexus script will be legal, but may not play back as expected.""",
             config.show_level = show
             self.write_config_soon()
 
-    def on_game_states_change(self) -> None:
-        """Called when the game states change."""
+    def on_divergence_change(self) -> None:
+        """Called when the game states or inputs change."""
 
         # Enable/disable the import inputs button.
-        node = self._game_states.current
-        if node is None:
-            enable_import_inputs = False
-        else:
-            game_inputs = node.inputs()
-            enable_import_inputs = self._inputs[: len(game_inputs)] != game_inputs
-
+        enable_import_inputs = self._divergence.first_differing_frame is not None
         import_inputs_state = tk.NORMAL if enable_import_inputs else tk.DISABLED
         if self.edit_menu.entrycget(8, "state") != import_inputs_state:
             self.edit_menu.entryconfig(8, state=import_inputs_state)
@@ -1,11 +1,62 @@
+import base64
 import math
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from weakref import WeakKeyDictionary
 
-from dusted import geom, utils
+from dusted import utils
 from dusted.models.cursor import Cursor
-from dusted.models.game_states import GameStates, Node
+from dusted.models.density_grid import DensityGrid, bin_positions
+from dusted.models.game_states import GameStates
 from dusted.models.inputs import Inputs
 from dusted.models.level import Level
+from dusted.models.predicted_path import PredictedPath
+from dusted.models.recent_branches import RecentBranches
+from dusted.models.spatial_index import SpatialIndex
+from dusted.models.tree_store import TreeStore
+
+# The size of a cell of the explored states heatmap, in level pixels.
+HEATMAP_CELL_SIZE = 8
+
+# The size of a pixel of the heatmap image, in screen pixels. Cells are merged
+# when zoomed out until they are at least this big.
+HEATMAP_PIXEL_SIZE = 4
+
+# How much of the level around the view to draw the heatmap for, as a fraction
+# of the size of the view, so that panning doesn't need a redraw straight away.
+HEATMAP_MARGIN = 0.5
+
+# How long to wait for more game states before redrawing the heatmap.
+HEATMAP_DELAY_MS = 250
+
+# The most new game states to add to the heatmap on the GUI thread. More than
+# this are binned on a worker thread.
+HEATMAP_INLINE_STATES = 20000
+
+# The number of recently explored branches to draw as ghost paths.
+GHOST_BRANCH_COUNT = 8
+
+# The size of a cell of the index of ghost path positions, in level pixels.
+GHOST_INDEX_CELL_SIZE = 256
+
+# The most objects to draw ghost paths with, however many are visible.
+MAX_GHOST_OBJECTS = 1000
+
+# How long to wait for the view to settle before redrawing ghost paths.
+GHOST_DELAY_MS = 50
+
+# The width and height of each image that the level is drawn with, when it is
+# drawn as images.
+TILE_IMAGE_PIXELS = 256
+
+# The most level images to keep, across every zoom level.
+TILE_IMAGE_CACHE_SIZE = 128
+
+# How often to check for level images that have finished being drawn.
+TILE_IMAGE_DELAY_MS = 16
+
+TileKey = tuple[float, int, int]
 
 
 class LevelView(tk.Canvas):
@@ -23,10 +74,42 @@ class LevelView(tk.Canvas):
         self._level.subscribe(self._on_level_change)
         self._cursor = cursor
         self._cursor.subscribe(self._on_cursor_move)
-        self._inputs = inputs
-        self._inputs.subscribe(self._update_path)
         self._game_states = game_states
-        self._game_states.subscribe(self._update_path)
+        self._path = PredictedPath(inputs, game_states)
+        self._path.subscribe(self._update_path)
+        self._game_states.subscribe(self._schedule_heatmap)
+
+        self._show_heatmap = True
+        self._heatmap_timer: str | None = None
+
+        # The density of the game states of each tree, which is kept while the
+        # heatmap is hidden or another tree is shown, and the states that are
+        # being binned on another thread, with the tree, the index after the
+        # last state and the tree's generation.
+        self._heatmaps: WeakKeyDictionary[TreeStore, DensityGrid] = WeakKeyDictionary()
+        self._heatmap_executor = ThreadPoolExecutor(max_workers=1)
+        self._heatmap_binning: (
+            tuple[TreeStore, int, int, Future[dict[tuple[int, int], int]]] | None
+        ) = None
+
+        self._branches = RecentBranches(game_states, GHOST_BRANCH_COUNT)
+        self._branches.subscribe(self._invalidate_ghosts)
+        self._path.subscribe(self._invalidate_ghosts)
+
+        self._show_ghosts = False
+        self._ghost_timer: str | None = None
+
+        # The tiles of the level, by row.
+        self._tile_rows: dict[int, list[int]] = {}
+        self._tiles: set[tuple[int, int]] = set()
+
+        # When drawing the level as images, they are drawn on another thread
+        # and kept for each zoom level, so panning only needs to move them.
+        self._raster_level = False
+        self._tile_executor = ThreadPoolExecutor(max_workers=1)
+        self._tile_images: OrderedDict[TileKey, tk.PhotoImage | None] = OrderedDict()
+        self._pending_tile_images: dict[TileKey, Future[bytes | None]] = {}
+        self._tile_timer: str | None = None
 
         self.bind("<Button-4>", self._on_scroll)  # Linux
         self.bind("<Button-5>", self._on_scroll)
@@ -37,6 +120,7 @@ class LevelView(tk.Canvas):
         self.bind("<B3-Motion>", self._on_right_click)
         self.bind("<Shift-Button-3>", lambda e: self._on_right_click(e, True))
         self.bind("<Shift-B3-Motion>", lambda e: self._on_right_click(e, True))
+        self.bind("<Configure>", lambda e: self._on_configure())
 
         self.reset()
 
@@ -48,32 +132,58 @@ class LevelView(tk.Canvas):
         # Previous mouse position, used for drag events.
         self._prev_mx = self._prev_my = 0.0
 
-        # The final node in the currently shown path.
-        self._path_node: Node | None = None
-
         # The coordinates of each state along the path.
         self._coords: list[tuple[float, float]] = []
 
         # The objects making up the path.
         self._path_objects: list[int] = []
 
+        # The marker at the end of the path, if the rest of it isn't known.
+        self._unknown_object: int | None = None
+
         # The rectangle showing the position at the current frame.
         self._position_object: int | None = None
 
+        # The density of the game states shown, and the grids with merged
+        # cells for each zoom level, drawn as a single image around the view.
+        self._heatmap: DensityGrid | None = None
+        self._coarse_heatmaps: dict[int, DensityGrid] = {}
+        self._heatmap_image: tk.PhotoImage | None = None
+        self._heatmap_object: int | None = None
+        self._heatmap_region: tuple[float, float, float, float] | None = None
+        self._heatmap_stale = True
+
+        # The positions along each ghost path, and an index of them, which is
+        # None if it needs to be built again.
+        self._ghost_paths: list[list[tuple[float, float]]] = []
+        self._ghost_index: SpatialIndex[tuple[int, int]] | None = None
+
+        # The level images that are on the canvas, by column and row.
+        self._placed_tile_images: dict[tuple[int, int], tuple[int, tk.PhotoImage]] = {}
+
         self.delete("all")
 
+    def destroy(self) -> None:
+        self._tile_executor.shutdown(wait=False, cancel_futures=True)
+        self._heatmap_executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
+
     def _on_level_change(self) -> None:
+        from dusted import geom
+
         self.reset()
 
         level_data = utils.load_level(self._level.get())
-        tiles = {(x, y) for layer, x, y in level_data.tiles if layer == 19}
-        outlines = geom.tile_outlines(tiles)
-        for outline in outlines:
-            self.create_polygon(*[(48 * x, 48 * y) for x, y in outline[0]], fill="#bbb")
-            for hole in outline[1:]:
-                self.create_polygon(
-                    *[(48 * x, 48 * y) for x, y in hole], fill="#d9d9d9"
-                )
+        self._tiles = {(x, y) for layer, x, y in level_data.tiles if layer == 19}
+        self._tile_rows = geom.tile_rows(self._tiles)
+
+        # Images of the previous level are no use.
+        for future in self._pending_tile_images.values():
+            future.cancel()
+        self._pending_tile_images = {}
+        self._tile_images.clear()
+
+        self._draw_tiles()
 
         # Pan to level start.
         start = level_data.start_position()
@@ -81,22 +191,131 @@ class LevelView(tk.Canvas):
         height = self.winfo_height()
         self.pan(width // 2 - start.x, height // 2 - start.y)
 
+    def set_raster_level(self, raster: bool) -> None:
+        """Draw the level geometry as cached images, rather than as polygons."""
+
+        if self._raster_level != raster:
+            self._raster_level = raster
+            self._draw_tiles()
+
+    def _draw_tiles(self) -> None:
+        from dusted import geom
+
+        self.delete("tiles")
+        self._placed_tile_images = {}
+
+        if self._raster_level:
+            self._schedule_tile_images()
+            return
+
+        for outline in geom.tile_outlines(self._tiles):
+            self.create_polygon(
+                *[(48 * x, 48 * y) for x, y in outline[0]], fill="#bbb", tags="tiles"
+            )
+            for hole in outline[1:]:
+                self.create_polygon(
+                    *[(48 * x, 48 * y) for x, y in hole], fill="#d9d9d9", tags="tiles"
+                )
+        self._transform_object("tiles")
+        self.tag_lower("tiles")
+
+    def _schedule_tile_images(self) -> None:
+        if self._tile_timer is None and self._raster_level:
+            self._tile_timer = self.after(TILE_IMAGE_DELAY_MS, self._update_tile_images)
+
+    def _update_tile_images(self) -> None:
+        """
+        Place the level images that are in view, and start drawing the ones
+        that haven't been drawn yet.
+        """
+
+        from dusted import geom
+
+        self._tile_timer = None
+        if not self._raster_level:
+            return
+
+        # Keep the images that have finished being drawn.
+        for key, future in list(self._pending_tile_images.items()):
+            if future.done():
+                del self._pending_tile_images[key]
+                data = future.result()
+                self._tile_images[key] = (
+                    None
+                    if data is None
+                    else tk.PhotoImage(data=base64.b64encode(data).decode())
+                )
+        while len(self._tile_images) > TILE_IMAGE_CACHE_SIZE:
+            self._tile_images.popitem(last=False)
+
+        # Find the images that cover the view.
+        size = TILE_IMAGE_PIXELS
+        zoom = round(self._zoom_level, 6)
+        columns = range(
+            math.floor(-self._offset_x / size),
+            math.floor((self.winfo_width() - self._offset_x) / size) + 1,
+        )
+        rows = range(
+            math.floor(-self._offset_y / size),
+            math.floor((self.winfo_height() - self._offset_y) / size) + 1,
+        )
+        visible = {(i, j) for i in columns for j in rows}
+
+        for i, j in list(self._placed_tile_images):
+            if (i, j) not in visible:
+                obj, _ = self._placed_tile_images.pop((i, j))
+                self.delete(obj)
+
+        # Stop drawing images that have gone out of view.
+        for key, future in list(self._pending_tile_images.items()):
+            if key[0] != zoom or key[1:] not in visible:
+                future.cancel()
+                del self._pending_tile_images[key]
+
+        for i, j in sorted(visible - self._placed_tile_images.keys()):
+            key = (zoom, i, j)
+            if key in self._tile_images:
+                self._tile_images.move_to_end(key)
+                image = self._tile_images[key]
+                if image is not None:
+                    obj = self.create_image(
+                        i * size + self._offset_x,
+                        j * size + self._offset_y,
+                        image=image,
+                        anchor=tk.NW,
+                        tags="tiles",
+                    )
+                    self.tag_lower(obj)
+                    self._placed_tile_images[i, j] = (obj, image)
+            elif key not in self._pending_tile_images:
+                self._pending_tile_images[key] = self._tile_executor.submit(
+                    geom.render_tiles,
+                    self._tile_rows,
+                    i * size / self._zoom_level,
+                    j * size / self._zoom_level,
+                    self._zoom_level,
+                    size,
+                )
+
+        if self._pending_tile_images:
+            self._schedule_tile_images()
+
     def _update_path(self) -> None:
+        """Show the path of the game states along the inputs, as far as known."""
+
+        if self._unknown_object is not None:
+            self.delete(self._unknown_object)
+            self._unknown_object = None
+
         # Clear the path if there is no state, or it is on a different level.
-        current_node = self._game_states.current
-        if current_node is None or self._game_states.level != self._level.get():
+        path_node = self._path.node
+        if path_node is None or self._game_states.level != self._level.get():
             while self._path_objects:
                 self.delete(self._path_objects.pop())
-            self._path_node = None
             self._coords = []
             return
 
-        if self._path_node is None:
-            first_differing_frame = 0
-        elif ancestor := self._path_node.common_ancestor(current_node):
-            first_differing_frame = ancestor.frame + 1
-        else:
-            first_differing_frame = 0
+        first_differing_frame = min(self._path.first_changed_frame, len(self._coords))
 
         # Clear the old suffix.
         remove_objects_from = max(0, first_differing_frame - 1)
@@ -108,25 +327,228 @@ class LevelView(tk.Canvas):
 
         # Add the new line segments.
         new_objects = []
-        new_coords = []
-        next_node = current_node
-        while next_node.frame >= first_differing_frame:
-            new_coords.append((next_node.state.x, next_node.state.y - 48))
-            if next_node.parent is None:
-                break
-            obj = self.create_line(
-                next_node.state.x,
-                next_node.state.y - 48,
-                next_node.parent.state.x,
-                next_node.parent.state.y - 48,
+        new_coords = [
+            (x, y - 48) for x, y in path_node.positions(first_differing_frame)
+        ]
+        prev_coords = self._coords[-1] if self._coords else None
+        for coords in new_coords:
+            if prev_coords is not None:
+                obj = self.create_line(*prev_coords, *coords)
+                self._transform_object(obj)
+                new_objects.append(obj)
+            prev_coords = coords
+
+        self._path_objects.extend(new_objects)
+        self._coords.extend(new_coords)
+
+        # Mark where the game states along the inputs stop being known.
+        if not self._path.is_complete:
+            x, y = self._coords[-1]
+            self._unknown_object = self.create_oval(
+                x - 12, y - 12, x + 12, y + 12, outline="red", width=2
             )
+            self._transform_object(self._unknown_object)
+
+    def set_show_heatmap(self, show: bool) -> None:
+        """Show or hide the heatmap of every game state that has been seen."""
+
+        self._show_heatmap = show
+        self._heatmap_stale = True
+        self._schedule_heatmap()
+
+    def _schedule_heatmap(self) -> None:
+        """Redraw the heatmap soon, so that many changes are drawn together."""
+
+        if self._heatmap_timer is None:
+            self._heatmap_timer = self.after(HEATMAP_DELAY_MS, self._update_heatmap)
+
+    def _update_heatmap(self) -> None:
+        self._heatmap_timer = None
+
+        root = self._game_states.root
+        if (
+            not self._show_heatmap
+            or root is None
+            or self._game_states.level != self._level.get()
+        ):
+            grid = None
+            changed = self._heatmap is not None
+        else:
+            tree = root.store
+            if (grid := self._heatmaps.get(tree)) is None:
+                grid = self._heatmaps[tree] = DensityGrid(HEATMAP_CELL_SIZE)
+            changed = self._bin_heatmap(tree, grid) or grid is not self._heatmap
+
+        self._heatmap = grid
+        if changed:
+            self._coarse_heatmaps = {}
+        elif not self._heatmap_stale:
+            return
+        self._heatmap_stale = False
+
+        if self._heatmap_object is not None:
+            self.delete(self._heatmap_object)
+            self._heatmap_object = None
+            self._heatmap_image = None
+            self._heatmap_region = None
+
+        if grid is None or not grid.counts:
+            return
+
+        # Merge cells until each one is at least a pixel of the image.
+        scale = self._zoom_level / HEATMAP_PIXEL_SIZE
+        factor = 1
+        while HEATMAP_CELL_SIZE * factor * scale < 1:
+            factor *= 2
+        if (coarse := self._coarse_heatmaps.get(factor)) is None:
+            coarse = self._coarse_heatmaps[factor] = grid.coarsen(factor)
+
+        # Only draw the view and a margin around it, so that the image stays
+        # the size of the view however far the states spread.
+        margin_x = self.winfo_width() * HEATMAP_MARGIN
+        margin_y = self.winfo_height() * HEATMAP_MARGIN
+        width = math.ceil((self.winfo_width() + 2 * margin_x) / HEATMAP_PIXEL_SIZE)
+        height = math.ceil((self.winfo_height() + 2 * margin_y) / HEATMAP_PIXEL_SIZE)
+        left = (-self._offset_x - margin_x) / self._zoom_level
+        top = (-self._offset_y - margin_y) / self._zoom_level
+        self._heatmap_region = (
+            left,
+            top,
+            left + width / scale,
+            top + height / scale,
+        )
+
+        # States are drawn 48 pixels above their position, like the path.
+        data = coarse.render(left, top + 48, scale, width, height)
+        if data is None:
+            return
+
+        image = tk.PhotoImage(data=base64.b64encode(data).decode())
+        self._heatmap_image = image.zoom(HEATMAP_PIXEL_SIZE)
+        self._heatmap_object = self.create_image(
+            left * self._zoom_level + self._offset_x,
+            top * self._zoom_level + self._offset_y,
+            image=self._heatmap_image,
+            anchor=tk.NW,
+            tags="heatmap",
+        )
+
+        # Draw the heatmap above the tiles, but below everything else.
+        self.tag_lower(self._heatmap_object)
+        self.tag_lower("tiles")
+
+    def _bin_heatmap(self, tree: TreeStore, grid: DensityGrid) -> bool:
+        """
+        Add the new game states of a tree to its grid, returning whether any
+        were added. Many states are binned on a worker thread, so that binning
+        a large tree doesn't stop the window from responding.
+        """
+
+        changed = False
+        if self._heatmap_binning is not None:
+            binning_tree, end, generation, future = self._heatmap_binning
+            if not future.done():
+                self._schedule_heatmap()
+                return False
+
+            self._heatmap_binning = None
+            binning_grid = self._heatmaps.get(binning_tree)
+            if binning_grid is not None and not future.cancelled():
+                binning_grid.sync(binning_tree)
+                added = binning_grid.add(binning_tree, future.result(), end, generation)
+                changed = added and binning_grid is grid
+
+        nodes = grid.sync(tree)
+        if len(nodes) > HEATMAP_INLINE_STATES:
+            future = self._heatmap_executor.submit(
+                bin_positions,
+                tree.xs[nodes.start : nodes.stop],
+                tree.ys[nodes.start : nodes.stop],
+                grid.cell_size,
+            )
+            self._heatmap_binning = (tree, nodes.stop, tree.generation, future)
+            self._schedule_heatmap()
+        elif nodes:
+            changed = grid.update(tree) or changed
+
+        return changed
+
+    def set_show_ghosts(self, show: bool) -> None:
+        """Show or hide the paths of the most recently explored branches."""
+
+        self._show_ghosts = show
+        self._schedule_ghosts()
+
+    def _invalidate_ghosts(self) -> None:
+        self._ghost_index = None
+        self._schedule_ghosts()
+
+    def _schedule_ghosts(self) -> None:
+        """Redraw the ghost paths soon, once the view has stopped changing."""
+
+        if self._ghost_timer is None:
+            self._ghost_timer = self.after(GHOST_DELAY_MS, self._draw_ghosts)
+
+    def _build_ghost_index(self) -> SpatialIndex[tuple[int, int]]:
+        """Index the positions of each recent branch that isn't on the path."""
+
+        index = SpatialIndex[tuple[int, int]](GHOST_INDEX_CELL_SIZE)
+        self._ghost_paths = []
+
+        path_node = self._path.node
+        for tip in self._branches.tips:
+            ancestor = None if path_node is None else path_node.common_ancestor(tip)
+            if ancestor == tip or not tip.alive:
+                continue
+
+            # Draw from where the branch leaves the path.
+            first_frame = 0 if ancestor is None else ancestor.frame
+            positions = [(x, y - 48) for x, y in tip.positions(first_frame)]
+            for i, (x, y) in enumerate(positions):
+                index.insert((len(self._ghost_paths), i), x, y)
+            self._ghost_paths.append(positions)
+
+        return index
+
+    def _draw_ghosts(self) -> None:
+        self._ghost_timer = None
+        self.delete("ghost")
+
+        if not self._show_ghosts or self._game_states.level != self._level.get():
+            return
+
+        if self._ghost_index is None:
+            self._ghost_index = self._build_ghost_index()
+
+        # Only draw the parts of the paths that are visible.
+        visible = self._ghost_index.query(
+            -self._offset_x / self._zoom_level,
+            -self._offset_y / self._zoom_level,
+            (self.winfo_width() - self._offset_x) / self._zoom_level,
+            (self.winfo_height() - self._offset_y) / self._zoom_level,
+        )
+        visible.sort()
+
+        # Join up consecutive visible positions, along with the position
+        # before each run, so that each run is drawn as a single line.
+        runs: list[tuple[int, int, int]] = []
+        for path, i in visible:
+            if runs and runs[-1][0] == path and runs[-1][2] == i:
+                runs[-1] = (path, runs[-1][1], i + 1)
+            else:
+                runs.append((path, max(0, i - 1), i + 1))
+
+        for path, start, end in runs[:MAX_GHOST_OBJECTS]:
+            positions = self._ghost_paths[path][start:end]
+            if len(positions) < 2:
+                continue
+            obj = self.create_line(*positions, fill="#aaa", tags="ghost")
             self._transform_object(obj)
-            new_objects.append(obj)
-            next_node = next_node.parent
 
-        self._path_objects.extend(reversed(new_objects))
-        self._coords.extend(reversed(new_coords))
-        self._path_node = current_node
+        # Draw ghost paths below the path, but above the heatmap and tiles.
+        self.tag_lower("ghost")
+        self.tag_lower("heatmap")
+        self.tag_lower("tiles")
 
     def select_frame(self, frame: int) -> None:
         if self._position_object is not None:
@@ -140,7 +562,7 @@ class LevelView(tk.Canvas):
         else:
             self._position_object = None
 
-    def _transform_object(self, i: int) -> None:
+    def _transform_object(self, i: int | str) -> None:
         self.scale(i, 0, 0, self._zoom_level, self._zoom_level)
         self.move(i, self._offset_x, self._offset_y)
 
@@ -150,10 +572,44 @@ class LevelView(tk.Canvas):
         self._offset_y = (self._offset_y - y) * scale + y
         self.scale("all", x, y, scale, scale)
 
+        # Images can't be scaled, so use the images for the new zoom level.
+        for obj, _ in self._placed_tile_images.values():
+            self.delete(obj)
+        self._placed_tile_images = {}
+        self._schedule_tile_images()
+
+        # The heatmap image can't be scaled, so draw it again.
+        self._heatmap_stale = True
+        self._schedule_heatmap()
+        self._schedule_ghosts()
+
     def pan(self, dx: float, dy: float) -> None:
         self._offset_x += dx
         self._offset_y += dy
         self.move("all", dx, dy)
+        self._schedule_tile_images()
+        self._check_heatmap_region()
+        self._schedule_ghosts()
+
+    def _on_configure(self) -> None:
+        self._schedule_tile_images()
+        self._check_heatmap_region()
+        self._schedule_ghosts()
+
+    def _check_heatmap_region(self) -> None:
+        """Redraw the heatmap soon if the view has left the region it covers."""
+
+        if self._heatmap_region is None:
+            return
+        left, top, right, bottom = self._heatmap_region
+        if (
+            -self._offset_x / self._zoom_level < left
+            or -self._offset_y / self._zoom_level < top
+            or (self.winfo_width() - self._offset_x) / self._zoom_level > right
+            or (self.winfo_height() - self._offset_y) / self._zoom_level > bottom
+        ):
+            self._heatmap_stale = True
+            self._schedule_heatmap()
 
     def _on_cursor_move(self) -> None:
         self.select_frame(self._cursor.current_col)
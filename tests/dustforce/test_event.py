@@ -1,8 +1,17 @@
+import itertools
 from unittest import TestCase
 
 from dustmaker.replay import Character
 
-from dusted.dustforce.event import LevelStartEvent, State, StepEvent, parse_event
+from dusted.dustforce.event import (
+    EventLineReader,
+    LevelStartEvent,
+    State,
+    StepEvent,
+    pack_intents,
+    parse_event,
+    parse_events,
+)
 from dusted.models.inputs import Intents
 
 
@@ -13,7 +22,7 @@ class TestEvent(TestCase):
                 '[dusted] level_start 14695981039346656037 "Main Nexus DX" 0 C1900000 3F800000'
             ),
             LevelStartEvent(
-                id="14695981039346656037",
+                id=14695981039346656037,
                 level="Main Nexus DX",
                 character=Character.DUSTMAN,
                 state=State(
@@ -29,8 +38,8 @@ class TestEvent(TestCase):
                 "[dusted] step 5184254573656646306 7448687232743006425 1 -1 2 0 0 0 11 0 43A3531D C38C9182"
             ),
             StepEvent(
-                id="5184254573656646306",
-                prev_id="7448687232743006425",
+                id=5184254573656646306,
+                prev_id=7448687232743006425,
                 intents=Intents(
                     x=1,
                     y=-1,
@@ -48,6 +57,19 @@ class TestEvent(TestCase):
             ),
         )
 
+    def test_trailing_fields(self):
+        """Test that fields after the state are ignored."""
+
+        self.assertEqual(
+            parse_event("[dusted] step 1 0 0 0 0 0 0 0 0 0 00000000 00000000 extra"),
+            StepEvent(
+                id=1,
+                prev_id=0,
+                intents=Intents.default(),
+                state=State(x=0.0, y=0.0),
+            ),
+        )
+
     def test_invalid(self):
         for invalid_event in [
             "",
@@ -57,5 +79,83 @@ class TestEvent(TestCase):
             '[dusted] level_start 0 "Um, let me just say-',
             "[dusted] step 0 0 1 2 3 4 5 6 7 8 00000000 00000000",
             "[dusted] step 0 0 0 0 0 0 0 0 0 0 WHATISUP DEADBEEF",
+            "[dusted] step 0 0 0 0 0 0 0 0 0 0 000000 0000000000",
+            "[dusted] step 0 0 0 0 0 0 0 0 0 0 00000000",
+            "[dusted] step one 0 0 0 0 0 0 0 0 0 00000000 00000000",
+            '[dusted] level_start one "Downhill" 0 00000000 00000000',
+            '[dusted] level_start 0 "Downhill" 9 00000000 00000000',
+            '[dusted] level_start 0 "Downhill"0 00000000 00000000',
         ]:
             self.assertEqual(parse_event(invalid_event), None)
+
+
+class TestBinaryEvents(TestCase):
+    TEXT_STEP = "[dusted] step 5184254573656646306 7448687232743006425 1 -1 2 0 0 0 11 0 43A3531D C38C9182"
+    BINARY_STEP = (
+        "[dusted] bstep 47F22C113FFFA2A2675F0D92C6A260D90002C02243A3531DC38C9182"
+    )
+
+    def test_binary_step_event(self):
+        """Test that binary steps decode to the same events as text steps."""
+
+        self.assertEqual(parse_event(self.BINARY_STEP), parse_event(self.TEXT_STEP))
+
+    def test_pack_intents(self):
+        """Test that every valid combination of intents survives being packed."""
+
+        for values in itertools.product(
+            (-1, 0, 1), (-1, 0, 1), (0, 2), (0, 1), (0, 2), range(12), (0, 11), (0, 2)
+        ):
+            intents = Intents(*values)
+            record = f"{1:016X}{0:016X}{pack_intents(intents):08X}{0:08X}{0:08X}"
+            step = parse_event(f"[dusted] bstep {record}")
+            assert isinstance(step, StepEvent)
+            self.assertEqual(step.intents, intents)
+
+    def test_parse_events(self):
+        """Test that text and binary events are parsed in order."""
+
+        level_start = '[dusted] level_start 0 "downhill" 0 00000000 00000000'
+        self.assertEqual(
+            parse_events(
+                [
+                    level_start,
+                    self.BINARY_STEP,
+                    self.BINARY_STEP[:-1] + "X",
+                    self.BINARY_STEP[:-2],
+                    "[dusted] bstep " + "F" * 56,
+                    self.BINARY_STEP,
+                    self.TEXT_STEP,
+                    self.BINARY_STEP,
+                ]
+            ),
+            [
+                parse_event(level_start),
+                *[parse_event(self.TEXT_STEP)] * 4,
+            ],
+        )
+
+
+class TestEventLineReader(TestCase):
+    def test_lines(self):
+        """Test that only complete event lines are returned."""
+
+        reader = EventLineReader()
+
+        self.assertEqual(reader.feed(b"Loading...\r\n[dusted] st"), [])
+        self.assertEqual(reader.feed(b"ep 1"), [])
+        self.assertEqual(
+            reader.feed(b" 2\r\nnoise [dusted]\n[dusted] level_start 3\n[dus"),
+            ["[dusted] step 1 2", "[dusted] level_start 3"],
+        )
+        self.assertEqual(reader.feed(b"ted] step 4\n"), ["[dusted] step 4"])
+
+    def test_long_line(self):
+        """Test a line that arrives over many small reads."""
+
+        reader = EventLineReader()
+        line = b"[dusted] step " + b"0" * 100_000
+
+        for i in range(0, len(line), 1000):
+            self.assertEqual(reader.feed(line[i : i + 1000]), [])
+        self.assertEqual(reader.feed(b"\n"), [line.decode()])
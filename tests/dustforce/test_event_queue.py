@@ -0,0 +1,138 @@
+import queue
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent, StepRun
+from dusted.dustforce.event_queue import EventQueue
+from dusted.models.inputs import Intents
+
+EVENT = LevelStartEvent(
+    id=0,
+    level="downhill",
+    character=Character.DUSTMAN,
+    state=State(x=0, y=0),
+)
+
+STEPS = [
+    StepEvent(
+        id=frame + 1,
+        prev_id=frame,
+        intents=Intents.default(),
+        state=State(x=frame + 1, y=0),
+    )
+    for frame in range(5)
+]
+
+
+class TestEventQueue(TestCase):
+    def test_batches(self):
+        """Test that batches come out in the order they went in."""
+
+        events = EventQueue()
+        events.put([EVENT])
+        events.put([EVENT, EVENT])
+
+        self.assertEqual(events.get_nowait().events, [EVENT])
+        self.assertEqual(events.get_nowait().events, [EVENT, EVENT])
+        with self.assertRaises(queue.Empty):
+            events.get_nowait()
+
+    def test_wakeup(self):
+        """Test that the wakeup is called once until it is cleared."""
+
+        events = EventQueue()
+        wakeup = Mock()
+        events.set_wakeup(wakeup)
+
+        events.put([EVENT])
+        events.put([EVENT])
+        wakeup.assert_called_once()
+
+        events.clear_wakeup()
+        self.assertEqual(events.get_nowait().events, [EVENT])
+        events.put([EVENT])
+        self.assertEqual(wakeup.call_count, 2)
+
+    def test_merge(self):
+        """Test that steps are merged into runs past the high-water mark."""
+
+        events = EventQueue(high_water_mark=2)
+        events.put([EVENT, STEPS[0]])
+        events.put(STEPS[1:3])
+        events.put([STEPS[3]], session=1)
+        events.put([STEPS[4]], session=1)
+
+        batch = events.get_nowait()
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch.events[:1], [EVENT])
+        run = batch.events[1]
+        assert isinstance(run, StepRun)
+        self.assertEqual(run.prev_id, 0)
+        self.assertEqual(list(run.ids), [1, 2, 3])
+        self.assertEqual(list(run.xs), [step.state.x for step in STEPS[:3]])
+        self.assertEqual(list(run.ys), [step.state.y for step in STEPS[:3]])
+
+        # Batches from different sessions are never merged.
+        batch = events.get_nowait()
+        self.assertEqual(batch.session, 1)
+        self.assertEqual(batch.events, [StepRun.from_steps(STEPS[3], STEPS[4])])
+
+        self.assertEqual(events.merged, 5)
+        self.assertEqual(events.delivered, 6)
+        self.assertEqual(events.dropped, 0)
+
+    def test_max_batch_events(self):
+        """Test that merged batches are capped, so that each can be applied quickly."""
+
+        events = EventQueue(high_water_mark=0, max_batch_events=2)
+        events.put([EVENT])
+        for step in STEPS:
+            events.put([step])
+        events.put([EVENT, EVENT, EVENT])
+
+        self.assertEqual(events.get_nowait().events, [EVENT, STEPS[0]])
+        self.assertEqual(
+            events.get_nowait().events, [StepRun.from_steps(STEPS[1], STEPS[2])]
+        )
+        self.assertEqual(
+            events.get_nowait().events, [StepRun.from_steps(STEPS[3], STEPS[4])]
+        )
+        self.assertEqual(events.get_nowait().events, [EVENT, EVENT])
+        self.assertEqual(events.get_nowait().events, [EVENT])
+        with self.assertRaises(queue.Empty):
+            events.get_nowait()
+        self.assertEqual(events.delivered, 9)
+
+    def test_backpressure(self):
+        """Test that putting into a full queue blocks until events are taken."""
+
+        events = EventQueue(max_pending=2)
+        events.put([EVENT, EVENT])
+
+        thread = threading.Thread(target=events.put, args=([EVENT],))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(events.blocked, 1)
+
+        self.assertEqual(len(events.get_nowait()), 2)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(events.get_nowait().events, [EVENT])
+
+    def test_discard_before(self):
+        """Test that batches from older sessions are dropped."""
+
+        events = EventQueue()
+        events.put([EVENT], session=0)
+        events.put([EVENT, EVENT], session=1)
+        events.put([EVENT], session=2)
+        events.discard_before(2)
+
+        self.assertEqual(events.get_nowait().session, 2)
+        with self.assertRaises(queue.Empty):
+            events.get_nowait()
+        self.assertEqual(events.dropped, 3)
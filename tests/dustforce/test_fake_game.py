@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from dustmaker.replay import Character
+
+from dusted import utils
+from dusted.dustforce.event import (
+    EventLineReader,
+    LevelStartEvent,
+    parse_event,
+    parse_events,
+)
+from dusted.dustforce.fake_game import Fnv1aHasher, generate_lines
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Intents
+
+INPUTS = [
+    Intents.default(),
+    Intents(1, 0, 2, 0, 0, 0, 0, 0),
+    Intents(1, -1, 1, 2, 0, 10, 0, 0),
+    Intents(-1, 1, 0, 0, 2, 0, 11, 1),
+]
+
+
+class TestFakeGame(TestCase):
+    def test_hasher(self):
+        """Test the hasher against known FNV-1a values."""
+
+        for value, expected in [
+            ("", 0xCBF29CE484222325),
+            ("a", 0xAF63DC4C8601EC8C),
+            ("foobar", 0x85944171F73967E8),
+        ]:
+            hasher = Fnv1aHasher()
+            hasher.push(value)
+            self.assertEqual(hasher.hash(), expected)
+
+    def test_generate_lines(self):
+        """Test that the lines build the tree of states that the inputs lead to."""
+
+        lines = list(generate_lines("downhill", Character.DUSTKID, INPUTS))
+        events = [parse_event(line.decode().rstrip()) for line in lines]
+
+        level_start = events[0]
+        assert isinstance(level_start, LevelStartEvent)
+        self.assertEqual(level_start.level, "downhill")
+        self.assertEqual(level_start.character, Character.DUSTKID)
+
+        game_states = GameStates()
+        game_states.apply_events(event for event in events if event is not None)
+        assert game_states.current is not None
+        self.assertEqual(game_states.current.inputs(), INPUTS)
+
+        # States are identified by the inputs that lead to them.
+        prefix = list(generate_lines("downhill", Character.DUSTKID, INPUTS[:2]))
+        self.assertEqual(prefix, lines[:3])
+
+    def test_binary(self):
+        """Test that binary steps describe the same states as text steps."""
+
+        text = generate_lines("downhill", Character.DUSTKID, INPUTS)
+        binary = generate_lines("downhill", Character.DUSTKID, INPUTS, binary=True)
+
+        self.assertEqual(
+            parse_events(line.decode().rstrip() for line in binary),
+            parse_events(line.decode().rstrip() for line in text),
+        )
+
+    def test_main(self):
+        """Test playing a replay opened by the editor."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "replay.dfreplay")
+            replay = utils.replay_from_intents("downhill", Character.DUSTMAN, INPUTS)
+            utils.write_replay_to_file(path, replay)
+
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "dusted.dustforce.fake_game",
+                    "--fps",
+                    "0",
+                    "--loops",
+                    "2",
+                    f"dustforce://replay/{path}",
+                ],
+                check=True,
+                capture_output=True,
+            ).stdout
+
+        lines = EventLineReader().feed(output)
+        self.assertEqual(len(lines), 2 * (len(INPUTS) + 1))
+        self.assertEqual(lines[: len(INPUTS) + 1], lines[len(INPUTS) + 1 :])
@@ -0,0 +1,153 @@
+import os
+import platform
+import queue
+import subprocess
+import sys
+import threading
+import time
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from dusted.dustforce.event import LevelStartEvent, StepEvent
+from dusted.dustforce.event_queue import EventQueue
+
+LEVEL_START = b'[dusted] level_start 1 "downhill" 0 00000000 00000000\r\n'
+STEP = b"[dusted] step 2 1 1 0 0 0 0 0 0 0 41200000 00000000\r\n"
+
+
+@skipUnless(platform.system() == "Linux", "Linux only")
+class TestProcessStdout(TestCase):
+    def test_process_stdout(self):
+        """Test that events split across reads are parsed and batched."""
+
+        from dusted.dustforce.linux import process_stdout
+
+        rx_fd, tx_fd = os.pipe()
+        batches = []
+        thread = threading.Thread(target=process_stdout, args=(rx_fd, batches.append))
+        thread.start()
+
+        data = b"Some other output\r\n" + LEVEL_START + STEP * 1000
+        for i in range(0, len(data), 37):
+            os.write(tx_fd, data[i : i + 37])
+        os.close(tx_fd)
+        thread.join()
+
+        events = [event for batch in batches for event in batch]
+        self.assertLess(len(batches), len(events))
+        self.assertEqual(len(events), 1001)
+        self.assertIsInstance(events[0], LevelStartEvent)
+        self.assertTrue(all(isinstance(event, StepEvent) for event in events[1:]))
+
+
+# Writes the given number of steps, then waits the given number of seconds.
+FAKE_GAME = f"""
+import sys, time
+steps, delay = sys.argv[1].split(":")
+sys.stdout.buffer.write({STEP!r} * int(steps))
+sys.stdout.flush()
+time.sleep(float(delay))
+"""
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@skipUnless(platform.system() == "Linux", "Linux only")
+class TestGameConnection(TestCase):
+    def setUp(self):
+        from dusted.dustforce.linux import GameConnection
+
+        self.events = EventQueue()
+        self.connection = GameConnection(
+            self.events, command=[sys.executable, "-c", FAKE_GAME]
+        )
+        self.addCleanup(self.connection.close)
+
+        # Stop the fake games that are still running once the test is done.
+        self.processes = []
+        popen_patcher = patch("dusted.dustforce.linux.Popen", side_effect=self.popen)
+        popen_patcher.start()
+        self.addCleanup(popen_patcher.stop)
+        self.addCleanup(self.stop_processes)
+
+    def popen(self, *args, **kwargs):
+        process = subprocess.Popen(*args, **kwargs)
+        self.processes.append(process)
+        return process
+
+    def stop_processes(self):
+        for process in self.processes:
+            process.terminate()
+            process.wait()
+
+    def batches(self):
+        batches = []
+        while True:
+            try:
+                batches.append(self.events.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def test_sessions(self):
+        """Test that events are tagged with the session that sent them."""
+
+        self.assertEqual(self.connection.open("3:0"), 0)
+        wait_until(lambda: self.connection.live_readers == 0)
+        batches = self.batches()
+        self.assertEqual(self.connection.open("2:0"), 1)
+        wait_until(lambda: self.connection.live_readers == 0)
+        batches += self.batches()
+
+        sessions = [batch.session for batch in batches for _ in batch.events]
+        self.assertEqual(sessions, [0, 0, 0, 1, 1])
+        self.assertEqual(self.connection.events_received, 5)
+
+    def test_discard_stale(self):
+        """Test that waiting events are dropped once a newer session sends events."""
+
+        self.connection.open("3:0")
+        wait_until(lambda: self.connection.live_readers == 0)
+        self.connection.open("2:0")
+        wait_until(lambda: self.connection.live_readers == 0)
+
+        sessions = [batch.session for batch in self.batches()]
+        self.assertEqual(set(sessions), {1})
+        self.assertEqual(self.events.dropped, 3)
+
+    def test_stale_session(self):
+        """Test that older sessions are stopped once a newer one sends events."""
+
+        self.connection.open("1:10")
+        wait_until(lambda: self.connection.events_received == 1)
+        self.connection.open("1:0")
+        wait_until(lambda: self.connection.live_readers == 0)
+
+        self.assertTrue(self.connection.is_stale(0))
+        self.assertFalse(self.connection.is_stale(1))
+        self.assertEqual(self.connection.events_received, 2)
+
+    def test_silent_sessions(self):
+        """Test that only the newest silent reader is kept when opening a URI."""
+
+        self.connection.open("0:10")
+        self.connection.open("0:10")
+        self.assertEqual(self.connection.live_readers, 2)
+        self.connection.open("0:10")
+        wait_until(lambda: self.connection.live_readers == 2)
+
+        self.connection.close()
+        wait_until(lambda: self.connection.live_readers == 0)
+
+    def test_reap(self):
+        """Test that processes are waited for once they exit."""
+
+        self.connection.open("1:0")
+        wait_until(lambda: self.connection.live_readers == 0)
+        wait_until(lambda: self.processes[0].returncode is not None)
+        self.assertEqual(self.processes[0].returncode, 0)
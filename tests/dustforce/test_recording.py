@@ -0,0 +1,77 @@
+import queue
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+from dusted.dustforce.event import parse_event
+from dusted.dustforce.event_queue import EventQueue
+from dusted.dustforce.recording import EventRecorder, play_recording, read_recording
+
+LEVEL_START = '[dusted] level_start 1 "downhill" 0 00000000 00000000'
+STEPS = [
+    f"[dusted] step {id + 1} {id} 1 0 0 0 0 0 0 0 41200000 00000000"
+    for id in range(1, 5)
+]
+
+
+class TestRecording(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "events.gz"
+
+    def record(self, delay=0.0):
+        recorder = EventRecorder(self.path)
+        recorder.record(0, [LEVEL_START, STEPS[0]])
+        time.sleep(delay)
+        recorder.record(0, STEPS[1:3])
+        recorder.record(1, STEPS[3:])
+        recorder.close()
+
+    def drain(self, events):
+        batches = []
+        while True:
+            try:
+                batches.append(events.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def test_read_recording(self):
+        """Test that lines are read back in the batches they were recorded in."""
+
+        self.record()
+        batches = [(session, lines) for _, session, lines in read_recording(self.path)]
+
+        self.assertEqual(
+            batches,
+            [(0, [LEVEL_START, STEPS[0]]), (0, STEPS[1:3]), (1, STEPS[3:])],
+        )
+
+    def test_play_recording(self):
+        """Test that recorded events are put into the queue as they were read."""
+
+        self.record()
+        events = EventQueue()
+        play_recording(self.path, events)
+
+        batches = self.drain(events)
+        self.assertEqual([batch.session for batch in batches], [0, 0, 1])
+        self.assertEqual(
+            [event for batch in batches for event in batch.events],
+            [parse_event(line) for line in [LEVEL_START, *STEPS]],
+        )
+
+    def test_realtime(self):
+        """Test that recordings can be played back at the pace they were recorded."""
+
+        self.record(delay=0.1)
+        events = EventQueue()
+
+        start = time.perf_counter()
+        play_recording(self.path, events)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+        start = time.perf_counter()
+        play_recording(self.path, events, realtime=True)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
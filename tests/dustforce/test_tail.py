@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from dusted.dustforce.tail import LogTailer
+
+
+def step(id):
+    return f"[dusted] step {id} 1 1 0 0 0 0 0 0 0 41200000 00000000\r\n".encode()
+
+
+class TestLogTailer(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "output.log")
+
+        self.ids = []
+        self.tailer = LogTailer(self.path, self.on_events)
+        self.addCleanup(self.tailer.close)
+
+    def on_events(self, batch):
+        self.ids.extend(int(event.id) for event in batch)
+
+    def write(self, data, mode="ab"):
+        with open(self.path, mode) as file:
+            file.write(data)
+
+    def test_skips_existing(self):
+        """Test that only what is written after the file is opened is read."""
+
+        self.write(step(0))
+        self.tailer.poll()
+        self.write(step(1) + step(2)[:10])
+        self.tailer.poll()
+        self.write(step(2)[10:])
+        self.tailer.poll()
+        self.tailer.poll()
+
+        self.assertEqual(self.ids, [1, 2])
+
+    def test_created_later(self):
+        """Test that a file created after the first poll is read from the start."""
+
+        self.tailer.poll()
+        self.write(step(0) + step(1))
+        self.tailer.poll()
+
+        self.assertEqual(self.ids, [0, 1])
+
+    def test_truncated(self):
+        """Test that a truncated file is read again from the start."""
+
+        self.tailer.poll()
+        self.write(b"Some other output\r\n" + step(0) + step(1))
+        self.tailer.poll()
+        self.write(step(2), mode="wb")
+        self.tailer.poll()
+
+        self.assertEqual(self.ids, [0, 1, 2])
+
+    def test_replaced(self):
+        """Test that a replaced file is finished before the new one is read."""
+
+        self.tailer.poll()
+        self.write(step(0))
+        self.tailer.poll()
+        self.write(step(1))
+        os.rename(self.path, self.path + ".old")
+        self.write(step(2))
+        self.tailer.poll()
+
+        self.assertEqual(self.ids, [0, 1, 2])
+
+    def test_thread(self):
+        """Test that changes are picked up by a running thread."""
+
+        self.write(b"")
+        self.tailer.poll()
+        thread = threading.Thread(target=self.tailer.start)
+        thread.start()
+        try:
+            for id in range(100):
+                self.write(step(id))
+
+            deadline = time.monotonic() + 5
+            while len(self.ids) < 100 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            self.tailer.stop()
+            thread.join()
+
+        self.assertEqual(self.ids, list(range(100)))
+
+    def test_close(self):
+        """Test that closing the tailer closes the file."""
+
+        self.write(b"")
+        with LogTailer(self.path, self.on_events) as tailer:
+            tailer.poll()
+            self.assertIsNotNone(tailer._file)
+        self.assertIsNone(tailer._file)
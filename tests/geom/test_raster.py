@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from dusted.geom import render_tiles, tile_rows
+from tests.models.test_density_grid import decode_png
+
+SOLID = bytes((0xBB, 0xBB, 0xBB, 0xFF))
+CLEAR = bytes(4)
+
+
+class TestRaster(TestCase):
+    def test_tile_rows(self):
+        rows = tile_rows({(2, 0), (-1, 0), (0, 0), (5, -3)})
+        self.assertEqual(rows, {0: [-1, 0, 2], -3: [5]})
+
+    def test_empty(self):
+        rows = tile_rows({(0, 0)})
+        self.assertIsNone(render_tiles(rows, 48, 0, 1, 16))
+        self.assertIsNone(render_tiles(rows, -96, -96, 1, 16))
+
+    def test_render(self):
+        """Test an image with half a tile per pixel."""
+
+        rows = tile_rows({(0, 0), (2, 0), (1, 1)})
+        image = render_tiles(rows, -48, 0, 1 / 24, 8)
+        assert image is not None
+
+        width, height, pixel_rows = decode_png(image)
+        self.assertEqual((width, height), (8, 8))
+        self.assertEqual(pixel_rows[0], CLEAR * 2 + SOLID * 2 + CLEAR * 2 + SOLID * 2)
+        self.assertEqual(pixel_rows[1], pixel_rows[0])
+        self.assertEqual(pixel_rows[2], CLEAR * 4 + SOLID * 2 + CLEAR * 2)
+        self.assertEqual(pixel_rows[3], pixel_rows[2])
+        for row in pixel_rows[4:]:
+            self.assertEqual(row, CLEAR * 8)
+
+    def test_partial_tiles(self):
+        """Test that pixels are solid when their centres are in a tile."""
+
+        rows = tile_rows({(0, 0)})
+        image = render_tiles(rows, -10.4, -0.4, 1, 64)
+        assert image is not None
+
+        _, _, pixel_rows = decode_png(image)
+        for row in pixel_rows[:48]:
+            self.assertEqual(row, CLEAR * 10 + SOLID * 48 + CLEAR * 6)
+        for row in pixel_rows[48:]:
+            self.assertEqual(row, CLEAR * 64)
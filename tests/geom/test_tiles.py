@@ -0,0 +1,19 @@
+from unittest import TestCase
+
+from dusted.geom import tile_outlines
+
+
+class TestTiles(TestCase):
+    def test_outlines(self):
+        outlines = tile_outlines({(0, 0), (1, 0), (3, 3)})
+        self.assertEqual(len(outlines), 2)
+        self.assertEqual(sorted(len(outline) for outline in outlines), [1, 1])
+
+    def test_redraw_keeps_tiles(self):
+        """Test that drawing the outlines twice doesn't consume the tiles."""
+
+        tiles = {(0, 0), (1, 0), (3, 3)}
+        first = tile_outlines(tiles)
+        second = tile_outlines(tiles)
+        self.assertEqual(len(tiles), 3)
+        self.assertEqual(sorted(map(str, first)), sorted(map(str, second)))
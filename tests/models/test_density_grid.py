@@ -0,0 +1,122 @@
+import struct
+import zlib
+from unittest import TestCase
+
+from dusted.dustforce.event import State
+from dusted.models.density_grid import DensityGrid, bin_positions
+from dusted.models.tree_store import TreeStore
+
+
+def decode_png(data):
+    """Return the size and the RGBA pixel rows of a simple PNG image."""
+
+    assert data.startswith(b"\x89PNG\r\n\x1a\n")
+    offset = 8
+    chunks = {}
+    while offset < len(data):
+        (length,) = struct.unpack_from("!I", data, offset)
+        kind = data[offset + 4 : offset + 8]
+        chunks[kind] = data[offset + 8 : offset + 8 + length]
+        offset += 12 + length
+
+    width, height = struct.unpack_from("!II", chunks[b"IHDR"])
+    pixels = zlib.decompress(chunks[b"IDAT"])
+    stride = 1 + 4 * width
+    rows = [pixels[y * stride + 1 : (y + 1) * stride] for y in range(height)]
+    return width, height, rows
+
+
+class TestDensityGrid(TestCase):
+    def setUp(self):
+        self.tree = TreeStore()
+        root = self.tree.add_root(State(x=0, y=0))
+        self.tree.add_child(root, 0, 5, 5)
+        self.tree.add_child(root, 1, 15, -5)
+
+    def test_update(self):
+        grid = DensityGrid(10)
+        self.assertTrue(grid.update(self.tree))
+        self.assertEqual(grid.counts, {(0, 0): 2, (1, -1): 1})
+        self.assertFalse(grid.update(self.tree))
+
+        # Only new states are added.
+        self.tree.add_child(1, 0, 25, 5)
+        self.assertTrue(grid.update(self.tree))
+        self.assertEqual(grid.counts, {(0, 0): 2, (1, -1): 1, (2, 0): 1})
+        self.assertEqual(grid.bounds(), (0, -1, 3, 1))
+
+        # States removed by compaction are still counted, and states added
+        # before the compaction that haven't been binned yet are found.
+        self.tree.add_child(3, 0, 35, 5)
+        self.tree.compact([True, True, False, True, True])
+        self.assertTrue(grid.update(self.tree))
+        self.assertEqual(grid.counts, {(0, 0): 2, (1, -1): 1, (2, 0): 1, (3, 0): 1})
+        self.assertFalse(grid.update(self.tree))
+
+        # If the grid misses more than one compaction, it starts again.
+        self.tree.compact([True, True, True, True])
+        self.tree.compact([True, True, True, False])
+        self.assertTrue(grid.update(self.tree))
+        self.assertEqual(grid.counts, {(0, 0): 2, (2, 0): 1})
+
+    def test_add(self):
+        """Test adding states that were binned elsewhere."""
+
+        grid = DensityGrid(10)
+        nodes = grid.sync(self.tree)
+        self.assertEqual(nodes, range(0, 3))
+        counts = bin_positions(self.tree.xs[:3], self.tree.ys[:3], 10)
+        generation = self.tree.generation
+
+        # The tree was compacted while the states were being binned.
+        self.tree.add_child(0, 2, 25, 5)
+        self.tree.compact([True, False, True, True])
+        grid.sync(self.tree)
+        self.assertTrue(grid.add(self.tree, counts, 3, generation))
+        self.assertEqual(grid.counts, {(0, 0): 2, (1, -1): 1})
+
+        self.assertEqual(grid.sync(self.tree), range(2, 3))
+        grid.update(self.tree)
+        self.assertEqual(grid.counts, {(0, 0): 2, (1, -1): 1, (2, 0): 1})
+
+    def test_coarsen(self):
+        grid = DensityGrid(10)
+        grid.update(self.tree)
+        coarse = grid.coarsen(2)
+        self.assertEqual(coarse.cell_size, 20)
+        self.assertEqual(coarse.counts, {(0, 0): 2, (0, -1): 1})
+
+    def test_render(self):
+        """Test an image with two pixels per cell."""
+
+        grid = DensityGrid(10)
+        grid.update(self.tree)
+
+        image = grid.render(0, -10, 0.2, 4, 4)
+        assert image is not None
+        width, height, rows = decode_png(image)
+        self.assertEqual((width, height), (4, 4))
+
+        # The top left cell is empty, and the denser cell is more opaque.
+        self.assertEqual(rows[0][0:8], bytes(8))
+        self.assertEqual(rows[0][8:12], rows[0][12:16])
+        self.assertEqual(rows[1], rows[0])
+        self.assertEqual(rows[3], rows[2])
+        self.assertGreater(rows[2][3], rows[0][11])
+        self.assertGreater(rows[0][11], 0)
+        self.assertEqual(rows[2][8:16], bytes(8))
+
+    def test_render_crop(self):
+        """Test that only the cells in the rectangle are drawn."""
+
+        grid = DensityGrid(10)
+        grid.update(self.tree)
+        self.assertIsNone(grid.render(100, 100, 1, 50, 50))
+
+        image = grid.render(10, -10, 1, 10, 10)
+        assert image is not None
+        width, height, rows = decode_png(image)
+        self.assertEqual((width, height), (10, 10))
+        for row in rows:
+            self.assertEqual(row, rows[0])
+        self.assertGreater(rows[0][3], 0)
@@ -0,0 +1,108 @@
+import dataclasses
+import random
+from unittest import TestCase
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.models.divergence import DivergenceTracker
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Inputs, Intents
+
+CHOICES = [dataclasses.replace(Intents.default(), x=x) for x in (-1, 0, 1)]
+
+
+def naive_first_differing_frame(inputs, game_states):
+    node = game_states.current
+    if node is None:
+        return None
+
+    game_inputs = node.inputs()
+    for frame, (left, right) in enumerate(zip(game_inputs, inputs)):
+        if left != right:
+            return frame
+    if len(inputs) < len(game_inputs):
+        return len(inputs)
+    return None
+
+
+class TestDivergenceTracker(TestCase):
+    def setUp(self):
+        self.inputs = Inputs([CHOICES[1]] * 3)
+        self.game_states = GameStates()
+        self.tracker = DivergenceTracker(self.inputs, self.game_states)
+        self.ids = [0]
+
+        self.game_states.on_event(
+            LevelStartEvent(
+                id=0,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        )
+
+    def step(self, prev_id, intents):
+        id = len(self.ids)
+        self.ids.append(id)
+        self.game_states.on_event(
+            StepEvent(id=id, prev_id=prev_id, intents=intents, state=State(x=0, y=0))
+        )
+        return id
+
+    def test_divergence(self):
+        self.assertIsNone(self.tracker.first_differing_frame)
+
+        id = self.step(0, CHOICES[1])
+        id = self.step(id, CHOICES[1])
+        self.assertIsNone(self.tracker.first_differing_frame)
+
+        id = self.step(id, CHOICES[2])
+        self.assertEqual(self.tracker.first_differing_frame, 2)
+
+        self.inputs[2] = CHOICES[2]
+        self.assertIsNone(self.tracker.first_differing_frame)
+
+        self.inputs[0] = CHOICES[0]
+        self.assertEqual(self.tracker.first_differing_frame, 0)
+
+        del self.inputs[:]
+        self.inputs[:] = [CHOICES[1], CHOICES[1]]
+        self.assertEqual(self.tracker.first_differing_frame, 2)
+
+        self.step(0, CHOICES[1])
+        self.assertIsNone(self.tracker.first_differing_frame)
+
+    def test_batch(self):
+        """Test that changes made in a batch are all seen."""
+
+        id = self.step(0, CHOICES[1])
+        self.step(id, CHOICES[1])
+
+        with self.inputs.batch():
+            self.inputs[1] = CHOICES[0]
+            self.inputs[0] = CHOICES[0]
+            self.inputs[0] = CHOICES[1]
+            self.inputs[1] = CHOICES[1]
+        self.assertIsNone(self.tracker.first_differing_frame)
+
+    def test_random(self):
+        """Test the tracker against comparing all inputs after each change."""
+
+        rng = random.Random(0)
+        for _ in range(2000):
+            action = rng.random()
+            if action < 0.6:
+                self.step(rng.choice(self.ids), rng.choice(CHOICES[1:]))
+            elif action < 0.8:
+                frame = rng.randrange(len(self.inputs) + 1)
+                self.inputs[frame:frame] = [rng.choice(CHOICES[1:])]
+            elif action < 0.9 and self.inputs:
+                self.inputs[rng.randrange(len(self.inputs))] = rng.choice(CHOICES)
+            elif self.inputs:
+                del self.inputs[-rng.randint(1, len(self.inputs)) :]
+
+            self.assertEqual(
+                self.tracker.first_differing_frame,
+                naive_first_differing_frame(self.inputs, self.game_states),
+            )
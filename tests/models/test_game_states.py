@@ -1,11 +1,33 @@
 import dataclasses
+import queue
+import random
+import sys
 from unittest import TestCase
+from unittest.mock import Mock
 
 from dustmaker.replay import Character
 
 from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.dustforce.event_queue import EventQueue
 from dusted.models.game_states import GameStates
-from dusted.models.inputs import Intents
+from dusted.models.inputs import Inputs, Intents
+
+
+def describe(node):
+    """Describe a node and its descendants, for comparing trees."""
+
+    return (
+        node.frame,
+        node.intents,
+        node.state,
+        {child.intents: describe(child) for child in node.children()},
+    )
+
+
+def root(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
 
 
 class TestGameStates(TestCase):
@@ -16,7 +38,7 @@ class TestGameStates(TestCase):
 
         game_states.on_event(
             LevelStartEvent(
-                id="0-0",
+                id=0,
                 level="Cyber-Complex-3-10000",
                 character=Character.DUSTGIRL,
                 state=State(x=0, y=0),
@@ -26,8 +48,8 @@ class TestGameStates(TestCase):
 
         game_states.on_event(
             StepEvent(
-                id="1-0",
-                prev_id="0-0",
+                id=1,
+                prev_id=0,
                 intents=right_intents,
                 state=State(x=10, y=0),
             )
@@ -36,8 +58,8 @@ class TestGameStates(TestCase):
 
         game_states.on_event(
             StepEvent(
-                id="0-1",
-                prev_id="0-0",
+                id=2,
+                prev_id=0,
                 intents=down_intents,
                 state=State(x=0, y=10),
             )
@@ -46,8 +68,8 @@ class TestGameStates(TestCase):
 
         game_states.on_event(
             StepEvent(
-                id="2-0",
-                prev_id="1-0",
+                id=3,
+                prev_id=1,
                 intents=right_intents,
                 state=State(x=20, y=0),
             )
@@ -100,3 +122,294 @@ class TestGameStates(TestCase):
         self.assertEqual(down.common_ancestor(right_1), root)
         self.assertEqual(down.common_ancestor(right_2), root)
         self.assertEqual(down.common_ancestor(down), down)
+
+    def test_apply_events(self):
+        """Test that a batch of events is broadcast once."""
+
+        game_states = GameStates()
+        mock_callback = Mock(spec_set=[])
+        game_states.subscribe(mock_callback)
+
+        game_states.apply_events(
+            [
+                LevelStartEvent(
+                    id=0,
+                    level="downhill",
+                    character=Character.DUSTMAN,
+                    state=State(x=0, y=0),
+                ),
+                *(
+                    StepEvent(
+                        id=frame + 1,
+                        prev_id=frame,
+                        intents=Intents.default(),
+                        state=State(x=frame + 1, y=0),
+                    )
+                    for frame in range(10)
+                ),
+            ]
+        )
+
+        mock_callback.assert_called_once()
+        assert game_states.current is not None
+        self.assertEqual(game_states.current.frame, 10)
+
+    def test_merged_steps(self):
+        """Test that merging steps in the event queue doesn't change the tree."""
+
+        rng = random.Random(0)
+        choices = [dataclasses.replace(Intents.default(), x=x) for x in (-1, 0, 1)]
+        events = [
+            LevelStartEvent(
+                id=0,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        ]
+
+        # Like the game, give the same id to states reached by the same inputs.
+        ids = {(0, None): 0}
+        current = 0
+        for _ in range(5000):
+            # Sometimes go back to an earlier state, as if it was loaded.
+            if rng.random() < 0.05:
+                current = rng.choice(list(ids.values()))
+            choice = rng.randrange(len(choices))
+            next_id = ids.setdefault((current, choice), len(ids))
+            events.append(
+                StepEvent(
+                    id=next_id,
+                    prev_id=current,
+                    intents=choices[choice],
+                    state=State(x=next_id, y=choice),
+                )
+            )
+            current = next_id
+
+        expected = GameStates()
+        expected.apply_events(events)
+
+        event_queue = EventQueue(high_water_mark=64)
+        start = 0
+        while start < len(events):
+            end = start + rng.randint(1, 20)
+            event_queue.put(events[start:end])
+            start = end
+
+        actual = GameStates()
+        try:
+            while True:
+                actual.apply_events(event_queue.get_nowait().events)
+        except queue.Empty:
+            pass
+
+        self.assertGreater(event_queue.merged, 0)
+        self.assertEqual(event_queue.delivered, len(events))
+        assert expected.current is not None and actual.current is not None
+        self.assertEqual(actual.current.inputs(), expected.current.inputs())
+        self.assertEqual(
+            describe(root(actual.current)), describe(root(expected.current))
+        )
+
+    def test_eviction(self):
+        """Test that evicting game states doesn't change the ones kept."""
+
+        rng = random.Random(0)
+        choices = [dataclasses.replace(Intents.default(), x=x) for x in (-1, 0, 1)]
+        inputs = Inputs([choices[2]] * 100)
+        level_start = LevelStartEvent(
+            id=0,
+            level="downhill",
+            character=Character.DUSTMAN,
+            state=State(x=0, y=0),
+        )
+
+        expected = GameStates()
+        actual = GameStates(inputs, max_bytes=50_000)
+        expected.on_event(level_start)
+        actual.on_event(level_start)
+
+        # Follow the inputs, so their path exists before anything is evicted.
+        for frame, intents in enumerate(inputs):
+            event = StepEvent(
+                id=frame + 1, prev_id=frame, intents=intents, state=State(x=0, y=0)
+            )
+            expected.on_event(event)
+            actual.on_event(event)
+
+        previous = actual.current
+        current = len(inputs)
+        for id in range(len(inputs) + 1, 20_000):
+            # Sometimes go back to an earlier state, as if it was loaded.
+            if rng.random() < 0.01:
+                current = rng.randrange(max(0, id - 5000), id)
+            choice = rng.randrange(len(choices))
+            event = StepEvent(
+                id=id,
+                prev_id=current,
+                intents=choices[choice],
+                state=State(x=id, y=choice),
+            )
+            expected.on_event(event)
+            actual.on_event(event)
+            current = id
+
+            actual_node = actual.current
+            expected_node = expected.current
+            if actual_node is None:
+                continue
+            assert expected_node is not None
+
+            self.assertEqual(actual_node.state, expected_node.state)
+            self.assertEqual(actual_node.inputs(), expected_node.inputs())
+            for intents in choices:
+                after = actual_node.after(intents)
+                if after is not None:
+                    expected_after = expected_node.after(intents)
+                    assert expected_after is not None
+                    self.assertEqual(after.state, expected_after.state)
+
+            if previous is not None and previous.alive:
+                ancestor = previous.common_ancestor(actual_node)
+                assert ancestor is not None
+                self.assertEqual(
+                    ancestor.inputs(), actual_node.inputs()[: ancestor.frame]
+                )
+            previous = actual_node
+
+        self.assertGreater(actual.evicted, 0)
+        self.assertLess(actual.node_count, expected.node_count)
+
+        # The path along the inputs is never evicted, nor is the first state.
+        actual.on_event(
+            StepEvent(id=1, prev_id=0, intents=inputs[0], state=State(x=0, y=0))
+        )
+        assert actual.current is not None
+        node = root(actual.current)
+        for intents in inputs:
+            next_node = node.after(intents)
+            assert next_node is not None
+            node = next_node
+
+    def test_memory_usage(self):
+        """Test that the memory used by the ids of states is counted."""
+
+        game_states = GameStates()
+        offset = 1 << 63
+        game_states.on_event(
+            LevelStartEvent(
+                id=offset,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        )
+        for frame in range(1000):
+            game_states.on_event(
+                StepEvent(
+                    id=offset + frame + 1,
+                    prev_id=offset + frame,
+                    intents=Intents.default(),
+                    state=State(x=0, y=0),
+                )
+            )
+
+        root = game_states.root
+        assert root is not None
+        usage = game_states.memory_usage()
+        self.assertGreater(
+            usage, root.store.memory_usage() + 1001 * sys.getsizeof(offset)
+        )
+
+        # Switching levels keeps the tree, and the memory that it uses.
+        game_states.on_event(
+            LevelStartEvent(
+                id=0, level="other", character=Character.DUSTMAN, state=State(x=0, y=0)
+            )
+        )
+        self.assertGreater(game_states.memory_usage(), usage)
+
+    def test_saved_trees(self):
+        """Test that switching back to a level restores its tree."""
+
+        right_intents = dataclasses.replace(Intents.default(), x=1)
+        game_states = GameStates(max_saved_trees=1)
+
+        def play(level, character, frames):
+            game_states.on_event(
+                LevelStartEvent(
+                    id=0, level=level, character=character, state=State(x=0, y=0)
+                )
+            )
+            for frame in range(frames):
+                game_states.on_event(
+                    StepEvent(
+                        id=frame + 1,
+                        prev_id=frame,
+                        intents=right_intents,
+                        state=State(x=frame + 1, y=0),
+                    )
+                )
+            assert game_states.current is not None
+            return game_states.current
+
+        downhill = play("downhill", Character.DUSTMAN, 10)
+        play("downhill", Character.DUSTGIRL, 5)
+        self.assertEqual(game_states.saved_tree_count, 1)
+
+        # Switching back restores the tree, starting from the first state.
+        start = play("downhill", Character.DUSTMAN, 0)
+        self.assertEqual(start, root(downhill))
+        self.assertEqual(game_states.node_count, 11)
+        self.assertEqual(play("downhill", Character.DUSTMAN, 0), start)
+
+        # Only the most recently played other level is kept.
+        play("downhill", Character.DUSTGIRL, 0)
+        play("shadedgrove", Character.DUSTMAN, 0)
+        play("downhill", Character.DUSTGIRL, 0)
+        self.assertEqual(game_states.node_count, 6)
+        play("downhill", Character.DUSTMAN, 0)
+        self.assertEqual(game_states.node_count, 1)
+
+    def test_restart_saved_tree(self):
+        """Test that restarting a saved level continues from its first state."""
+
+        right_intents = dataclasses.replace(Intents.default(), x=1)
+        game_states = GameStates()
+
+        def level_start(level):
+            game_states.on_event(
+                LevelStartEvent(
+                    id=0,
+                    level=level,
+                    character=Character.DUSTMAN,
+                    state=State(x=0, y=0),
+                )
+            )
+
+        def step(id, prev_id):
+            game_states.on_event(
+                StepEvent(
+                    id=id,
+                    prev_id=prev_id,
+                    intents=right_intents,
+                    state=State(x=id, y=0),
+                )
+            )
+
+        level_start("downhill")
+        step(1, 0)
+        step(2, 1)
+        level_start("shadedgrove")
+        level_start("downhill")
+
+        current = game_states.current
+        assert current is not None
+        self.assertEqual(current.frame, 0)
+
+        # The first step is the child of the first state, not of frame 2.
+        step(1, 0)
+        assert game_states.current is not None
+        self.assertEqual(game_states.current.frame, 1)
+        self.assertEqual(game_states.node_count, 3)
@@ -0,0 +1,83 @@
+import dataclasses
+import random
+from unittest import TestCase
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Inputs, Intents
+from dusted.models.predicted_path import PredictedPath
+
+CHOICES = [dataclasses.replace(Intents.default(), x=x) for x in (-1, 0, 1)]
+
+
+def naive_path(inputs, game_states):
+    node = game_states.root
+    if node is None:
+        return []
+
+    path = [node]
+    for intents in inputs:
+        node = node.after(intents)
+        if node is None:
+            break
+        path.append(node)
+    return path
+
+
+class TestPredictedPath(TestCase):
+    def test_random(self):
+        """Test the path against following the inputs after each change."""
+
+        rng = random.Random(0)
+        inputs = Inputs([CHOICES[1]] * 10)
+        game_states = GameStates()
+        path = PredictedPath(inputs, game_states)
+        changes = []
+        path.subscribe(lambda: changes.append(path.first_changed_frame))
+        self.assertIsNone(path.node)
+
+        game_states.on_event(
+            LevelStartEvent(
+                id=0,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        )
+
+        ids = [0]
+        shown = []
+        for _ in range(2000):
+            action = rng.random()
+            if action < 0.6:
+                # Mostly step from the end of the path, as if watching.
+                prev_id = rng.choice(ids)
+                if action < 0.4 and path.node is not None:
+                    prev_id = path.node.store.ids[path.node.index]
+                id = len(ids)
+                game_states.on_event(
+                    StepEvent(
+                        id=id,
+                        prev_id=prev_id,
+                        intents=rng.choice(CHOICES),
+                        state=State(x=id, y=0),
+                    )
+                )
+                ids.append(id)
+            elif action < 0.8:
+                frame = rng.randrange(len(inputs) + 1)
+                inputs[frame:frame] = [rng.choice(CHOICES)]
+            elif inputs:
+                inputs[rng.randrange(len(inputs))] = rng.choice(CHOICES)
+
+            # Keep the positions shown, as the level view does.
+            expected = naive_path(inputs, game_states)
+            assert path.node is not None
+            del shown[changes[-1] :]
+            shown.extend(path.node.positions(len(shown)))
+
+            self.assertEqual(path.node, expected[-1])
+            self.assertEqual(shown, [(node.state.x, node.state.y) for node in expected])
+            self.assertEqual(path.is_complete, len(expected) == len(inputs) + 1)
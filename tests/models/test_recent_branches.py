@@ -0,0 +1,88 @@
+import dataclasses
+from unittest import TestCase
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Intents
+from dusted.models.recent_branches import RecentBranches
+
+LEFT = dataclasses.replace(Intents.default(), x=-1)
+RIGHT = dataclasses.replace(Intents.default(), x=1)
+DOWN = dataclasses.replace(Intents.default(), y=1)
+UP = dataclasses.replace(Intents.default(), y=-1)
+
+
+class TestRecentBranches(TestCase):
+    def setUp(self):
+        self.game_states = GameStates()
+        self.branches = RecentBranches(self.game_states, count=2)
+        self.game_states.on_event(
+            LevelStartEvent(
+                id=0,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        )
+
+    def step(self, id, prev_id, intents):
+        self.game_states.on_event(
+            StepEvent(id=id, prev_id=prev_id, intents=intents, state=State(x=0, y=0))
+        )
+        return self.game_states.current
+
+    def test_branches(self):
+        self.step(1, 0, RIGHT)
+        right = self.step(2, 1, RIGHT)
+        self.assertEqual(self.branches.tips, [right])
+
+        # Stepping off the branch starts a new one.
+        left = self.step(3, 1, LEFT)
+        self.assertEqual(self.branches.tips, [right, left])
+
+        # Going back to a state on a branch leaves the branches as they are,
+        # until the game reaches the end of one again.
+        self.step(1, 0, RIGHT)
+        self.assertEqual(self.branches.tips, [right, left])
+        self.step(2, 1, RIGHT)
+        self.assertEqual(self.branches.tips, [left, right])
+
+        # Continuing a branch moves its end.
+        further_left = self.step(4, 3, LEFT)
+        self.assertEqual(self.branches.tips, [right, further_left])
+
+        # Only the most recent branches are kept.
+        up = self.step(5, 0, Intents.default())
+        self.assertEqual(self.branches.tips, [further_left, up])
+
+    def test_restart(self):
+        """Test that restarting from the first state doesn't promote a branch."""
+
+        self.branches = RecentBranches(self.game_states, count=3)
+        right = self.step(1, 0, RIGHT)
+        left = self.step(2, 0, LEFT)
+        down = self.step(3, 0, DOWN)
+        self.assertEqual(self.branches.tips, [right, left, down])
+
+        level_start = LevelStartEvent(
+            id=0, level="downhill", character=Character.DUSTMAN, state=State(x=0, y=0)
+        )
+        self.game_states.on_event(level_start)
+        self.assertEqual(self.branches.tips, [right, left, down])
+
+        # Every branch left during a batch of events is seen, not only the
+        # state that the batch ends at.
+        self.game_states.apply_events(
+            [
+                StepEvent(id=2, prev_id=0, intents=LEFT, state=State(x=0, y=0)),
+                StepEvent(id=4, prev_id=2, intents=LEFT, state=State(x=0, y=0)),
+                level_start,
+                StepEvent(id=5, prev_id=0, intents=UP, state=State(x=0, y=0)),
+            ]
+        )
+        further_left = left.after(LEFT)
+        self.assertEqual(
+            self.branches.tips, [down, further_left, self.game_states.current]
+        )
@@ -0,0 +1,36 @@
+import random
+from unittest import TestCase
+
+from dusted.models.spatial_index import SpatialIndex
+
+
+class TestSpatialIndex(TestCase):
+    def test_query(self):
+        """Test that queries find every item in the rectangle, and few others."""
+
+        rng = random.Random(0)
+        points = [
+            (rng.uniform(-1000, 1000), rng.uniform(-1000, 1000)) for _ in range(2000)
+        ]
+        index = SpatialIndex[int](100)
+        for i, (x, y) in enumerate(points):
+            index.insert(i, x, y)
+        self.assertEqual(len(index), len(points))
+
+        for size in (10, 300, 5000):
+            x0 = rng.uniform(-1000, 1000)
+            y0 = rng.uniform(-1000, 1000)
+            found = set(index.query(x0, y0, x0 + size, y0 + size))
+
+            inside = {
+                i
+                for i, (x, y) in enumerate(points)
+                if x0 <= x <= x0 + size and y0 <= y <= y0 + size
+            }
+            nearby = {
+                i
+                for i, (x, y) in enumerate(points)
+                if x0 - 100 <= x <= x0 + size + 100 and y0 - 100 <= y <= y0 + size + 100
+            }
+            self.assertLessEqual(inside, found)
+            self.assertLessEqual(found, nearby)
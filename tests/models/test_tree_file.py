@@ -0,0 +1,172 @@
+import dataclasses
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from dustmaker.replay import Character
+
+from dusted.dustforce.event import LevelStartEvent, State, StepEvent
+from dusted.models.game_states import GameStates
+from dusted.models.inputs import Inputs, Intents
+from dusted.models.tree_file import NODE_FORMAT, TreeFile, tree_path, wait_for_writes
+from dusted.models.tree_store import TreeStore
+
+
+def describe(tree):
+    return [
+        (tree.ids[i], tree.parents[i], tree.intents[i], tree.xs[i], tree.ys[i])
+        for i in range(len(tree))
+    ]
+
+
+class TestTreeFile(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.path = tree_path(self.directory, "a/b level", Character.DUSTKID)
+
+        self.tree = TreeStore()
+        root = self.tree.add_root(State(x=1, y=2), id=10)
+        self.tree.add_child(root, 3, 4, 5, id=11)
+
+    def test_append(self):
+        """Test that new nodes are appended to the file."""
+
+        file = TreeFile(self.path)
+        file.write(self.tree)
+        wait_for_writes()
+        self.tree.add_child(1, 6, 7, 8, id=12)
+        size = self.path.stat().st_size
+        file.write(self.tree)
+        self.assertEqual(self.path.stat().st_size, size + NODE_FORMAT.size)
+
+        tree = TreeFile(self.path).read()
+        assert tree is not None
+        self.assertEqual(describe(tree), describe(self.tree))
+        self.assertEqual(tree.frames[2], 2)
+
+    def test_compacted(self):
+        """Test that the whole file is written again after compacting."""
+
+        file = TreeFile(self.path)
+        file.write(self.tree)
+        self.tree.compact([True, False])
+        file.write(self.tree)
+
+        # Nodes added while the file is being written are written after it.
+        self.tree.add_child(0, 6, 7, 8, id=12)
+        file.write(self.tree)
+
+        tree = TreeFile(self.path).read()
+        assert tree is not None
+        self.assertEqual(describe(tree), describe(self.tree))
+
+    def test_incomplete(self):
+        """Test that an incompletely written node is ignored, then replaced."""
+
+        TreeFile(self.path).write(self.tree)
+        wait_for_writes()
+        with self.path.open("ab") as f:
+            f.write(b"\0" * (NODE_FORMAT.size - 1))
+
+        file = TreeFile(self.path)
+        tree = file.read()
+        assert tree is not None
+        self.assertEqual(describe(tree), describe(self.tree))
+
+        tree.add_child(0, 6, 7, 8, id=12)
+        file.write(tree)
+        reread = TreeFile(self.path).read()
+        assert reread is not None
+        self.assertEqual(describe(reread), describe(tree))
+
+    def test_missing(self):
+        self.assertIsNone(TreeFile(self.path).read())
+        self.path.write_bytes(b"not a tree")
+        self.assertIsNone(TreeFile(self.path).read())
+
+
+class TestSavedGameStates(TestCase):
+    def test_game_states(self):
+        """Test that trees are saved and loaded again in a later session."""
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        right = dataclasses.replace(Intents.default(), x=1)
+        inputs = Inputs([right] * 3)
+        level_start = LevelStartEvent(
+            id=0, level="downhill", character=Character.DUSTMAN, state=State(x=0, y=0)
+        )
+
+        def step(game_states, id, prev_id, intents):
+            game_states.on_event(
+                StepEvent(
+                    id=id, prev_id=prev_id, intents=intents, state=State(x=id, y=0)
+                )
+            )
+
+        game_states = GameStates(inputs, directory=Path(directory.name))
+        game_states.on_event(level_start)
+        step(game_states, 1, 0, right)
+        step(game_states, 2, 1, right)
+        game_states.flush()
+        step(game_states, 3, 0, Intents.default())
+        game_states.flush()
+
+        # Opening a replay shows the path along its inputs.
+        game_states = GameStates(inputs, directory=Path(directory.name))
+        game_states.open("downhill", Character.DUSTGIRL)
+        self.assertIsNone(game_states.current)
+        game_states.open("downhill", Character.DUSTMAN)
+        assert game_states.current is not None
+        self.assertEqual(game_states.current.frame, 2)
+        self.assertEqual(game_states.node_count, 4)
+
+        # Watching continues from the saved states.
+        game_states.on_event(level_start)
+        step(game_states, 4, 2, right)
+        assert game_states.current is not None
+        self.assertEqual(game_states.current.frame, 3)
+        self.assertEqual(game_states.current.state, State(x=4, y=0))
+
+    def test_eviction(self):
+        """Test that the branches of a loaded tree are evicted oldest first."""
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        right = dataclasses.replace(Intents.default(), x=1)
+        game_states = GameStates(directory=Path(directory.name))
+        game_states.on_event(
+            LevelStartEvent(
+                id=0,
+                level="downhill",
+                character=Character.DUSTMAN,
+                state=State(x=0, y=0),
+            )
+        )
+        for id, prev_id, intents in [
+            (1, 0, right),
+            (2, 1, right),
+            (3, 2, right),
+            (4, 0, Intents.default()),
+            (5, 4, Intents.default()),
+            (6, 5, Intents.default()),
+        ]:
+            game_states.on_event(
+                StepEvent(
+                    id=id, prev_id=prev_id, intents=intents, state=State(x=id, y=0)
+                )
+            )
+        game_states.flush()
+
+        game_states = GameStates(directory=Path(directory.name))
+        game_states.open("downhill", Character.DUSTMAN)
+        game_states.evict(4)
+        self.assertEqual(game_states.node_count, 4)
+        root = game_states.root
+        assert root is not None
+        self.assertIsNone(root.after(right))
+        self.assertIsNotNone(root.after(Intents.default()))
@@ -0,0 +1,112 @@
+import random
+from unittest import TestCase
+
+from dusted.dustforce.event import State
+from dusted.models.tree_store import NO_NODE, Node, TreeStore
+
+
+class TestTreeStore(TestCase):
+    def setUp(self):
+        #        root
+        #       /    \
+        #      a      b
+        #     / \
+        #    c   d
+        self.store = TreeStore()
+        self.root = self.store.add_root(State(x=0, y=0))
+        self.a = self.store.add_child(self.root, 1, 1, 0)
+        self.b = self.store.add_child(self.root, 2, 0, 1)
+        self.c = self.store.add_child(self.a, 1, 2, 0)
+        self.d = self.store.add_child(self.a, 2, 1, 1)
+
+    def test_children(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.child(self.root, 1), self.a)
+        self.assertEqual(self.store.child(self.root, 2), self.b)
+        self.assertEqual(self.store.child(self.root, 3), NO_NODE)
+        self.assertEqual(sorted(self.store.children(self.a)), [self.c, self.d])
+        self.assertEqual(self.store.children(self.c), [])
+        self.assertEqual(self.store.frames[self.d], 2)
+
+    def test_common_ancestor(self):
+        self.assertEqual(self.store.common_ancestor(self.c, self.d), self.a)
+        self.assertEqual(self.store.common_ancestor(self.c, self.b), self.root)
+        self.assertEqual(self.store.common_ancestor(self.a, self.d), self.a)
+        self.assertEqual(self.store.common_ancestor(self.c, self.c), self.c)
+
+        other_root = self.store.add_root(State(x=0, y=0))
+        self.assertEqual(self.store.common_ancestor(self.c, other_root), NO_NODE)
+
+    def test_node(self):
+        """Test that nodes are handles that compare by index."""
+
+        node = Node(self.store, self.d)
+        self.assertEqual(node, Node(self.store, self.d))
+        self.assertNotEqual(node, Node(TreeStore(), self.d))
+        self.assertEqual(len({node, Node(self.store, self.d)}), 1)
+
+        self.assertEqual(node.state, State(x=1, y=1))
+        assert node.parent is not None
+        self.assertEqual(node.parent.index, self.a)
+        self.assertEqual(node.positions(), [(0, 0), (1, 0), (1, 1)])
+        self.assertEqual(node.positions(first_frame=2), [(1, 1)])
+        self.assertIsNone(Node(self.store, self.root).intents)
+
+    def test_compact(self):
+        node = Node(self.store, self.c)
+        mapping = self.store.compact([True, True, False, True, False])
+
+        self.assertEqual(list(mapping), [0, 1, NO_NODE, 2, NO_NODE])
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.children(0), [1])
+        self.assertEqual(self.store.child(1, 1), 2)
+        self.assertEqual(self.store.common_ancestor(2, 1), 1)
+        self.assertEqual(self.store.xs[2], 2)
+
+        self.assertFalse(node.alive)
+        self.assertIsNone(node.common_ancestor(Node(self.store, 2)))
+        self.assertTrue(Node(self.store, 2).alive)
+
+
+def naive_ancestor(store, index, frame):
+    while store.frames[index] > frame:
+        index = store.parents[index]
+    return index
+
+
+def naive_common_ancestor(store, left, right):
+    while left != right:
+        if store.frames[left] >= store.frames[right]:
+            left = store.parents[left]
+        else:
+            right = store.parents[right]
+        if left == NO_NODE or right == NO_NODE:
+            return NO_NODE
+    return left
+
+
+class TestAncestors(TestCase):
+    def test_random_tree(self):
+        """Test ancestor queries against walking up one frame at a time."""
+
+        rng = random.Random(0)
+        store = TreeStore()
+        for _ in range(2):
+            node = store.add_root(State(x=0, y=0))
+            for _ in range(2000):
+                if rng.random() < 0.02:
+                    node = rng.randrange(len(store))
+                node = store.add_child(node, rng.randrange(4), 0, 0)
+
+        for _ in range(2000):
+            left = rng.randrange(len(store))
+            right = rng.randrange(len(store))
+            frame = rng.randint(0, store.frames[left])
+
+            self.assertEqual(
+                store.ancestor(left, frame), naive_ancestor(store, left, frame)
+            )
+            self.assertEqual(
+                store.common_ancestor(left, right),
+                naive_common_ancestor(store, left, right),
+            )
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from dustmaker.replay import Character, IntentStream, PlayerData, Replay
+
+from dusted import utils
+from dusted.batch import Diagnostic, check_replay, run_batch, write_csv, write_json
+
+
+def write_replay(path: Path, falls: list[int]) -> None:
+    intents = {stream: [0] * len(falls) for stream in IntentStream}
+    intents[IntentStream.FALL] = falls
+    replay = Replay(
+        username=b"TAS",
+        level=b"downhill",
+        players=[PlayerData(Character.DUSTMAN, intents)],
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    utils.write_replay_to_file(str(path), replay)
+
+
+class TestBatch(TestCase):
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name) / "replays"
+        self.nexus_dir = Path(temp_dir.name) / "nexus"
+
+        write_replay(self.directory / "clean.dfreplay", [0, 0, 0])
+        write_replay(self.directory / "nested" / "fall.dfreplay", [0, 1, 0])
+        (self.directory / "broken.dfreplay").write_bytes(b"not a replay")
+
+    def test_check_replay(self):
+        """Test that diagnostics are reported with their frame and intent."""
+
+        report = check_replay(str(self.directory / "nested" / "fall.dfreplay"))
+
+        self.assertEqual(report.frames, 3)
+        self.assertEqual(report.warnings, [])
+        self.assertEqual(report.errors, [Diagnostic(frame=1, intent="fall")])
+        self.assertFalse(report.ok)
+
+    def test_run_batch(self):
+        """Test that every replay is checked and nexus scripts are exported."""
+
+        reports = run_batch(self.directory, self.nexus_dir, max_workers=2)
+
+        by_name = {Path(report.path).name: report for report in reports}
+        self.assertEqual(
+            sorted(by_name), ["broken.dfreplay", "clean.dfreplay", "fall.dfreplay"]
+        )
+        self.assertTrue(by_name["clean.dfreplay"].ok)
+        self.assertIsNotNone(by_name["broken.dfreplay"].failure)
+        self.assertEqual(len(by_name["fall.dfreplay"].errors), 1)
+
+        nexus_script = self.nexus_dir / "clean.txt"
+        self.assertEqual(by_name["clean.dfreplay"].nexus_script, str(nexus_script))
+        self.assertEqual(len(nexus_script.read_text().splitlines()), 3)
+        self.assertTrue((self.nexus_dir / "nested" / "fall.txt").exists())
+
+    def test_reports(self):
+        """Test that reports are machine readable."""
+
+        reports = [check_replay(str(self.directory / "nested" / "fall.dfreplay"))]
+
+        json_file = io.StringIO()
+        write_json(reports, json_file)
+        self.assertEqual(
+            json.loads(json_file.getvalue())[0]["errors"],
+            [{"frame": 1, "intent": "fall"}],
+        )
+
+        csv_file = io.StringIO()
+        write_csv(reports, csv_file)
+        rows = list(csv.DictReader(io.StringIO(csv_file.getvalue())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["severity"], "error")
+        self.assertEqual(rows[0]["frame"], "1")
+
+    def test_no_tkinter(self):
+        """Test that the batch command does not import tkinter."""
+
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, dusted.__main__, dusted.batch;"
+                "assert 'tkinter' not in sys.modules",
+            ],
+            check=True,
+        )
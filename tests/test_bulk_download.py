@@ -0,0 +1,132 @@
+import io
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from dustmaker.dfreader import DFReader
+from dustmaker.dfwriter import DFWriter
+from dustmaker.replay import Character, PlayerData, Replay
+
+from dusted.bulk_download import download_replays, replay_path
+from dusted.cache import DustkidCache
+
+
+def make_replay_data(level: str) -> bytes:
+    replay = Replay(
+        username=b"TAS",
+        level=level.encode(),
+        players=[PlayerData(character=Character.DUSTMAN, intents={})],
+    )
+    replay_file = io.BytesIO()
+    with DFWriter(replay_file) as writer:
+        writer.write_replay(replay)
+        return replay_file.getvalue()
+
+
+class DustkidHandler(BaseHTTPRequestHandler):
+    """A stand-in for dustkid's replay endpoint."""
+
+    replays: dict[str, bytes] = {}
+    requested: list[str] = []
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        replay_id = urllib.parse.parse_qs(body.decode())["replay"][0]
+        self.requested.append(replay_id)
+
+        if self.path != "/get_replay.php" or replay_id not in self.replays:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.replays[replay_id])))
+        self.end_headers()
+        self.wfile.write(self.replays[replay_id])
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class TestBulkDownload(TestCase):
+    def setUp(self) -> None:
+        DustkidHandler.replays = {
+            str(replay_id): make_replay_data(f"level-{replay_id}")
+            for replay_id in range(20)
+        }
+        DustkidHandler.requested = []
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), DustkidHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name) / "replays"
+
+        url_patcher = patch(
+            "dusted.utils.DUSTKID_URL", f"http://127.0.0.1:{server.server_port}"
+        )
+        url_patcher.start()
+        self.addCleanup(url_patcher.stop)
+
+        cache_patcher = patch(
+            "dusted.utils.cache",
+            DustkidCache(Path(temp_dir.name) / "cache", max_size=1 << 30),
+        )
+        self.cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def test_download(self):
+        """Test that every replay is written to the directory."""
+
+        replay_ids = [str(replay_id) for replay_id in range(20)]
+        result = download_replays(replay_ids, self.directory, max_workers=4)
+
+        self.assertCountEqual(result.downloaded, replay_ids)
+        self.assertEqual(result.skipped, [])
+        self.assertEqual(result.failed, {})
+        for replay_id in replay_ids:
+            with replay_path(self.directory, replay_id).open("rb") as file:
+                replay = DFReader(file).read_replay()
+            self.assertEqual(replay.level, f"level-{replay_id}".encode())
+
+        # Bulk downloads don't evict the replays and levels in the cache.
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_resume(self):
+        """Test that replays that have already been downloaded are skipped."""
+
+        download_replays(["1", "2", "3"], self.directory)
+        DustkidHandler.requested = []
+
+        result = download_replays(["1", "2", "3", "4"], self.directory)
+
+        self.assertEqual(result.downloaded, ["4"])
+        self.assertEqual(result.skipped, ["1", "2", "3"])
+        self.assertEqual(DustkidHandler.requested, ["4"])
+
+    def test_failure(self):
+        """Test that failed downloads are reported and not written."""
+
+        result = download_replays(["1", "404"], self.directory)
+
+        self.assertEqual(result.downloaded, ["1"])
+        self.assertEqual(list(result.failed), ["404"])
+        self.assertFalse(replay_path(self.directory, "404").exists())
+
+    def test_invalid_ids(self):
+        """Test that ids that aren't numbers are reported and not requested."""
+
+        result = download_replays(["1", "../../escaped", "12a"], self.directory)
+
+        self.assertEqual(result.downloaded, ["1"])
+        self.assertEqual(list(result.failed), ["../../escaped", "12a"])
+        self.assertEqual(DustkidHandler.requested, ["1"])
+        self.assertFalse((self.directory.parent / "escaped.dfreplay").exists())
+        with self.assertRaises(ValueError):
+            replay_path(self.directory, "../escaped")
@@ -0,0 +1,106 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock
+
+from dusted.cache import DustkidCache, OfflineError
+
+
+class TestDustkidCache(TestCase):
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name)
+
+    def test_hit_and_miss(self):
+        """Test that payloads are only downloaded once."""
+
+        cache = DustkidCache(self.directory, max_size=1024)
+        download = Mock(return_value=b"replay data")
+
+        self.assertEqual(cache.fetch("replay/1", download), b"replay data")
+        self.assertEqual(cache.fetch("replay/1", download), b"replay data")
+
+        download.assert_called_once()
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_persistence(self):
+        """Test that a new cache instance sees previously stored payloads."""
+
+        DustkidCache(self.directory, max_size=1024).put("level/a", b"level data")
+
+        cache = DustkidCache(self.directory, max_size=1024)
+        self.assertEqual(cache.get("level/a"), b"level data")
+
+    def test_content_addressed(self):
+        """Test that identical payloads are only stored once."""
+
+        cache = DustkidCache(self.directory, max_size=1024)
+        cache.put("replay/1", b"same")
+        cache.put("replay/2", b"same")
+
+        self.assertEqual(cache.size(), 4)
+        self.assertEqual(len(list((self.directory / "objects").rglob("*"))), 2)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used payloads are evicted first."""
+
+        cache = DustkidCache(self.directory, max_size=10)
+        cache.put("replay/1", b"11111")
+        cache.put("replay/2", b"22222")
+        cache.get("replay/1")
+        cache.put("replay/3", b"33333")
+
+        self.assertEqual(cache.get("replay/1"), b"11111")
+        self.assertEqual(cache.get("replay/2"), None)
+        self.assertEqual(cache.get("replay/3"), b"33333")
+        self.assertLessEqual(cache.size(), 10)
+
+    def test_save(self):
+        """Test that hits only save when payloads were used once asked to."""
+
+        cache = DustkidCache(self.directory, max_size=10)
+        cache.put("replay/1", b"11111")
+        cache.put("replay/2", b"22222")
+        index = (self.directory / "index.json").read_bytes()
+
+        cache.get("replay/1")
+        self.assertEqual((self.directory / "index.json").read_bytes(), index)
+
+        cache.save()
+        cache = DustkidCache(self.directory, max_size=10)
+        cache.put("replay/3", b"33333")
+        self.assertEqual(cache.get("replay/1"), b"11111")
+        self.assertEqual(cache.get("replay/2"), None)
+
+    def test_offline(self):
+        """Test that offline mode only serves cached payloads."""
+
+        cache = DustkidCache(self.directory, max_size=1024, offline=True)
+        cache.put("replay/1", b"replay data")
+        download = Mock(return_value=b"other data")
+
+        self.assertEqual(cache.fetch("replay/1", download), b"replay data")
+        with self.assertRaises(OfflineError):
+            cache.fetch("replay/2", download)
+
+        download.assert_not_called()
+
+    def test_invalid_payload(self):
+        """Test that payloads that fail validation are not stored."""
+
+        cache = DustkidCache(self.directory, max_size=1024)
+        download = Mock(side_effect=[b"<html>error</html>", b"replay data"])
+
+        def validate(data):
+            if data.startswith(b"<html>"):
+                raise ValueError("Not a replay")
+
+        with self.assertRaises(ValueError):
+            cache.fetch("replay/1", download, validate)
+        self.assertIsNone(cache.get("replay/1"))
+        self.assertEqual(cache.size(), 0)
+
+        self.assertEqual(cache.fetch("replay/1", download, validate), b"replay data")
+        self.assertEqual(cache.get("replay/1"), b"replay data")
@@ -0,0 +1,55 @@
+import re
+import subprocess
+import sys
+from unittest import TestCase
+
+# The maximum time that importing the editor may take, in microseconds. This is
+# deliberately generous so that slow machines pass, but it still catches
+# accidentally importing something heavy at startup.
+STARTUP_BUDGET_US = 500_000
+
+# Modules that are slow to import, and are only needed for some features.
+LAZY_MODULES = [
+    "requests",
+    "dusted.geom",
+    "dusted.publish_replay",
+    "dusted.views.publish_replay_dialog",
+]
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s*\d+ \|\s*(\d+) \| *(\S+)")
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Return the cumulative import time of each imported module, in microseconds."""
+
+    # Run in a fresh interpreter, so that nothing has already been imported.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_PATTERN.match(line):
+            cumulative, name = match.groups()
+            times[name] = int(cumulative)
+    return times
+
+
+class TestStartup(TestCase):
+    def test_lazy_modules(self):
+        """Test that heavy modules are not imported when the editor starts."""
+
+        times = import_times("dusted.__main__, dusted.views.gui")
+
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_startup_budget(self):
+        """Test that importing the editor fits within the startup budget."""
+
+        times = import_times("dusted.__main__, dusted.views.gui")
+
+        self.assertLess(times["dusted.views.gui"], STARTUP_BUDGET_US)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from dustmaker.replay import Character
+
+from dusted import utils
+from dusted.cache import DustkidCache
+from dusted.models.inputs import Intents
+
+
+class TestUtils(TestCase):
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name)
+
+    def test_replay_round_trip(self):
+        """Test that intents survive being written to and read from a file."""
+
+        inputs = [Intents.default(), Intents(1, -1, 2, 0, 0, 10, 0, 0)]
+        replay = utils.replay_from_intents("downhill", Character.DUSTGIRL, inputs)
+        filepath = str(self.directory / "replay.dfreplay")
+
+        utils.write_replay_to_file(filepath, replay)
+        loaded = utils.load_replay_from_file(filepath)
+
+        self.assertEqual(loaded.level, b"downhill")
+        self.assertEqual(loaded.players[0].character, Character.DUSTGIRL)
+        self.assertEqual(utils.intents_from_replay(loaded), inputs)
+
+    def test_write_replay_atomic(self):
+        """Test that a failed write leaves the existing file intact."""
+
+        filepath = str(self.directory / "replay.dfreplay")
+        replay = utils.replay_from_intents("downhill", Character.DUSTMAN, [])
+        utils.write_replay_to_file(filepath, replay)
+        with open(filepath, "rb") as file:
+            original = file.read()
+
+        with patch("dusted.fileio.os.replace", side_effect=OSError("Disk full")):
+            with self.assertRaises(OSError):
+                utils.write_replay_to_file(filepath, replay)
+
+        with open(filepath, "rb") as file:
+            self.assertEqual(file.read(), original)
+        self.assertEqual(os.listdir(self.directory), ["replay.dfreplay"])
+
+    def test_corrupt_download(self):
+        """Test that a download that isn't a replay is not cached."""
+
+        cache = DustkidCache(self.directory / "cache", max_size=1024)
+        with (
+            patch("dusted.utils.cache", cache),
+            patch(
+                "dusted.utils._download_replay_from_dustkid",
+                return_value=b"<html>Internal error</html>",
+            ),
+        ):
+            with self.assertRaises(Exception):
+                utils.load_replay_from_dustkid("123")
+
+        self.assertIsNone(cache.get("replay/123"))
+        self.assertEqual(cache.size(), 0)